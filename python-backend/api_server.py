@@ -2,22 +2,23 @@
 from __future__ import annotations
 from fastapi.responses import RedirectResponse
 from fastapi.responses import StreamingResponse, JSONResponse
+import hashlib
 import io
 import os
 from pathlib import Path
 import tempfile
+import time
 from typing import Optional
 import re
 import json
 from typing import List, Optional, Dict, Any # Ensure List is included
 # --- START: ADDED FOR FORM FILLING (Ensure these imports are present) ---
 import json # Likely already there
-import shutil
 from fastapi import Body, APIRouter # Add Body and APIRouter if you plan to use it
 from pydantic import Field as PydanticField # If needed for complex models
 from backend_rag.form_processing import DetailedOcrResult, OcrPage, OcrWord
 from fastapi.responses import Response
-from backend_rag.tts import generate_speech_audio
+from backend_rag.tts import speech_audio_id, stream_speech_audio_cached, get_cached_speech_audio, get_tts_cache_stats
 # Import the new form processing functions
 from backend_rag.form_processing import (
     detect_form_fields,
@@ -41,20 +42,20 @@ else:
 from backend_rag.prompts import build_strict_system_prompt 
 from backend_rag.prompts import WEB_ANSWER_SYSTEM_PROMPT
 from backend_rag.web_search import google_search
-from backend_rag.models import model # Import both models
+from backend_rag.models import get_llm_cache_stats
 # --- END: ADDED FOR FORM FILLING (Imports) ---
 # Ensure all backend modules are correctly imported
 # In api_server.py, near other backend imports
-from backend_rag.Translation import detect_language, translate_text
+from backend_rag.langid import detect_language_fast, detect_languages_fast
+from backend_rag.Translation import translate_text, translate_fields, translate_json_values, translate_texts, get_translation_cache_stats
 from backend_rag.vectorstore_pinecone import get_or_create_index, upsert_chunks, delete_namespace, namespace, query_top_k, namespace_count
-from backend_rag.embeddings import embed_texts, get_embedding_dimension
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Query
+from backend_rag.embeddings import embed_texts, get_embedding_dimension, is_multilingual
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from pydub import AudioSegment
 
 from backend_rag.retrieval import retrieve_similar_chunks, retrieve_general_legal_chunks
-from backend_rag.extract import extract_text_with_diagnostics
+from backend_rag.extract import extract_text_cached, get_extraction_cache_stats
 from backend_rag.chunking import chunk_text
 from backend_rag.analysis import (
     generate_study_guide,
@@ -77,22 +78,17 @@ from backend_rag.prompts import (
 )
 from backend_rag.highlighting import find_text_coordinates
 from backend_rag.retrieval import retrieve_similar_chunks
-from backend_rag.ocr import speech_to_text_from_local_file, speech_to_text_from_bytes
+from backend_rag.audio import AudioDecodeError, decode_to_pcm, prepare_for_speech
+from backend_rag.ocr import speech_to_text_from_pcm, iter_transcribed_segments, stitch_segments, detect_language_from_pcm
 
 # try to use your LLM helper; fall back to a minimal one if not present
 try:
     from backend_rag.llm import call_model_system_then_user
 except Exception:
-    from backend_rag.models import model
-    from langchain_core.messages import SystemMessage, HumanMessage
-    def call_model_system_then_user(system_prompt: str, user_prompt: str, temperature: float = 0.0) -> str:
-        sys = SystemMessage(content=system_prompt)
-        hum = HumanMessage(content=user_prompt)
-        try:
-            resp = model.invoke([sys, hum])
-            return getattr(resp, "content", str(resp))
-        except Exception as e:
-            return f"(model error: {e})"
+    from backend_rag.models import call_model_system_then_user
+from backend_rag.llm import stream_model, get_agent_stats, get_llm_scheduler_stats
+from backend_rag.metrics import LLM_TTFT_SECONDS, metrics_snapshot, render_prometheus
+from backend_rag.context_packer import pack_chunks
 
 # optional: use your prompt builder if it exists, otherwise a safe default
 
@@ -108,12 +104,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Content-Range", "Accept-Ranges", "X-Audio-Id"],
 )
 
 
 UPLOAD_DIR = Path(os.environ.get("UPLOAD_DIR", "/tmp/uploads"))
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
+from backend_rag.config import UPLOAD_CHUNK_BYTES, MAX_UPLOAD_BYTES, MAX_AUDIO_UPLOAD_BYTES
+
 
 # ----------------------------- Models -----------------------------------------
 # In api_server.py, update these models
@@ -296,48 +295,58 @@ def _find_coordinates_in_ocr_result(ocr_result: DetailedOcrResult, target_text:
 
     return found_boxes
 
-# --- ADD THIS NEW HELPER FUNCTION near the top of api_server.py ---
-# This function can "walk" through a JSON object and translate all string values,
-# leaving the keys in English, which is perfect for your new output.
+_UNTRANSLATED_PLACEHOLDERS = {"not specified", "not specified in the provided excerpts."}
+
+
 def _translate_json_values(
     data: Union[Dict, List, str], 
     target_language: str
 ) -> Union[Dict, List, str]:
     """
-    Recursively translates string values in a JSON object or list.
-    Keeps all keys in English.
+    Translates all string values in a JSON object or list in a few batched
+    requests (see Translation.translate_json_values). Keeps all keys in English.
     """
-    if not data or target_language == 'en':
-        return data
-
     try:
-        if isinstance(data, str):
-            # Base case: translate the string
-            # Avoid translating errors or "not specified" placeholders
-            if data.strip().lower() in ["not specified", "not specified in the provided excerpts."]:
-                return data
-            translated = translate_text(data, target_language)
-            return translated if translated else data
-
-        if isinstance(data, list):
-            # If it's a list, translate each item
-            return [_translate_json_values(item, target_language) for item in data]
-
-        if isinstance(data, dict):
-            # If it's a dict, translate all values, keep keys
-            return {
-                key: _translate_json_values(value, target_language)
-                for key, value in data.items()
-            }
-        
-        # If it's a number, boolean, or other type, just return it
-        return data
-
+        # Avoid translating "not specified" placeholders
+        return translate_json_values(
+            data, target_language,
+            skip=lambda v: v.strip().lower() in _UNTRANSLATED_PLACEHOLDERS,
+        )
     except Exception as e:
-        print(f"--- [TRANSLATE_JSON] Error during recursive translation: {e} ---")
+        print(f"--- [TRANSLATE_JSON] Error during batched translation: {e} ---")
         return data # Return original data on error
 
 
+async def _save_upload(file: UploadFile, dest: Path, max_bytes: int = MAX_UPLOAD_BYTES) -> Dict[str, Any]:
+    """
+    Streams an UploadFile to disk in UPLOAD_CHUNK_BYTES blocks instead of buffering it with
+    `await file.read()`. Hashes the bytes on the way through and rejects oversized uploads
+    (413) as soon as the limit is crossed.
+    Returns {"path": Path, "size": int, "sha256": str}.
+    """
+    declared = getattr(file, "size", None)
+    if declared is not None and declared > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File too large ({declared} bytes, limit {max_bytes}).")
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with dest.open("wb") as f:
+            while True:
+                block = await file.read(UPLOAD_CHUNK_BYTES)
+                if not block:
+                    break
+                size += len(block)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"File too large (limit {max_bytes} bytes).")
+                digest.update(block)
+                f.write(block)
+    except BaseException:
+        dest.unlink(missing_ok=True)
+        raise
+    return {"path": dest, "size": size, "sha256": digest.hexdigest()}
+
+
 def _stream_text_file(text: str, filename: str, media_type: str = "text/plain; charset=utf-8"):
     buf = io.BytesIO(text.encode("utf-8"))
     headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
@@ -357,20 +366,20 @@ def _reset_vector_store(user_id: Optional[str], thread_id: str):
 
 # In api_server.py
 
-def _extract_and_translate_only(local_path: str) -> Dict[str, Any]:
+def _extract_and_translate_only(local_path: str, content_hash: Optional[str] = None) -> Dict[str, Any]:
     """
     Lightweight Processor: Extracts and Translates text ONLY. 
     Does NOT chunk, embed, or store in Pinecone.
     """
-    # 1. Extract Text
-    extraction = extract_text_with_diagnostics(local_path)
+    # 1. Extract Text (cached by content hash)
+    extraction = extract_text_cached(local_path, content_hash=content_hash)
     text = (extraction.get("text") or "").strip()
     
     if not text:
         return {"success": False, "message": "No text extracted from file."}
 
     # 2. Language Detection & Translation (Crucial for Analysis)
-    detection = detect_language(text)
+    detection = detect_language_fast(text)
     original_lang = 'en'
     
     if detection and detection.get('language') and detection.get('confidence', 0) > 0.5:
@@ -394,9 +403,9 @@ def _extract_and_translate_only(local_path: str) -> Dict[str, Any]:
 
 
 # In api_server.py
-def _ingest_no_sqlite_save(local_path: str, file_name: str, user_id: Optional[str], thread_id: str,input_language: str = "en-IN"):
-    # 1. Extract Text
-    extraction = extract_text_with_diagnostics(local_path)
+def _ingest_no_sqlite_save(local_path: str, file_name: str, user_id: Optional[str], thread_id: str,input_language: str = "en-IN", content_hash: Optional[str] = None):
+    # 1. Extract Text (cached by content hash)
+    extraction = extract_text_cached(local_path, content_hash=content_hash)
     text = (extraction.get("text") or "").strip()
     source = extraction.get("source")
     diagnostics = extraction.get("diagnostics", {})
@@ -409,31 +418,47 @@ def _ingest_no_sqlite_save(local_path: str, file_name: str, user_id: Optional[st
             "source": source
         }
 
-    # 2. Language Detection & Translation
-    # We translate to English for better Embedding/Search accuracy
-    detection = detect_language(text)
-    original_lang = 'en'
-    if detection and detection.get('language') and detection.get('confidence', 0) > 0.5:
-        original_lang = detection['language']
-
-    text_to_process = text
-    if original_lang != 'en':
-        translated = translate_text(text, target_language='en')
-        if translated:
-            text_to_process = translated
-            diagnostics['translation'] = f"Detected '{original_lang}', translated to 'en'"
-    
-    # 3. Chunking (Process the English/Translated text)
-    chunks = chunk_text(text_to_process, chunk_size=1000, overlap=200)
-    texts = [c[1] for c in chunks]
+    # 2. Chunking (on the original text, so no single request has to carry the whole document)
+    chunks = chunk_text(text, chunk_size=1000, overlap=200)
+    original_texts = [c[1] for c in chunks]
     
-    if not texts:
+    if not original_texts:
         return {
             "success": False, 
             "message": "No chunks created from file.", 
             "diagnostics": diagnostics, 
             "source": source
         }
+
+    # 3. Per-chunk Language Detection & Translation
+    # Non-English chunks are translated to English for better Embedding/Search accuracy;
+    # English chunks of a mixed-language bundle are left untouched. A multilingual
+    # embedding model indexes the original text directly.
+    detections = detect_languages_fast(original_texts)
+    chunk_langs = [
+        d["language"] if d and d.get("language") and d.get("confidence", 0) > 0.5 else "en"
+        for d in detections
+    ]
+    foreign = [] if is_multilingual() else [i for i, lang in enumerate(chunk_langs) if lang != "en"]
+    texts = list(original_texts)
+    translated_idx = set()
+    if foreign:
+        translated = translate_texts([original_texts[i] for i in foreign], target_language="en")
+        for i, t in zip(foreign, translated):
+            if t:
+                texts[i] = t
+                translated_idx.add(i)
+            else:
+                print(f"--- [Ingest] Translation failed for chunk {i} ({chunk_langs[i]}); indexing original text ---")
+        diagnostics["translation"] = (
+            f"Translated {sum(1 for t in translated if t)}/{len(foreign)} non-English chunks to 'en'"
+        )
+
+    # Document language = the language covering the most characters
+    lang_chars: Dict[str, int] = {}
+    for lang, chunk in zip(chunk_langs, original_texts):
+        lang_chars[lang] = lang_chars.get(lang, 0) + len(chunk)
+    original_lang = max(lang_chars, key=lang_chars.get)
     
     # 4. Embed CLEAR TEXT (So the AI can understand and search it)
     vecs = embed_texts(texts)
@@ -443,27 +468,15 @@ def _ingest_no_sqlite_save(local_path: str, file_name: str, user_id: Optional[st
     # 5. Prepare Metadata (Encrypting the text for storage)
     metadatas = []
     for i in range(len(texts)):
-        # Get the clear text snippet
-        clear_text_snippet = texts[i][:4000]
-        
-        # --- ENCRYPTION LOGIC ---
-        # We encrypt the text so it is unreadable in the Pinecone Dashboard
-        if 'cipher' in globals() and cipher:
-            try:
-                stored_text = cipher.encrypt(clear_text_snippet.encode()).decode()
-            except Exception as e:
-                print(f"--- [Ingest] Encryption failed for chunk {i}: {e} ---")
-                stored_text = clear_text_snippet # Fallback to clear text
-        else:
-            stored_text = clear_text_snippet
-        # ------------------------
-
-        metadatas.append({
+        md = {
             "file_name": file_name,
             "chunk_id": ids[i],
-            "text": stored_text,  # Store ENCRYPTED text
-            "original_language": original_lang,
-        })
+            "text": _encrypt_chunk_text(texts[i][:4000]),  # Store ENCRYPTED text
+            "original_language": chunk_langs[i],
+        }
+        if i in translated_idx:
+            md["original_text"] = _encrypt_chunk_text(original_texts[i][:4000])
+        metadatas.append(md)
 
     # 6. Upsert to Pinecone
     dim = get_embedding_dimension()
@@ -480,6 +493,16 @@ def _ingest_no_sqlite_save(local_path: str, file_name: str, user_id: Optional[st
     }
 
 
+def _encrypt_chunk_text(clear_text: str) -> str:
+    """Encrypt a chunk for Pinecone metadata; falls back to clear text if no cipher."""
+    if 'cipher' in globals() and cipher:
+        try:
+            return cipher.encrypt(clear_text.encode()).decode()
+        except Exception:
+            return clear_text
+    return clear_text
+
+
 def _ingest_audio_no_sqlite_save(
     local_path: str, 
     file_name: str, 
@@ -487,66 +510,73 @@ def _ingest_audio_no_sqlite_save(
     thread_id: str,
     input_language: str = "en-US"  # <--- ADD THIS PARAMETER
 ):
+    """
+    Transcribe long audio as silence-bounded segments in parallel. Each segment is
+    chunked, embedded and upserted as soon as its transcript arrives, so indexing
+    overlaps with the remaining recognize calls.
+    """
     try:
-        # Step 1: Transcribe the audio file
-        # Ensure speech_to_text_from_local_file in ocr.py accepts language_code
-        speech_result = speech_to_text_from_local_file(local_path, language_code=input_language)
-        
-        transcript = speech_result.get("transcript", "")
-        detected_lang_code = speech_result.get("detected_language", input_language)
-
-        if not transcript or transcript.startswith("(speech error"):
-            return {"success": False, "message": f"Could not produce transcript. Reason: {transcript}"}
+        # One ffmpeg decode straight from the file; segments are sliced from this PCM
+        try:
+            pcm = decode_to_pcm(local_path)["pcm"]
+        except AudioDecodeError as e:
+            return {"success": False, "message": f"Could not decode audio: {e}"}
 
-        text = transcript.strip()
-        # Use the language code we detected or passed
-        original_lang = detected_lang_code.split('-')[0] 
+        if input_language.lower() == "auto":
+            input_language = detect_language_from_pcm(pcm, user_id)
+        original_lang = input_language.split('-')[0]
         source = f"audio:{file_name}"
-        diagnostics = {
-            "transcript_length": len(text.split()),
-            "detected_audio_language": detected_lang_code
-        }
-
-        # Step 2: Chunk + Embed + Store as usual
-        chunks = chunk_text(text, chunk_size=1000, overlap=200)
-        texts = [c[1] for c in chunks]
-        if not texts:
-            return {"success": False, "message": "No chunks created from transcript.", "transcript": transcript}
-
-        vecs = embed_texts(texts)
-        vecs_list = [v.astype("float32").tolist() for v in vecs]
-        ids = [c[0] for c in chunks]
 
-        # Encrypt metadata
-        metadatas = []
-        for i in range(len(texts)):
-            clear_text_snippet = texts[i][:4000]
-            
-            # Encryption Logic
-            if 'cipher' in globals() and cipher:
-                try:
-                    stored_text = cipher.encrypt(clear_text_snippet.encode()).decode()
-                except Exception:
-                    stored_text = clear_text_snippet
-            else:
-                stored_text = clear_text_snippet
+        dim = get_embedding_dimension()
+        index = get_or_create_index(dim)
+        ns = namespace(user_id, thread_id)
 
-            metadatas.append({
+        segments = []
+        failed = []
+        total_chunks = 0
+        # Step 1 + 2: Transcribe segments concurrently; chunk + embed + store each on completion
+        for seg in iter_transcribed_segments(pcm=pcm, language_code=input_language):
+            segments.append(seg)
+            if seg.get("error"):
+                failed.append(seg["index"])
+                print(f"--- [Audio Ingest] Segment {seg['index']} failed: {seg['error']} ---")
+                continue
+            text = seg["transcript"]
+            chunks = chunk_text(text, chunk_size=1000, overlap=200) if text else []
+            if not chunks:
+                continue
+
+            texts = [c[1] for c in chunks]
+            vecs = embed_texts(texts)
+            vecs_list = [v.astype("float32").tolist() for v in vecs]
+            ids = [c[0] for c in chunks]
+            metadatas = [{
                 "file_name": file_name,
                 "chunk_id": ids[i],
-                "text": stored_text, # Encrypted
+                "text": _encrypt_chunk_text(texts[i][:4000]), # Encrypted
                 "source": source,
-                "original_language": original_lang
-            })
+                "original_language": original_lang,
+                "start_ms": seg["start_ms"],
+                "end_ms": seg["end_ms"],
+            } for i in range(len(texts))]
+            total_chunks += upsert_chunks(index, ns, vecs_list, ids, metadatas)
+
+        transcript = stitch_segments(segments)
+        if not transcript:
+            errors = [s["error"] for s in segments if s.get("error")]
+            reason = errors[0] if errors else "empty transcript"
+            return {"success": False, "message": f"Could not produce transcript. Reason: {reason}"}
 
-        dim = get_embedding_dimension()
-        index = get_or_create_index(dim)
-        ns = namespace(user_id, thread_id)
-        upsert_chunks(index, ns, vecs_list, ids, metadatas)
+        diagnostics = {
+            "transcript_length": len(stitch_segments(segments, timestamps=False).split()),
+            "detected_audio_language": input_language,
+            "segments": len(segments),
+            "failed_segments": sorted(failed),
+        }
 
         return {
             "success": True,
-            "message": f"Ingested {len(chunks)} audio chunks (source={source}, lang={original_lang})",
+            "message": f"Ingested {total_chunks} audio chunks from {len(segments)} segments (source={source}, lang={original_lang})",
             "transcript": transcript,
             "diagnostics": diagnostics,
             "source": source,
@@ -567,6 +597,26 @@ async def root():
 def health():
     return {"ok": True}
 
+@app.get("/api/debug/cache-stats")
+def api_cache_stats():
+    return {
+        "extraction": get_extraction_cache_stats(),
+        "translation": get_translation_cache_stats(),
+        "tts": get_tts_cache_stats(),
+        "llm": get_llm_cache_stats(),
+    }
+
+@app.get("/api/debug/llm-stats")
+def api_llm_stats():
+    """Per-agent model call latency, tokens, retries and failure rates, plus scheduler/cache state."""
+    llm_cache = get_llm_cache_stats()
+    return {
+        "agents": get_agent_stats(),
+        "scheduler": get_llm_scheduler_stats(),
+        "cache": {"hit_rate": llm_cache.get("hit_rate"), "saved": llm_cache.get("saved")},
+        "singleflight": llm_cache.get("singleflight"),
+    }
+
 @app.post("/api/study-guide")
 def study_guide(req: StudyGuideReq):
     """
@@ -621,13 +671,7 @@ def timeline(req: TimelineReq):
     try:
         result = generate_timeline(req.user_id, req.thread_id, max_snippets=req.max_snippets)
         if req.output_language and req.output_language != 'en':
-            timeline_events = result.get("timeline", [])
-            for item in timeline_events:
-                event = item.get("event", "")
-                if event:
-                    translated_event = translate_text(event, req.output_language)
-                    if translated_event:
-                        item["event"] = translated_event
+            translate_fields(result.get("timeline", []), ["event"], req.output_language)
 
         return result
 
@@ -644,24 +688,12 @@ def api_predictive_output(req: PredictiveOutputReq):
 
         if req.output_language and req.output_language != 'en':
             prediction = result.get("prediction", {})
-            disclaimer = prediction.get("disclaimer", "")
-            if disclaimer:
-                translated_disclaimer = translate_text(disclaimer, req.output_language)
-                if translated_disclaimer:
-                    prediction["disclaimer"] = translated_disclaimer
-
-            scenarios = prediction.get("scenarios", [])
-            for scenario in scenarios:
-                outcome = scenario.get("outcome", "")
-                if outcome:
-                    translated_outcome = translate_text(outcome, req.output_language)
-                    if translated_outcome:
-                        scenario["outcome"] = translated_outcome
-                reasoning = scenario.get("reasoning", "")
-                if reasoning:
-                    translated_reasoning = translate_text(reasoning, req.output_language)
-                    if translated_reasoning:
-                        scenario["reasoning"] = translated_reasoning
+            # Disclaimer plus outcome/reasoning of every scenario, in one batched pass
+            translate_fields(
+                [prediction] + prediction.get("scenarios", []),
+                ["disclaimer", "outcome", "reasoning"],
+                req.output_language,
+            )
 
         return result
 
@@ -675,9 +707,8 @@ async def ingest(user_id: Optional[str] = Form(default=None), thread_id: str = F
         _reset_vector_store(user_id, thread_id)
     save_name = f"{thread_id}_{file.filename}"
     local_path = UPLOAD_DIR / save_name
-    with local_path.open("wb") as f:
-        f.write(await file.read())
-    result = _ingest_no_sqlite_save(str(local_path), file.filename, user_id, thread_id)
+    saved = await _save_upload(file, local_path)
+    result = _ingest_no_sqlite_save(str(local_path), file.filename, user_id, thread_id, content_hash=saved["sha256"])
     if not result.get("success"):
         raise HTTPException(status_code=422, detail=result)
     return result
@@ -690,15 +721,14 @@ async def ingest_audio(
     thread_id: str = Form(default=None),
     file: UploadFile = File(...),
     replace: bool = Form(False),
-    input_language: str = Form("en-IN") # <--- New Form Field
+    input_language: str = Form("en-IN") # <--- New Form Field ("auto" to detect)
 ):
     if replace:
         _reset_vector_store(user_id, thread_id)
     
     save_name = f"{thread_id}_{file.filename}"
     local_path = UPLOAD_DIR / save_name
-    with local_path.open("wb") as f:
-        f.write(await file.read())
+    await _save_upload(file, local_path, max_bytes=MAX_AUDIO_UPLOAD_BYTES)
     
     # Pass the language code to the logic function
     result = _ingest_audio_no_sqlite_save(
@@ -734,12 +764,38 @@ from fastapi.responses import StreamingResponse
 
 # In api_server.py
 
-@app.post("/api/ask")
-def api_ask(req: AskReq):
-    # --- Step 1: Translate query (Keep existing logic) ---
+_FOLLOWUP_MARKER = "||Q1:"
+_FOLLOWUP_INSTRUCTION = (
+    "\n\n**BONUS TASK:** At the very end of your response, strictly on a new line, "
+    "generate exactly 2 relevant follow-up questions the USER should ask you next based on this topic. "
+    "Format them as: `||Q1: [Question]||Q2: [Question]||` so I can parse them easily."
+)
+
+
+def _split_followups(text: str):
+    """Split a model answer into (clean Markdown answer, [follow-up questions])."""
+    if _FOLLOWUP_MARKER not in text:
+        return text, []
+    answer, remainder = text.split(_FOLLOWUP_MARKER, 1)
+    questions = []
+    if "||Q2:" in remainder:
+        q1_part, q2_part = remainder.split("||Q2:", 1)
+        questions = [q.replace("||", "").strip() for q in (q1_part, q2_part)]
+    else:
+        questions = [remainder.replace("||", "").strip()]
+    return answer.strip(), [q for q in questions if q]
+
+
+def _is_low_confidence(answer: str) -> bool:
+    return "CONFIDENCE_LOW" in answer or "Not stated in document" in answer
+
+
+def _prepare_ask(req: AskReq):
+    """Query translation + retrieval + prompt for /api/ask. Returns (system, user, sources, query)."""
+    # --- Step 1: Translate query (not needed when the index is multilingual) ---
     query_to_process = req.query
-    if req.query.strip():
-        query_lang_detection = detect_language(req.query)
+    if req.query.strip() and not is_multilingual():
+        query_lang_detection = detect_language_fast(req.query)
         if query_lang_detection and query_lang_detection.get('language') != 'en':
             translated_query = translate_text(req.query, target_language='en')
             if translated_query:
@@ -762,7 +818,10 @@ def api_ask(req: AskReq):
             context_blobs.append(f"--- From file: {fn} ---\n{text}\n")
             sources.append({"file_name": fn, "preview": text[:300]})
 
-        context_combined = "\n\n".join(context_blobs)
+        # Best excerpts per token within the "ask" budget, cut only at sentence ends
+        context_combined = pack_chunks(
+            context_blobs, "ask", scores=[r.get("score", 0.0) for r in hits]
+        )["text"]
 
     # --- Process History ---
     history_text = ""
@@ -772,45 +831,31 @@ def api_ask(req: AskReq):
         history_text += f"{role_label}: {msg.content}\n"
 
     # --- Build Prompt with Follow-up Instruction ---
-    base_prompt = build_strict_system_prompt(context_combined, chat_history_str=history_text)
+    base_prompt = build_strict_system_prompt(context_combined, chat_history_str=history_text, agent=None)
     
     # Append the hidden instruction to the system prompt
-    system_prompt_rag = base_prompt + (
-        "\n\n**BONUS TASK:** At the very end of your response, strictly on a new line, "
-        "generate exactly 2 relevant follow-up questions the USER should ask you next based on this topic. "
-        "Format them as: `||Q1: [Question]||Q2: [Question]||` so I can parse them easily."
-    )
+    system_prompt_rag = base_prompt + _FOLLOWUP_INSTRUCTION
     
     user_prompt_rag = query_to_process.strip()
+    return system_prompt_rag, user_prompt_rag, sources, query_to_process
+
+
+@app.post("/api/ask")
+def api_ask(req: AskReq):
+    system_prompt_rag, user_prompt_rag, sources, query_to_process = _prepare_ask(req)
 
     # --- Call Model ---
     ai_response_text = call_model_system_then_user(
-        system_prompt_rag, user_prompt_rag, temperature=0.2
+        system_prompt_rag, user_prompt_rag, temperature=0.2, priority="interactive",
+        agent="ask",
     )
     
     # --- Extract Follow-up Questions & Clean Answer ---
-    final_answer_string = ai_response_text
-    follow_up_questions = []
-
-    if "||Q1:" in ai_response_text:
-        parts = ai_response_text.split("||Q1:")
-        final_answer_string = parts[0].strip() # The clean Markdown answer
-        
-        # Extract the questions from the hidden part
-        remainder = parts[1]
-        if "||Q2:" in remainder:
-            try:
-                q1_part, q2_part = remainder.split("||Q2:")
-                q1_clean = q1_part.strip()
-                q2_clean = q2_part.replace("||", "").strip()
-                if q1_clean: follow_up_questions.append(q1_clean)
-                if q2_clean: follow_up_questions.append(q2_clean)
-            except Exception as e:
-                print(f"--- [API Ask] Error parsing follow-ups: {e}")
+    final_answer_string, follow_up_questions = _split_followups(ai_response_text)
 
     # --- Step 4: Check Confidence & Web Search ---
     # If the AI explicitly says "CONFIDENCE_LOW", we switch to Web Search
-    if "CONFIDENCE_LOW" in final_answer_string or "Not stated in document" in final_answer_string:
+    if _is_low_confidence(final_answer_string):
         print(f"--- [API Ask] Low confidence detected. Switching to Web Search. ---")
         
         web_context = google_search(query_to_process)
@@ -819,8 +864,10 @@ def api_ask(req: AskReq):
         system_prompt_web = WEB_ANSWER_SYSTEM_PROMPT.format(web_context=web_context)
         user_prompt_web = query_to_process
         
+        # Live search results: never serve this from the LLM cache
         web_answer = call_model_system_then_user(
-            system_prompt_web, user_prompt_web
+            system_prompt_web, user_prompt_web, cache=False, priority="interactive",
+            agent="ask_web",
         )
         final_answer_string = web_answer
         sources = [] # Clear document sources
@@ -831,19 +878,12 @@ def api_ask(req: AskReq):
     final_followups = follow_up_questions
 
     if req.output_language and req.output_language != 'en':
-        # Translate Answer
-        if final_answer_string:
-            translated = translate_text(final_answer_string, target_language=req.output_language)
-            if translated:
-                final_answer_translated = translated
-        
-        # Translate Follow-up Questions
+        # Translate Answer + Follow-up Questions together
+        texts = [final_answer_string] + list(follow_up_questions or [])
+        translated = translate_texts(texts, target_language=req.output_language)
+        final_answer_translated = translated[0] or final_answer_string
         if follow_up_questions:
-            translated_qs = []
-            for q in follow_up_questions:
-                tq = translate_text(q, target_language=req.output_language)
-                translated_qs.append(tq if tq else q)
-            final_followups = translated_qs
+            final_followups = [tq or q for q, tq in zip(follow_up_questions, translated[1:])]
 
     return {
         "success": True, 
@@ -853,6 +893,153 @@ def api_ask(req: AskReq):
     }
 
 
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class _FollowupStripper:
+    """
+    Streaming filter that passes answer text through and withholds the hidden
+    `||Q1:...||Q2:...||` block. Text that might be the start of the marker is held
+    back until the next chunk disambiguates it.
+    """
+
+    def __init__(self):
+        self.pending = ""
+        self.hidden = None  # text after the marker, once seen
+        self.answer = []
+
+    def feed(self, text: str) -> str:
+        if self.hidden is not None:
+            self.hidden += text
+            return ""
+        buf = self.pending + text
+        idx = buf.find(_FOLLOWUP_MARKER)
+        if idx >= 0:
+            self.hidden = buf[idx + len(_FOLLOWUP_MARKER):]
+            visible, self.pending = buf[:idx], ""
+        else:
+            keep = 0
+            for n in range(min(len(_FOLLOWUP_MARKER) - 1, len(buf)), 0, -1):
+                if _FOLLOWUP_MARKER.startswith(buf[-n:]):
+                    keep = n
+                    break
+            visible, self.pending = buf[:len(buf) - keep], buf[len(buf) - keep:]
+        self.answer.append(visible)
+        return visible
+
+    def finish(self):
+        """(rest of the visible text, full answer, follow-up questions)."""
+        rest = "" if self.hidden is not None else self.pending
+        self.answer.append(rest)
+        full = "".join(self.answer)
+        if self.hidden is None:
+            return rest, full.strip(), []
+        _, questions = _split_followups(_FOLLOWUP_MARKER + self.hidden)
+        return rest, full.strip(), questions
+
+
+class _ParagraphTranslator:
+    """Buffers streamed English text and releases it translated, one paragraph at a time."""
+
+    def __init__(self, target_language: Optional[str]):
+        self.target = target_language if target_language and target_language != "en" else None
+        self.buf = ""
+
+    def feed(self, text: str) -> str:
+        if not self.target:
+            return text
+        self.buf += text
+        out = []
+        while "\n\n" in self.buf:
+            para, self.buf = self.buf.split("\n\n", 1)
+            if para.strip():
+                out.append((translate_text(para, self.target) or para) + "\n\n")
+            else:
+                out.append("\n\n")
+        return "".join(out)
+
+    def flush(self) -> str:
+        rest, self.buf = self.buf, ""
+        if not self.target or not rest.strip():
+            return rest
+        return translate_text(rest, self.target) or rest
+
+
+def _stream_answer(endpoint: str, system_prompt: str, user_prompt: str, temperature: Optional[float],
+                   output_language: Optional[str], timing: Dict[str, Any], stripper: Optional[_FollowupStripper] = None):
+    """
+    Yield SSE `token` events for one streamed model answer and return
+    (full answer without the follow-up block, follow-up questions).
+    Records time-to-first-token for `endpoint` in the metrics and in `timing`.
+    """
+    translator = _ParagraphTranslator(output_language)
+    first = True
+    for chunk in stream_model(system_prompt, user_prompt, temperature=temperature, priority="interactive", agent=endpoint):
+        if first:
+            first = False
+            ttft = time.perf_counter() - timing["started"]
+            LLM_TTFT_SECONDS.observe(ttft, endpoint=endpoint)
+            timing.setdefault("ttft_ms", round(ttft * 1000, 1))
+        visible = stripper.feed(chunk) if stripper else chunk
+        out = translator.feed(visible)
+        if out:
+            yield _sse("token", {"text": out})
+    rest, full, questions = stripper.finish() if stripper else ("", "", [])
+    out = translator.feed(rest) + translator.flush()
+    if out:
+        yield _sse("token", {"text": out})
+    return full, questions
+
+
+def _sse_response(events) -> StreamingResponse:
+    return StreamingResponse(events, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.post("/api/ask/stream")
+def api_ask_stream(req: AskReq):
+    """
+    Server-Sent Events version of /api/ask. Events:
+      token      {"text"}               answer text as it is generated (translated per paragraph)
+      reset      {"reason"}             discard streamed text; a web-search answer follows
+      followups  {"follow_up_questions"}
+      sources    {"sources"}
+      done       {"ttft_ms"} / error {"message"}
+    """
+    timing = {"started": time.perf_counter()}
+
+    def _events():
+        stripper = _FollowupStripper()
+        try:
+            # Retrieval/translation runs inside the stream so its failures arrive as an error event
+            system_prompt_rag, user_prompt_rag, sources, query_to_process = _prepare_ask(req)
+            full, follow_up_questions = yield from _stream_answer(
+                "ask", system_prompt_rag, user_prompt_rag, 0.2, req.output_language, timing, stripper
+            )
+            answer_sources = sources
+            if _is_low_confidence(full):
+                print("--- [API Ask Stream] Low confidence detected. Switching to Web Search. ---")
+                yield _sse("reset", {"reason": "low_confidence"})
+                web_context = google_search(query_to_process)
+                yield from _stream_answer(
+                    "ask_web", WEB_ANSWER_SYSTEM_PROMPT.format(web_context=web_context), query_to_process,
+                    None, req.output_language, timing,
+                )
+                answer_sources, follow_up_questions = [], []
+            if follow_up_questions and req.output_language and req.output_language != 'en':
+                follow_up_questions = [tq or q for q, tq in zip(
+                    follow_up_questions, translate_texts(follow_up_questions, req.output_language))]
+            yield _sse("followups", {"follow_up_questions": follow_up_questions})
+            yield _sse("sources", {"sources": answer_sources})
+            yield _sse("done", {"ttft_ms": timing.get("ttft_ms")})
+        except Exception as e:
+            print(f"--- [API Ask Stream] Error: {e} ---")
+            yield _sse("error", {"message": f"(model error: {e})"})
+
+    return _sse_response(_events())
+
+
 
 @app.post("/api/suggest-case-law")
 def api_suggest_case_law(req: CaseLawReq):
@@ -868,13 +1055,7 @@ def api_suggest_case_law(req: CaseLawReq):
 
         # Translation (if requested)
         if req.output_language and req.output_language.lower() != "en":
-            for case in result.get("suggested_cases", []):
-                # --- NEW: Translate the "relevance" field ---
-                if "relevance" in case:
-                    case["relevance"] = translate_text(case["relevance"], req.output_language)
-                # --- END OF NEW ---
-                if "snippet" in case:
-                    case["snippet"] = translate_text(case["snippet"], req.output_language)
+            translate_fields(result.get("suggested_cases", []), ["relevance", "snippet"], req.output_language)
 
         return result
 
@@ -882,17 +1063,27 @@ def api_suggest_case_law(req: CaseLawReq):
         raise HTTPException(status_code=500, detail=f"Error suggesting case law: {e}")
 
 @app.post("/api/transcribe-audio")
-async def transcribe_audio(file: UploadFile, user_id: str = Form(""), thread_id: str = Form("")):
+async def transcribe_audio(file: UploadFile, user_id: str = Form(""), thread_id: str = Form(""), language: str = Form("en-US")):
     try:
         audio_bytes = await file.read()
+        # Decode once (validates + resamples to 16 kHz mono PCM), then recognize the PCM directly
         try:
-            AudioSegment.from_file(io.BytesIO(audio_bytes))
-        except Exception as e:
-            return JSONResponse(content={"success": False, "transcript": f"(speech error: Pydub/FFMPEG failed to decode audio. Error: {e})"}, status_code=422)
-        transcript = speech_to_text_from_bytes(content=audio_bytes, language_code="en-US", enable_automatic_punctuation=True)
+            decoded = decode_to_pcm(audio_bytes)
+        except AudioDecodeError as e:
+            return JSONResponse(content={"success": False, "transcript": f"(speech error: FFMPEG failed to decode audio. Error: {e})"}, status_code=422)
+        del audio_bytes
+        pcm, vad = prepare_for_speech(decoded.pop("pcm"))
+        if language.lower() == "auto":
+            language = detect_language_from_pcm(pcm, user_id or None)
+        transcript = speech_to_text_from_pcm(pcm, language_code=language, enable_automatic_punctuation=True)
         if not transcript or transcript.startswith("(speech error"):
             return JSONResponse(content={"success": False, "transcript": transcript or ""}, status_code=422)
-        return {"success": True, "transcript": transcript}
+        return {
+            "success": True,
+            "transcript": transcript,
+            "language": language,
+            "audio": {**decoded, "vad": vad},
+        }
     except Exception as e:
         return JSONResponse(content={"success": False, "error": str(e)}, status_code=500)
 
@@ -922,17 +1113,11 @@ def faq(req: FAQReq):
         # 2. Translate Question and Answer values if needed
         if req.output_language and req.output_language != 'en':
             print(f"--- [API FAQ] Translating {len(faq_list)} FAQ items to {req.output_language}... ---")
-            for item in faq_list:
-                # Translate question
-                q_en = item.get("question", "")
-                if q_en:
-                    q_translated = translate_text(q_en, target_language=req.output_language)
-                    if q_translated: item["question"] = q_translated
-                # Translate answer
-                a_en = item.get("answer", "")
-                if a_en and a_en != "Not stated in document." and not a_en.startswith("Error"): # Avoid translating errors
-                    a_translated = translate_text(a_en, target_language=req.output_language)
-                    if a_translated: item["answer"] = a_translated
+            translate_fields(
+                faq_list, ["question", "answer"], req.output_language,
+                # Avoid translating errors
+                skip=lambda v: v == "Not stated in document." or v.startswith("Error"),
+            )
 
         # 3. Format the final list into Markdown for the response
         # (Alternatively, you could return the list directly if your frontend prefers that)
@@ -1005,8 +1190,7 @@ async def analyze_form(
     temp_file_path = UPLOAD_DIR / f"{temp_form_id}_{file.filename}"
     
     try:
-        with temp_file_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        await _save_upload(file, temp_file_path)
 
         # 1. OCR Extraction
         try:
@@ -1067,11 +1251,10 @@ async def analyze_form(
         # 5. TRANSLATION LOGIC (UPDATED)
         if output_language and output_language != 'en':
             print(f"--- [Form Analyze] Translating descriptions ONLY to '{output_language}'... ---")
-            for field in final_fields:
-                # A. Translate Description (The "Why" - Keep this in local language)
-                if field.description:
-                    trans_desc = translate_text(field.description, output_language)
-                    if trans_desc: field.description = trans_desc
+            # A. Translate Descriptions (The "Why" - Keep this in local language), batched
+            descriptions = translate_texts([f.description or "" for f in final_fields], output_language)
+            for field, trans_desc in zip(final_fields, descriptions):
+                if trans_desc: field.description = trans_desc
                 
                 # B. Translate Suggestions -> REMOVED
                 # We explicitly DO NOT translate field.suggestions anymore.
@@ -1088,25 +1271,86 @@ async def analyze_form(
 
 # In api_server.py
 
+_AUDIO_ID_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def _audio_response(request: Request, audio: bytes, audio_id: str) -> Response:
+    """
+    Serve cached MP3 bytes with a strong ETag and single-range support, so the
+    browser can revalidate (304) and seek (206) without re-synthesizing.
+    """
+    etag = f'"{audio_id}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=86400",
+        "X-Audio-Id": audio_id,
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    total = len(audio)
+    range_header = request.headers.get("range", "")
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+    if match and (match.group(1) or match.group(2)):
+        start_s, end_s = match.groups()
+        if start_s:
+            start = int(start_s)
+            end = min(int(end_s), total - 1) if end_s else total - 1
+        else:  # suffix range: last N bytes
+            start = max(total - int(end_s), 0)
+            end = total - 1
+        if start >= total or start > end:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{total}"})
+        headers["Content-Range"] = f"bytes {start}-{end}/{total}"
+        return Response(content=audio[start:end + 1], status_code=206, media_type="audio/mpeg", headers=headers)
+
+    return Response(content=audio, media_type="audio/mpeg", headers=headers)
+
+
 @app.post("/api/speak")
-def api_speak(req: SpeakReq):
+def api_speak(req: SpeakReq, request: Request):
     """
-    Generates audio and streams it directly to the frontend for immediate playback.
+    Streams audio to the frontend for immediate playback. Cached MP3s (same text/voice)
+    are served whole with ETag/Range; otherwise sentence segments are synthesized in
+    parallel and streamed in order as soon as the first one is ready. The X-Audio-Id
+    header names a GET /api/speak/{audio_id} URL the player can seek with once the
+    stream has finished (and been cached).
     """
     if not req.text:
         raise HTTPException(status_code=400, detail="No text provided.")
 
-    # 1. Generate Audio
-    audio_bytes = generate_speech_audio(req.text, req.language)
-    
-    if not audio_bytes:
+    audio_id = speech_audio_id(req.text, req.language)
+    cached = get_cached_speech_audio(audio_id)
+    if cached is not None:
+        print(f"--- [API Speak] Cache hit ({len(cached)} bytes, id {audio_id[:12]}) ---")
+        return _audio_response(request, cached, audio_id)
+
+    # Generate Audio (first segment is synthesized before we commit to a 200)
+    audio_id, chunks = stream_speech_audio_cached(req.text, req.language, check_cache=False)
+    first = next(chunks, None)
+    if first is None:
         raise HTTPException(status_code=500, detail="TTS Generation failed.")
 
-    print(f"--- [API Speak] Generated {len(audio_bytes)} bytes. Sending to frontend... ---")
+    print(f"--- [API Speak] First segment ready ({len(first)} bytes, id {audio_id[:12]}). Streaming... ---")
+
+    def _body():
+        yield first
+        yield from chunks
 
-    # 2. Return Raw Bytes (No 'attachment' header)
-    # This allows Javascript to capture it as a Blob and play it instantly.
-    return Response(content=audio_bytes, media_type="audio/mpeg")
+    # Raw MP3 stream (No 'attachment' header) so the player can start right away.
+    return StreamingResponse(_body(), media_type="audio/mpeg", headers={"X-Audio-Id": audio_id})
+
+
+@app.get("/api/speak/{audio_id}")
+def api_speak_cached(audio_id: str, request: Request):
+    """Serve previously generated speech from the TTS cache (supports ETag and Range)."""
+    if not _AUDIO_ID_RE.match(audio_id):
+        raise HTTPException(status_code=404, detail="Unknown audio id.")
+    audio_bytes = get_cached_speech_audio(audio_id)
+    if audio_bytes is None:
+        raise HTTPException(status_code=404, detail="Audio not cached; POST /api/speak to generate it.")
+    return _audio_response(request, audio_bytes, audio_id)
 
 
 
@@ -1121,6 +1365,28 @@ def api_speak(req: SpeakReq):
 from backend_rag.prompts import build_general_system_prompt
 # In api_server.py
 
+def _prepare_general_ask(req: GeneralAskReq):
+    """Query translation + history + prompt for /api/general-ask. Returns (system, user)."""
+    # 1. Translate Query if needed
+    query_to_process = req.query
+    if req.query.strip():
+        query_lang = detect_language_fast(req.query)
+        if query_lang and query_lang.get('language') != 'en':
+            translated = translate_text(req.query, target_language='en')
+            if translated: query_to_process = translated
+
+    # 2. Process History
+    history_text = ""
+    recent_history = req.history[-10:] 
+    for msg in recent_history:
+        role_label = "User" if msg.role == "user" else "AI"
+        history_text += f"{role_label}: {msg.content}\n"
+
+    # 3. Build Prompt
+    # This function now returns the complete System Prompt string
+    return build_general_system_prompt(chat_history_str=history_text), query_to_process
+
+
 @app.post("/api/general-ask")
 def api_general_ask(req: GeneralAskReq):
     """
@@ -1129,24 +1395,7 @@ def api_general_ask(req: GeneralAskReq):
     print(f"--- [General Ask] User: {req.user_id} | Thread: {req.thread_id} ---")
 
     try:
-        # 1. Translate Query if needed
-        query_to_process = req.query
-        if req.query.strip():
-            query_lang = detect_language(req.query)
-            if query_lang and query_lang.get('language') != 'en':
-                translated = translate_text(req.query, target_language='en')
-                if translated: query_to_process = translated
-
-        # 2. Process History
-        history_text = ""
-        recent_history = req.history[-10:] 
-        for msg in recent_history:
-            role_label = "User" if msg.role == "user" else "AI"
-            history_text += f"{role_label}: {msg.content}\n"
-
-        # 3. Build Prompt
-        # This function now returns the complete System Prompt string
-        final_system_prompt = build_general_system_prompt(chat_history_str=history_text)
+        final_system_prompt, query_to_process = _prepare_general_ask(req)
         
         # 4. Call LLM
         # We pass 'final_system_prompt' as the System Instructions
@@ -1154,7 +1403,9 @@ def api_general_ask(req: GeneralAskReq):
         response_text = call_model_system_then_user(
             system_prompt=final_system_prompt,
             user_prompt=query_to_process, 
-            temperature=0.3
+            temperature=0.3,
+            priority="interactive",
+            agent="general_ask",
         )
 
         # 5. Translate Response if needed
@@ -1174,6 +1425,36 @@ def api_general_ask(req: GeneralAskReq):
         raise HTTPException(status_code=500, detail=f"Error processing request: {e}")
 
 
+@app.post("/api/general-ask/stream")
+def api_general_ask_stream(req: GeneralAskReq):
+    """Server-Sent Events version of /api/general-ask (token ... done / error, as /api/ask/stream)."""
+    print(f"--- [General Ask Stream] User: {req.user_id} | Thread: {req.thread_id} ---")
+    timing = {"started": time.perf_counter()}
+
+    def _events():
+        try:
+            final_system_prompt, query_to_process = _prepare_general_ask(req)
+            yield from _stream_answer(
+                "general_ask", final_system_prompt, query_to_process, 0.3, req.output_language, timing
+            )
+            yield _sse("done", {"ttft_ms": timing.get("ttft_ms")})
+        except Exception as e:
+            print(f"--- [General Ask Stream] Error: {e} ---")
+            yield _sse("error", {"message": f"(model error: {e})"})
+
+    return _sse_response(_events())
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus exposition when prometheus_client is installed, otherwise a JSON snapshot."""
+    rendered = render_prometheus()
+    if rendered is None:
+        return metrics_snapshot()
+    body, content_type = rendered
+    return Response(content=body, media_type=content_type)
+
+
 
 @app.post("/api/explain-clauses")
 def api_explain_clauses(req: ClauseReq):
@@ -1189,11 +1470,7 @@ def api_explain_clauses(req: ClauseReq):
 
         # Translate the explanations if needed
         if req.output_language and req.output_language != 'en':
-            for item in result.get("explanations", []):
-                if "explanation" in item:
-                    translated = translate_text(item["explanation"], req.output_language)
-                    if translated:
-                        item["explanation"] = translated
+            translate_fields(result.get("explanations", []), ["explanation"], req.output_language)
         
         return result
 
@@ -1276,8 +1553,7 @@ async def upload_risk_doc(
     
     # 1. Save File
     try:
-        with local_path.open("wb") as f:
-            f.write(await file.read())
+        saved = await _save_upload(file, local_path)
             
         ocr_result = None
         extracted_text = ""
@@ -1315,13 +1591,13 @@ async def upload_risk_doc(
                     
             except Exception as e:
                 print(f"--- [Risk API] PDF Parsing Warning: {e}. Falling back... ---")
-                process_result = _extract_and_translate_only(str(local_path))
+                process_result = _extract_and_translate_only(str(local_path), content_hash=saved["sha256"])
                 extracted_text = process_result.get("extracted_text", "")
 
         else:
             # Non-PDF
             print("--- [Risk API] Non-PDF detected. Using standard extraction. ---")
-            process_result = _extract_and_translate_only(str(local_path))
+            process_result = _extract_and_translate_only(str(local_path), content_hash=saved["sha256"])
             extracted_text = process_result.get("extracted_text", "")
 
         # ... (Rest of the function remains the same) ...
@@ -1356,12 +1632,7 @@ async def upload_risk_doc(
         # 5. Translate Response (Output)
         if output_language and output_language != 'en':
             print(f"--- [Risk API] Translating output to {output_language} ---")
-            for risk in risks:
-                # Helper to translate specific keys
-                for key in ["explanation", "recommendation", "compliance_check"]:
-                    if key in risk:
-                        trans = translate_text(risk[key], output_language)
-                        if trans: risk[key] = trans
+            translate_fields(risks, ["explanation", "recommendation", "compliance_check"], output_language)
 
         # 6. Return Final JSON
         return {"success": True, "risks": risks}
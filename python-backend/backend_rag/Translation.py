@@ -1,9 +1,20 @@
 # backend_rag/translation.py
 from __future__ import annotations
 import os
-from typing import Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
 import html
 
+from .cache import TwoTierCache, sha256_text
+from .config import (
+    TRANSLATION_CACHE_PATH,
+    TRANSLATION_CACHE_TTL,
+    TRANSLATION_CACHE_MEMORY_ITEMS,
+    TRANSLATE_BATCH_MAX_SEGMENTS,
+    TRANSLATE_BATCH_MAX_CHARS,
+    TRANSLATE_MAX_WORKERS,
+)
+
 # --- Google Translate (optional) ---
 try:
     from google.cloud import translate_v2 as translate
@@ -17,6 +28,43 @@ except Exception as e:
 TRANSLATE_AVAILABLE = translate is not None and _gcloud_translate_import_error is None
 _translate_client = None
 
+# Bump when the placeholder protection in translate_text changes, so cached
+# translations made with the old placeholders are not reused.
+PLACEHOLDER_VERSION = "1"
+
+_translation_cache = TwoTierCache(
+    TRANSLATION_CACHE_PATH,
+    ttl_seconds=TRANSLATION_CACHE_TTL,
+    memory_items=TRANSLATION_CACHE_MEMORY_ITEMS,
+    name="TRANSLATION CACHE",
+)
+
+
+def get_translation_cache_stats() -> Dict:
+    return _translation_cache.stats()
+
+
+PLACEHOLDER_MAP = {
+    "### Q:": "___Q_PLACEHOLDER___",
+    "A:": "___A_PLACEHOLDER___"
+}
+
+
+def _protect(text: str) -> str:
+    for k, v in PLACEHOLDER_MAP.items():
+        text = text.replace(k, v)
+    return text
+
+
+def _restore(text: str) -> str:
+    for k, v in PLACEHOLDER_MAP.items():
+        text = text.replace(v, k)
+    return text
+
+
+def _translation_key(text: str, target_language: str) -> str:
+    return f"translate:{PLACEHOLDER_VERSION}:{target_language}:{sha256_text(text)}"
+
 def _get_translate_client():
     """Instantiates and returns a Google Translate client."""
     global _translate_client
@@ -43,15 +91,25 @@ def detect_language(text: str) -> Optional[Dict]:
     Detects the language of a given text snippet.
     Returns a dictionary like {'language': 'hi', 'confidence': 0.98} or None.
     """
+    if not text.strip():
+        return None
+    snippet = text[:500] # Use a snippet for efficiency
+    cache_key = f"detect:{sha256_text(snippet)}"
+    cached = _translation_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
     client = _get_translate_client()
-    if not client or not text.strip():
+    if not client:
         return None
     try:
         # The API requires a non-empty string
-        result = client.detect_language(text[:500]) # Use a snippet for efficiency
-        return result
+        result = client.detect_language(snippet)
     except Exception:
         return None
+    if result and result.get("language"):
+        _translation_cache.put(cache_key, {"language": result["language"], "confidence": result.get("confidence", 0)})
+    return result
 
 # In backend_rag/translation.py
 def translate_text(text: str, target_language: str) -> Optional[str]:
@@ -64,14 +122,14 @@ def translate_text(text: str, target_language: str) -> Optional[str]:
         print("--- [TRANSLATION] FAILED: Input text is empty or whitespace.")
         return None
 
+    cache_key = _translation_key(text, target_language)
+    cached = _translation_cache.get(cache_key)
+    if cached is not None:
+        print("--- [TRANSLATION] Cache hit.")
+        return cached
+
     # Protect Markdown labels
-    placeholder_map = {
-        "### Q:": "___Q_PLACEHOLDER___",
-        "A:": "___A_PLACEHOLDER___"
-    }
-    protected_text = text
-    for k, v in placeholder_map.items():
-        protected_text = protected_text.replace(k, v)
+    protected_text = _protect(text)
 
     client = _get_translate_client()
     if not client:
@@ -85,14 +143,174 @@ def translate_text(text: str, target_language: str) -> Optional[str]:
             print("--- [TRANSLATION] FAILED: 'translatedText' not in API response.")
             return None
 
-        translated = html.unescape(translated)
-
-        # Restore placeholders
-        for k, v in placeholder_map.items():
-            translated = translated.replace(v, k)
+        translated = _restore(html.unescape(translated))
 
+        _translation_cache.put(cache_key, translated)
         return translated
 
     except Exception as e:
         print(f"--- [TRANSLATION] FAILED: Exception during the API call: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+def _pack_translation_batches(texts: List[str]) -> List[List[int]]:
+    """Group indices into batches under the segment-count and character limits."""
+    batches: List[List[int]] = []
+    current: List[int] = []
+    chars = 0
+    for i, t in enumerate(texts):
+        if current and (len(current) >= TRANSLATE_BATCH_MAX_SEGMENTS or chars + len(t) > TRANSLATE_BATCH_MAX_CHARS):
+            batches.append(current)
+            current, chars = [], 0
+        current.append(i)
+        chars += len(t)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def translate_texts(texts: List[str], target_language: str) -> List[Optional[str]]:
+    """
+    Translate many strings with as few API calls as possible. Cached strings are served
+    from the translation cache, the rest are deduplicated, packed into size-bounded
+    batches and sent concurrently. Returns one entry per input (None where the input was
+    empty or its batch failed), in input order.
+    """
+    results: List[Optional[str]] = [None] * len(texts)
+    pending: Dict[str, List[int]] = {}
+    for i, text in enumerate(texts):
+        if not text or not text.strip():
+            continue
+        cached = _translation_cache.get(_translation_key(text, target_language))
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.setdefault(text, []).append(i)
+
+    if not pending:
+        return results
+    client = _get_translate_client()
+    if not client:
+        print("--- [TRANSLATION] FAILED: Translate client not available.")
+        return results
+
+    unique = list(pending)
+    batches = _pack_translation_batches(unique)
+    print(f"--- [TRANSLATION] {len(texts)} strings → {len(unique)} uncached unique in {len(batches)} batch(es) to '{target_language}' ---")
+
+    def _run(batch: List[int]) -> None:
+        try:
+            response = client.translate([_protect(unique[j]) for j in batch], target_language=target_language)
+        except Exception as e:
+            print(f"--- [TRANSLATION] Batch of {len(batch)} failed: {e}")
+            return
+        for j, item in zip(batch, response):
+            translated = item.get("translatedText")
+            if not translated:
+                continue
+            translated = _restore(html.unescape(translated))
+            _translation_cache.put(_translation_key(unique[j], target_language), translated)
+            for i in pending[unique[j]]:
+                results[i] = translated
+
+    if len(batches) == 1:
+        _run(batches[0])
+    else:
+        with ThreadPoolExecutor(max_workers=min(TRANSLATE_MAX_WORKERS, len(batches))) as pool:
+            list(pool.map(_run, batches))
+    return results
+
+
+def detect_languages(texts: List[str]) -> List[Optional[Dict]]:
+    """
+    Batched detect_language: one {'language', 'confidence'} (or None) per input,
+    using the translation cache and size-bounded concurrent batches.
+    """
+    results: List[Optional[Dict]] = [None] * len(texts)
+    pending: Dict[str, List[int]] = {}
+    for i, text in enumerate(texts):
+        if not text or not text.strip():
+            continue
+        snippet = text[:500]
+        cached = _translation_cache.get(f"detect:{sha256_text(snippet)}")
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.setdefault(snippet, []).append(i)
+
+    client = _get_translate_client()
+    if not pending or not client:
+        return results
+
+    unique = list(pending)
+
+    def _run(batch: List[int]) -> None:
+        try:
+            response = client.detect_language([unique[j] for j in batch])
+        except Exception as e:
+            print(f"--- [TRANSLATION] Detect batch of {len(batch)} failed: {e}")
+            return
+        for j, item in zip(batch, response):
+            if not item or not item.get("language"):
+                continue
+            found = {"language": item["language"], "confidence": item.get("confidence", 0)}
+            _translation_cache.put(f"detect:{sha256_text(unique[j])}", found)
+            for i in pending[unique[j]]:
+                results[i] = found
+
+    batches = _pack_translation_batches(unique)
+    with ThreadPoolExecutor(max_workers=min(TRANSLATE_MAX_WORKERS, len(batches))) as pool:
+        list(pool.map(_run, batches))
+    return results
+
+
+def translate_json_values(
+    data: Any,
+    target_language: str,
+    skip: Optional[Callable[[str], bool]] = None,
+) -> Any:
+    """
+    Translate every string leaf of a JSON-like structure (dicts/lists), keeping keys in
+    English. All leaves are collected first and translated together through
+    translate_texts; leaves for which skip(text) is true are left alone. Mutates and
+    returns `data`; untranslated leaves keep their original value.
+    """
+    if not data or target_language == "en":
+        return data
+
+    slots: List[tuple] = []  # (container, key_or_index, text)
+
+    def _collect(node: Any) -> None:
+        items: Iterable = node.items() if isinstance(node, dict) else enumerate(node)
+        for k, v in items:
+            if isinstance(v, str):
+                if v.strip() and not (skip and skip(v)):
+                    slots.append((node, k, v))
+            elif isinstance(v, (dict, list)):
+                _collect(v)
+
+    if isinstance(data, str):
+        return translate_texts([data], target_language)[0] or data
+    if not isinstance(data, (dict, list)):
+        return data
+    _collect(data)
+    translated = translate_texts([text for _, _, text in slots], target_language)
+    for (container, k, _), t in zip(slots, translated):
+        if t:
+            container[k] = t
+    return data
+
+
+def translate_fields(
+    items: List[Dict],
+    keys: Iterable[str],
+    target_language: str,
+    skip: Optional[Callable[[str], bool]] = None,
+) -> List[Dict]:
+    """Batch-translate the given keys of each dict in `items` in place."""
+    keys = list(keys)
+    view = [{k: item[k] for k in keys if isinstance(item.get(k), str)} for item in items]
+    translate_json_values(view, target_language, skip=skip)
+    for item, sub in zip(items, view):
+        item.update(sub)
+    return items
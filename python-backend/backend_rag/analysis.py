@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import json
 import math
 import re
 import os
@@ -15,10 +14,13 @@ import httpx
 # External dependencies used across versions
 from bs4 import BeautifulSoup, NavigableString
 
-from .extract import extract_text_with_diagnostics
+from .extract import extract_text_cached
 from .chunking import chunk_text
 from .models import call_model_system_then_user
+from .llm import parse_json_response
 from .vectorstore_pinecone import get_or_create_index, namespace, query_top_k
+from .embeddings import get_embedding_dimension
+from .context_packer import pack_context, pack_chunks
 from cryptography.fernet import Fernet
 
 from dotenv import load_dotenv
@@ -96,9 +98,9 @@ def _read_ingested_filepath(user_id: Optional[str], thread_id: str) -> Optional[
     Returns the filepath string or None.
     """
     try:
-        index = get_or_create_index(dim=384)
+        index = get_or_create_index(dim=get_embedding_dimension())
         ns = namespace(user_id, thread_id)
-        results = query_top_k(index, ns, query_vec=[0.0] * 384, top_k=1)
+        results = query_top_k(index, ns, query_vec=[0.0] * get_embedding_dimension(), top_k=1)
         if not results:
             return None
         md = results[0].get("metadata", {})
@@ -122,7 +124,7 @@ def quick_analyze(user_id: Optional[str], thread_id: str) -> Dict[str, Any]:
         if not filepath:
             return {"success": False, "message": "No ingested file for analysis."}
 
-        extraction = extract_text_with_diagnostics(filepath)
+        extraction = extract_text_cached(filepath)
         text = (extraction.get("text") or "")
         if not text.strip():
             return {"success": False, "message": "No text extracted for analysis.", "diagnostics": extraction.get("diagnostics", {})}
@@ -144,7 +146,7 @@ def quick_analyze(user_id: Optional[str], thread_id: str) -> Dict[str, Any]:
 
         user_prompt = f"Document excerpts:\n{sample}\n\nReturn: (1) About the document (what it is + purpose), (2) 3-sentence summary, (3) three FACTS bullets, (4) Confidence:"
 
-        summary_text = call_model_system_then_user(system_prompt, user_prompt, temperature=0.2)
+        summary_text = call_model_system_then_user(system_prompt, user_prompt, temperature=0.2, agent="quick_analyze")
 
         tokens = _simple_clean_tokens(text)
         counts = Counter(tokens)
@@ -163,19 +165,18 @@ def quick_analyze_thread(user_id: Optional[str], thread_id: str) -> Dict[str, An
     Uses the improved approach from the newer codebase.
     """
     try:
-        index = get_or_create_index(dim=384)
+        index = get_or_create_index(dim=get_embedding_dimension())
         ns = namespace(user_id, thread_id)
         
-        all_chunks = query_top_k(index, ns, query_vec=[0.0] * 384, top_k=50)
+        all_chunks = query_top_k(index, ns, query_vec=[0.0] * get_embedding_dimension(), top_k=50)
         if not all_chunks:
             return {"success": False, "message": "No ingested file for this thread."}
         
-        text = " ".join([hit.get("metadata", {}).get("text", "") for hit in all_chunks])
+        text = "\n\n".join([hit.get("metadata", {}).get("text", "") for hit in all_chunks])
         if not text.strip():
             return {"success": False, "message": "No text content found for analysis."}
 
-        n = len(text)
-        sample = text[:4000]
+        sample = pack_context(text, "quick_analyze")
 
         system_prompt = (
             "You are a concise legal document analyst for Indian law.\n"
@@ -185,7 +186,7 @@ def quick_analyze_thread(user_id: Optional[str], thread_id: str) -> Dict[str, An
             "(C) three short factual bullet points labelled FACTS, explicitly supported by the excerpts."
         )
         user_prompt = f"Document excerpts:\n{sample}\n\nReturn your analysis."
-        summary_text = call_model_system_then_user(system_prompt, user_prompt, temperature=0.2)
+        summary_text = call_model_system_then_user(system_prompt, user_prompt, temperature=0.2, agent="quick_analyze")
 
         return {"success": True, "summary": summary_text}
     except Exception as e:
@@ -206,7 +207,6 @@ from .vectorstore_pinecone import get_or_create_index, namespace, query_top_k
 from .embeddings import get_embedding_dimension
 from .models import call_model_system_then_user
 from typing import Any, Dict, List, Optional
-import json 
 import re
 
 # ... (Keep your other functions like quick_analyze_thread, generate_faq, etc.) ...
@@ -308,10 +308,10 @@ def _agent_classify_document_type(context: str) -> str:
         "- 'Other Legal Document' (for anything else, like a policy, will, or academic article)\n\n"
         "Respond with the classification string and nothing else."
     )
-    user_prompt = f"Document Excerpts:\n---\n{context[:10000]}\n---\n\nClassification:"
+    user_prompt = f"Document Excerpts:\n---\n{pack_context(context, 'classify')}\n---\n\nClassification:"
     
     try:
-        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.0)
+        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.0, agent="classify")
         
         # Clean up the response to get one of the keys
         if "Case Judgment" in response: return "Case Judgment"
@@ -345,13 +345,13 @@ def _agent_summarize_case_judgment(context: str) -> Dict[str, Any]:
         "- If information for a key is not found, use 'Not specified' or an empty list [].\n"
         "- Output ONLY the JSON object."
     )
-    user_prompt = f"Document Excerpts:\n---\n{context}\n---\n\nExtract summary into JSON:"
+    user_prompt = f"Document Excerpts:\n---\n{pack_context(context, 'study_guide')}\n---\n\nExtract summary into JSON:"
 
     try:
-        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.0)
-        match = re.search(r'\{.*\}', response, re.DOTALL)
-        if match:
-            return json.loads(match.group(0))
+        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.0, agent="study_guide_case")
+        parsed = parse_json_response(response, "study_guide_case")
+        if parsed is not None:
+            return parsed
     except Exception as e:
         print(f"--- [Agent 2] Error parsing case summary: {e} ---")
     
@@ -377,13 +377,13 @@ def _agent_summarize_agreement_contract(context: str) -> Dict[str, Any]:
         "- If information for a key is not found, use 'Not specified' or an empty list [].\n"
         "- Output ONLY the JSON object."
     )
-    user_prompt = f"Document Excerpts:\n---\n{context}\n---\n\nExtract summary into JSON:"
+    user_prompt = f"Document Excerpts:\n---\n{pack_context(context, 'study_guide')}\n---\n\nExtract summary into JSON:"
     
     try:
-        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.0)
-        match = re.search(r'\{.*\}', response, re.DOTALL)
-        if match:
-            return json.loads(match.group(0))
+        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.0, agent="study_guide_contract")
+        parsed = parse_json_response(response, "study_guide_contract")
+        if parsed is not None:
+            return parsed
     except Exception as e:
         print(f"--- [Agent 3] Error parsing agreement summary: {e} ---")
         
@@ -408,13 +408,13 @@ def _agent_summarize_legal_filing(context: str) -> Dict[str, Any]:
         "- If information for a key is not found, use 'Not specified' or an empty list [].\n"
         "- Output ONLY the JSON object."
     )
-    user_prompt = f"Document Excerpts:\n---\n{context}\n---\n\nExtract summary into JSON:"
+    user_prompt = f"Document Excerpts:\n---\n{pack_context(context, 'study_guide')}\n---\n\nExtract summary into JSON:"
     
     try:
-        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.0)
-        match = re.search(r'\{.*\}', response, re.DOTALL)
-        if match:
-            return json.loads(match.group(0))
+        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.0, agent="study_guide_filing")
+        parsed = parse_json_response(response, "study_guide_filing")
+        if parsed is not None:
+            return parsed
     except Exception as e:
         print(f"--- [Agent 4] Error parsing filing summary: {e} ---")
         
@@ -437,13 +437,13 @@ def _agent_summarize_other(context: str) -> Dict[str, Any]:
         "- If information for a key is not found, use 'Not specified' or an empty list [].\n"
         "- Output ONLY the JSON object."
     )
-    user_prompt = f"Document Excerpts:\n---\n{context}\n---\n\nExtract summary into JSON:"
+    user_prompt = f"Document Excerpts:\n---\n{pack_context(context, 'study_guide')}\n---\n\nExtract summary into JSON:"
     
     try:
-        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.0)
-        match = re.search(r'\{.*\}', response, re.DOTALL)
-        if match:
-            return json.loads(match.group(0))
+        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.0, agent="study_guide_other")
+        parsed = parse_json_response(response, "study_guide_other")
+        if parsed is not None:
+            return parsed
     except Exception as e:
         print(f"--- [Agent 5] Error parsing general summary: {e} ---")
         
@@ -517,7 +517,7 @@ def get_term_context(user_id: Optional[str], thread_id: str, term: str) -> Dict[
         if not filepath:
             return {"success": False, "message": "No ingested file for this thread."}
 
-        extraction = extract_text_with_diagnostics(filepath)
+        extraction = extract_text_cached(filepath)
         text = extraction.get("text", "") or ""
         if not text:
             return {"success": False, "message": "No text available."}
@@ -533,7 +533,7 @@ def get_term_context(user_id: Optional[str], thread_id: str, term: str) -> Dict[
 
         q_user = f"Term: {term}\n\nParagraph:\n{paragraph}\n\nDefinition:"
 
-        definition = call_model_system_then_user(q_prompt_sys, q_user, temperature=0.2)
+        definition = call_model_system_then_user(q_prompt_sys, q_user, temperature=0.2, agent="term_context")
         return {"success": True, "term": term, "definition": definition, "snippet": paragraph}
     except Exception as e:
         return {"success": False, "message": f"get_term_context error: {e}"}
@@ -557,10 +557,10 @@ def _faq_agent1_generate_questions(context: str, num_questions: int) -> List[str
         "- Do NOT number the questions.\n"
         "- Do NOT include answers or any other text."
     )
-    user_prompt = f"Document Excerpts:\n---\n{context}\n---\n\nGenerate the questions:"
+    user_prompt = f"Document Excerpts:\n---\n{pack_context(context, 'faq_questions')}\n---\n\nGenerate the questions:"
 
     try:
-        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.3)
+        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.3, agent="faq_questions")
         # Split questions by newline and filter out empty lines
         questions = [q.strip() for q in response.split('\n') if q.strip()]
         print(f"--- [FAQ Agent 1] Generated {len(questions)} questions. ---")
@@ -587,7 +587,9 @@ def _faq_agent2_find_answers(question: str, user_id: Optional[str], thread_id: s
 
         # 2. Build context ONLY from these targeted snippets
         context_blobs = [f"--- Excerpt ---\n{(hit.get('text') or '').strip()}" for hit in hits]
-        context = "\n\n".join(context_blobs)
+        context = pack_chunks(
+            context_blobs, "faq_answer", scores=[hit.get("score", 0.0) for hit in hits]
+        )["text"]
 
         # 3. Use a strict prompt to answer based *only* on this context
         #    This prompt asks ONLY for the plain answer.
@@ -600,7 +602,7 @@ def _faq_agent2_find_answers(question: str, user_id: Optional[str], thread_id: s
         user_prompt = question.strip()
 
         # 4. Get the plain answer string from the LLM
-        answer = call_model_system_then_user(system_prompt, user_prompt, temperature=0.0)
+        answer = call_model_system_then_user(system_prompt, user_prompt, temperature=0.0, agent="faq_answer")
         print(f"--- [FAQ Agent 2] Answer found. ---")
         return answer.strip() # Return only the answer string
             
@@ -633,7 +635,7 @@ def generate_faq(user_id: Optional[str], thread_id: str, max_snippets: int = 8,
         if not snippets:
             return {"success": False, "message": "No valid text snippets found in Pinecone."}
 
-        initial_context = "\n\n---\n\n".join([s[:2000] for s in snippets]) # Limit context size
+        initial_context = "\n\n---\n\n".join(snippets)  # budgeted by the FAQ question agent
 
         # 2. Call Agent 1 to generate questions
         questions = _faq_agent1_generate_questions(initial_context, num_questions)
@@ -697,7 +699,6 @@ def _month_name_to_num(name: str) -> int:
     return months.get(m, 0)
 
 import re
-import json
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 
@@ -714,8 +715,8 @@ def _timeline_agent1_extract_events(context: str) -> str:
         "Ignore dates from footers, headers, or citations.\n"
         "Output each finding on a new line with the format: `DATE | EVENT`."
     )
-    user_prompt = f"Document Text:\n---\n{context}\n---"
-    raw_events = call_model_system_then_user(system_prompt, user_prompt, temperature=0.1)
+    user_prompt = f"Document Text:\n---\n{pack_context(context, 'timeline_events')}\n---"
+    raw_events = call_model_system_then_user(system_prompt, user_prompt, temperature=0.1, agent="timeline_events")
     print(f"--- [Timeline Agent 1] Found raw data: \n{raw_events[:500]}...")
     return raw_events
 
@@ -741,24 +742,21 @@ def _timeline_agent2_structure_and_clean(raw_events: str) -> List[Dict]:
         "CRITICAL RULE: The keys in the JSON objects ('date', 'event') MUST be in English. Do not translate them."
     )
     user_prompt = f"Raw Data to Clean and Review:\n---\n{raw_events}\n---"
-    json_string = call_model_system_then_user(system_prompt, user_prompt, temperature=0.0)
+    json_string = call_model_system_then_user(system_prompt, user_prompt, temperature=0.0, agent="timeline_structure")
     print(f"--- [Timeline Agent 2] Produced structured JSON: {json_string[:500]}...")
-    try:
-        json_match = re.search(r'\[.*\]', json_string, re.DOTALL)
-        if json_match:
-            return json.loads(json_match.group(0))
-        return []
-    except json.JSONDecodeError:
+    parsed = parse_json_response(json_string, "timeline_structure", expect="list")
+    if parsed is None:
         print("--- [Timeline Agent 2] FAILED to parse JSON from LLM response.")
         return []
+    return parsed
 
 def generate_timeline(user_id: Optional[str], thread_id: str, max_snippets: int = 10) -> Dict[str, Any]:
     """Orchestrates the final multi-agent pipeline to generate a focused timeline."""
     try:
         # --- Setup and Context Retrieval ---
-        index = get_or_create_index(dim=384)
+        index = get_or_create_index(dim=get_embedding_dimension())
         ns = namespace(user_id, thread_id)
-        query_result = query_top_k(index, ns, query_vec=[0.0] * 384, top_k=20)
+        query_result = query_top_k(index, ns, query_vec=[0.0] * get_embedding_dimension(), top_k=20)
         if not query_result:
             return {"success": True, "timeline": [], "message": "No document excerpts available for timeline generation."}
         snippets = [
@@ -842,7 +840,6 @@ import time
 import html
 # --- Make sure you have these imports at the top ---
 import httpx
-import json
 import os
 from typing import Any, Dict, List, Optional
 from .vectorstore_pinecone import get_or_create_index, namespace, query_top_k # (and other existing imports)
@@ -867,10 +864,10 @@ def _agent1_extract_searchable_facts(context: str) -> List[str]:
         "Police protection for interfaith couple\n"
         "Validity of anticipatory bail in a 498a case\n"
     )
-    user_prompt = f"Document Excerpts:\n---\n{context}\n---\n\nExtract the 3-5 most important searchable facts/questions:"
+    user_prompt = f"Document Excerpts:\n---\n{pack_context(context, 'case_law_facts')}\n---\n\nExtract the 3-5 most important searchable facts/questions:"
     
     try:
-        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.2)
+        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.2, agent="case_law_facts")
         facts = [f.strip() for f in response.split('\n') if f.strip()]
         print(f"--- [AGENT 1] Extracted facts: {facts} ---")
         return facts[:5] # Limit to 5
@@ -955,14 +952,14 @@ def _agent3_check_relevancy(user_context: str, case: Dict) -> Optional[str]:
     # We also pass the case title in the user prompt to help it spot duplicates
     case_title = case.get('title', 'Unknown Title')
     user_prompt = (
-        f"**USER'S DOCUMENT (Context):**\n{user_context[:2000]}\n\n"
+        f"**USER'S DOCUMENT (Context):**\n{pack_context(user_context, 'case_law_relevance')}\n\n"
         f"**CASE LAW SNIPPET (from '{case_title}'):**\n{case_snippet}\n\n"
         f"**Decision:** (If it's the *same document* or *not relevant*, respond 'NO'. If it's a *different, relevant* case, explain *why* in 1 sentence.)"
     )
     # --- END OF PROMPT CHANGES ---
 
     try:
-        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.0)
+        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.0, agent="case_law_relevance")
         
         # Check for the "NO" response
         if response.strip().upper() == "NO" or "not relevant" in response.lower() or "same document" in response.lower():
@@ -1082,13 +1079,13 @@ def _agent_generate_strategy(context: str, doc_type: str) -> Dict[str, Any]:
             "Return JSON: `{ 'strategies': [{ 'title': 'Deny Liability', 'reasoning': 'No proof of breach attached', 'action_item': 'Draft a denial letter citing lack of evidence' }] }`"
         )
 
-    user_prompt = f"Document Excerpts:\n---\n{context[:20000]}\n---\n\nGenerate Strategic JSON:"
+    user_prompt = f"Document Excerpts:\n---\n{pack_context(context, 'strategy')}\n---\n\nGenerate Strategic JSON:"
 
     try:
-        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.3)
-        match = re.search(r'\{.*\}', response, re.DOTALL)
-        if match:
-            return json.loads(match.group(0))
+        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.3, agent="strategy")
+        parsed = parse_json_response(response, "strategy")
+        if parsed is not None:
+            return parsed
         return {"strategies": []}
     except Exception as e:
         print(f"--- [Strategy Agent] Error: {e} ---")
@@ -1162,16 +1159,15 @@ def _agent_explain_complex_clauses(context: str) -> Dict[str, str]:
         "}"
     )
     
-    user_prompt = f"Document Excerpts:\n---\n{context[:25000]}\n---\n\n" \
+    user_prompt = f"Document Excerpts:\n---\n{pack_context(context, 'explain_clauses')}\n---\n\n" \
                   "Generate the JSON of complex clauses and their simple explanations:"
 
     try:
-        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.1)
+        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.1, agent="explain_clauses")
         
         # Find the JSON object in the response
-        match = re.search(r'\{.*\}', response, re.DOTALL)
-        if match:
-            clauses = json.loads(match.group(0))
+        clauses = parse_json_response(response, "explain_clauses")
+        if clauses is not None:
             print(f"--- [Jargon Buster Agent] Extracted {len(clauses)} clauses. ---")
             return clauses
         else:
@@ -1263,10 +1259,10 @@ def _agent_generate_mindmap_only(context: str) -> str:
         "5. Output ONLY the raw Mermaid syntax (no markdown)."
     )
 
-    user_prompt = f"Document Excerpts:\n---\n{context[:25000]}\n---\n\nGenerate Mermaid mindmap:"
+    user_prompt = f"Document Excerpts:\n---\n{pack_context(context, 'mindmap')}\n---\n\nGenerate Mermaid mindmap:"
 
     try:
-        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.2)
+        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.2, agent="mindmap")
         
         # Clean up formatting
         code = response.replace("```mermaid", "").replace("```", "").strip()
@@ -1323,13 +1319,13 @@ def _agent_generate_event_data(context: str) -> List[Dict[str, str]]:
         "- The 'actor' field is critical for grouping in the UI.\n"
         "- Output ONLY the JSON list."
     )
-    user_prompt = f"Document Excerpts:\n---\n{context[:25000]}\n---\n\nGenerate JSON Timeline:"
+    user_prompt = f"Document Excerpts:\n---\n{pack_context(context, 'structured_timeline')}\n---\n\nGenerate JSON Timeline:"
 
     try:
-        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.1)
-        match = re.search(r'\[.*\]', response, re.DOTALL)
-        if match:
-            return json.loads(match.group(0))
+        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.1, agent="structured_timeline")
+        parsed = parse_json_response(response, "structured_timeline", expect="list")
+        if parsed is not None:
+            return parsed
         return []
     except Exception as e:
         print(f"--- [Timeline Agent] Error: {e} ---")
@@ -1371,11 +1367,11 @@ def _agent_generate_short_summary(context: str) -> str:
         "- Do NOT add introductions like 'This document appears to be...'. Just state the facts.\n"
         "- Keep it under 50 words."
     )
-    user_prompt = f"Document Excerpts:\n---\n{context[:15000]}\n---\n\nSummary:"
+    user_prompt = f"Document Excerpts:\n---\n{pack_context(context, 'short_summary')}\n---\n\nSummary:"
 
     try:
         # Use a lower temperature for factual consistency
-        return call_model_system_then_user(system_prompt, user_prompt, temperature=0.1).strip()
+        return call_model_system_then_user(system_prompt, user_prompt, temperature=0.1, agent="short_summary").strip()
     except Exception as e:
         print(f"--- [Summary Agent] Error: {e} ---")
         return "Summary unavailable."
@@ -1429,7 +1425,7 @@ def _agent_detect_risky_clauses(context: str) -> List[Dict[str, Any]]:
         return []
 
     # 2. Context Limit: Increased to ~100k chars (approx 30-40 pages)
-    safe_context = context[:100000]
+    safe_context = pack_context(context, "risk")
 
     system_prompt = (
         "You are a protective Legal Risk Guide for Indian Law. Your goal is to explain risks to a non-lawyer in simple, everyday language.\n\n"
@@ -1468,12 +1464,11 @@ def _agent_detect_risky_clauses(context: str) -> List[Dict[str, Any]]:
     try:
         # Use a slightly higher temperature (0.3) to ensure it catches nuances, 
         # but keeps the JSON structure strict.
-        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.3)
+        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.3, agent="risk")
         
         # Extract JSON list
-        match = re.search(r'\[.*\]', response, re.DOTALL)
-        if match:
-            risks = json.loads(match.group(0))
+        risks = parse_json_response(response, "risk", expect="list")
+        if risks is not None:
             print(f"--- [Clause Watchdog] Detected {len(risks)} risky clauses. ---")
             return risks
         return []
@@ -1539,13 +1534,13 @@ def _agent_generate_stress_scenarios(context: str, doc_type: str) -> List[Dict[s
         "Return a JSON list of objects: `[{\"question\": \"...\", \"severity\": \"High/Medium\"}]`"
     )
     
-    user_prompt = f"Document Type: {doc_type}\nContext:\n---\n{context[:15000]}\n---\n\nGenerate JSON Scenarios:"
+    user_prompt = f"Document Type: {doc_type}\nContext:\n---\n{pack_context(context, 'stress_scenarios')}\n---\n\nGenerate JSON Scenarios:"
 
     try:
-        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.3)
-        match = re.search(r'\[.*\]', response, re.DOTALL)
-        if match:
-            return json.loads(match.group(0))
+        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.3, agent="stress_scenarios")
+        parsed = parse_json_response(response, "stress_scenarios", expect="list")
+        if parsed is not None:
+            return parsed
         return []
     except Exception as e:
         print(f"--- [Stress Test Agent] Error: {e} ---")
@@ -1563,10 +1558,10 @@ def _agent_simulate_outcome(context: str, question: str) -> str:
         "3. **Markdown:** Use bolding for consequences.\n"
         "4. If the document is silent on this, state: 'The document does not explicitly state a penalty for this.'"
     )
-    user_prompt = f"Document Context:\n{context[:20000]}\n\nUser Question: {question}\n\nAnswer:"
+    user_prompt = f"Document Context:\n{pack_context(context, 'simulate_outcome')}\n\nUser Question: {question}\n\nAnswer:"
     
     try:
-        return call_model_system_then_user(system_prompt, user_prompt, temperature=0.1)
+        return call_model_system_then_user(system_prompt, user_prompt, temperature=0.1, agent="simulate_outcome")
     except Exception:
         return "Could not simulate outcome."
 
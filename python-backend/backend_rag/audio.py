@@ -0,0 +1,194 @@
+# backend_rag/audio.py
+from __future__ import annotations
+
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+
+from .config import (
+    FFMPEG_BINARY,
+    AUDIO_DECODE_TIMEOUT,
+    VAD_ENABLED,
+    VAD_FRAME_MS,
+    VAD_SILENCE_DBFS,
+    VAD_PADDING_MS,
+    VAD_MAX_PAUSE_MS,
+)
+
+PCM_SAMPLE_RATE = 16000
+PCM_SAMPLE_WIDTH = 2  # bytes, signed 16-bit little endian
+PCM_CHANNELS = 1
+
+
+class AudioDecodeError(ValueError):
+    """The input could not be decoded as audio (or ffmpeg is unavailable)."""
+
+
+def _run_ffmpeg(cmd: List[str]) -> Tuple[bytes, float]:
+    """
+    Run ffmpeg and return (stdout, peak RSS in MB of this ffmpeg process).
+    The child is reaped with os.wait4 so the memory figure belongs to this run alone
+    (RUSAGE_CHILDREN would report the largest child the server has ever had).
+    """
+    killed = threading.Event()
+
+    def _kill():
+        killed.set()
+        proc.kill()
+
+    with tempfile.TemporaryFile() as err:
+        try:
+            proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=err)
+        except FileNotFoundError as e:
+            raise AudioDecodeError(f"ffmpeg not found ({FFMPEG_BINARY})") from e
+        timer = threading.Timer(AUDIO_DECODE_TIMEOUT, _kill)
+        timer.start()
+        try:
+            out = proc.stdout.read()
+            proc.stdout.close()
+            _, status, usage = os.wait4(proc.pid, 0)
+        finally:
+            timer.cancel()
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        if killed.is_set():
+            raise AudioDecodeError(f"ffmpeg timed out after {AUDIO_DECODE_TIMEOUT}s")
+        err.seek(0)
+        lines = err.read().decode("utf-8", "ignore").strip().splitlines()
+
+    if proc.returncode != 0 or not out:
+        raise AudioDecodeError(lines[-1] if lines else "no audio stream decoded")
+    # ru_maxrss is reported in kilobytes on Linux.
+    return out, round(usage.ru_maxrss / 1024, 1)
+
+
+def pcm_duration_ms(pcm: bytes) -> int:
+    return len(pcm) * 1000 // (PCM_SAMPLE_RATE * PCM_SAMPLE_WIDTH * PCM_CHANNELS)
+
+
+def decode_to_pcm(source: Union[bytes, str]) -> Dict:
+    """
+    Decode any ffmpeg-readable audio (bytes, or a file path) in one pass straight to
+    16 kHz mono s16le PCM, which Speech-to-Text accepts as LINEAR16 as-is.
+    PCM is read from ffmpeg's stdout, so there is no intermediate WAV export or second
+    decode. Bytes are spooled to a temporary file first: MP4/M4A/MOV with the moov atom
+    at the end can't be demuxed from an unseekable pipe. Decoding doubles as
+    validation: an unreadable upload raises AudioDecodeError.
+
+    Returns {"pcm", "duration_ms", "decode_ms", "ffmpeg_peak_rss_mb"}.
+    """
+    t0 = time.perf_counter()
+    if not isinstance(source, str):
+        with tempfile.NamedTemporaryFile(prefix="audio_", delete=False) as f:
+            f.write(source)
+        try:
+            info = decode_to_pcm(f.name)
+        finally:
+            os.unlink(f.name)
+        info["decode_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        return info
+
+    cmd = [
+        FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-nostdin", "-i", source,
+        "-vn", "-ac", str(PCM_CHANNELS), "-ar", str(PCM_SAMPLE_RATE),
+        "-f", "s16le", "-acodec", "pcm_s16le", "pipe:1",
+    ]
+    pcm, ffmpeg_rss = _run_ffmpeg(cmd)
+
+    info = {
+        "pcm": pcm,
+        "duration_ms": pcm_duration_ms(pcm),
+        "decode_ms": round((time.perf_counter() - t0) * 1000, 1),
+        "ffmpeg_peak_rss_mb": ffmpeg_rss,
+    }
+    print(f"--- [AUDIO] Decoded {info['duration_ms'] / 1000:.1f}s to PCM in {info['decode_ms']} ms "
+          f"(ffmpeg peak RSS {info['ffmpeg_peak_rss_mb']} MB) ---")
+    return info
+
+
+def _voiced_runs(voiced: np.ndarray) -> List[Tuple[int, int, bool]]:
+    """Collapse a per-frame boolean mask into (start, end, is_voiced) runs."""
+    edges = np.flatnonzero(np.diff(voiced.astype(np.int8))) + 1
+    bounds = np.concatenate(([0], edges, [len(voiced)]))
+    return [(int(a), int(b), bool(voiced[a])) for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def trim_silence(
+    pcm: bytes,
+    silence_dbfs: float = VAD_SILENCE_DBFS,
+    frame_ms: int = VAD_FRAME_MS,
+    padding_ms: int = VAD_PADDING_MS,
+    max_pause_ms: int = VAD_MAX_PAUSE_MS,
+) -> Tuple[bytes, Dict]:
+    """
+    Energy-based VAD on 16 kHz mono s16le PCM. Frames are scored by RMS level in dBFS;
+    leading and trailing silence is dropped and internal pauses longer than max_pause_ms
+    are shortened to max_pause_ms (half kept on each side). Speech is padded by
+    padding_ms so word onsets/tails survive. Audio with no voiced frame is returned as-is.
+
+    Returns (pcm, stats) where stats has bytes/seconds before, after and saved.
+    """
+    stats = {
+        "bytes_in": len(pcm),
+        "bytes_out": len(pcm),
+        "bytes_saved": 0,
+        "seconds_saved": 0.0,
+        "voiced": True,
+    }
+    frame_len = PCM_SAMPLE_RATE * frame_ms // 1000
+    samples = np.frombuffer(pcm[: len(pcm) - len(pcm) % PCM_SAMPLE_WIDTH], dtype="<i2")
+    n_frames = len(samples) // frame_len
+    if n_frames == 0:
+        return pcm, stats
+
+    frames = samples[: n_frames * frame_len].reshape(n_frames, frame_len).astype(np.float32)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    dbfs = 20 * np.log10(rms / 32768.0 + 1e-10)
+    voiced = dbfs > silence_dbfs
+    if not voiced.any():
+        stats["voiced"] = False
+        return pcm, stats
+
+    pad = padding_ms // frame_ms
+    if pad:
+        voiced = np.convolve(voiced, np.ones(2 * pad + 1), mode="same") > 0
+
+    keep_half = max(1, max_pause_ms // frame_ms // 2)
+    runs = _voiced_runs(voiced)
+    spans: List[Tuple[int, int]] = []
+    for i, (a, b, is_voiced) in enumerate(runs):
+        if is_voiced:
+            spans.append((a, b))
+        elif i == 0 or i == len(runs) - 1:
+            continue  # leading / trailing silence
+        elif b - a > 2 * keep_half:
+            spans.extend([(a, a + keep_half), (b - keep_half, b)])
+        else:
+            spans.append((a, b))
+
+    # A trailing partial frame belongs to whatever the last full frame was.
+    tail = samples[n_frames * frame_len:] if voiced[-1] else samples[:0]
+    out = np.concatenate([samples[a * frame_len: b * frame_len] for a, b in spans] + [tail])
+    trimmed = out.tobytes()
+
+    saved = len(pcm) - len(trimmed)
+    stats.update(
+        bytes_out=len(trimmed),
+        bytes_saved=saved,
+        seconds_saved=round(saved / (PCM_SAMPLE_RATE * PCM_SAMPLE_WIDTH * PCM_CHANNELS), 2),
+    )
+    return trimmed, stats
+
+
+def prepare_for_speech(pcm: bytes) -> Tuple[bytes, Dict]:
+    """Apply VAD trimming when enabled (VAD_ENABLED) and log what it saved."""
+    if not VAD_ENABLED:
+        return pcm, {"bytes_in": len(pcm), "bytes_out": len(pcm), "bytes_saved": 0, "seconds_saved": 0.0, "voiced": True}
+    trimmed, stats = trim_silence(pcm)
+    print(f"--- [AUDIO] VAD trimmed {stats['seconds_saved']}s "
+          f"({stats['bytes_saved']} of {stats['bytes_in']} bytes) ---")
+    return trimmed, stats
@@ -0,0 +1,232 @@
+# backend_rag/cache.py
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+def sha256_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def sha256_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file's bytes, read in chunks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class DiskLRUCache:
+    """
+    Size-capped on-disk cache of byte blobs, one file per key, spread over 256 shard
+    directories.
+    Recency is tracked through file mtimes (bumped on every hit), so the LRU order
+    survives restarts. When the total size passes max_bytes the oldest entries are
+    removed until the cache is back under 90% of the cap.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, name: str = "cache"):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.name = name
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key: str) -> Path:
+        # Shard on a hash of the whole key: keys share prefixes (e.g. "v2-<sha>"), so key[:2]
+        # would put every entry in one directory.
+        return self.directory / sha256_text(key)[:2] / key
+
+    def _scan_total(self) -> int:
+        if self._total_bytes is None:
+            total = 0
+            if self.directory.exists():
+                for p in self.directory.rglob("*"):
+                    if p.is_file() and not p.name.endswith(".tmp"):
+                        total += p.stat().st_size
+            self._total_bytes = total
+        return self._total_bytes
+
+    def path_for(self, key: str) -> Optional[Path]:
+        """Filesystem path of a cached entry (without counting a hit), or None."""
+        p = self._path(key)
+        return p if p.exists() else None
+
+    def get(self, key: str) -> Optional[bytes]:
+        p = self._path(key)
+        try:
+            data = p.read_bytes()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(p, None)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        p = self._path(key)
+        try:
+            p.parent.mkdir(parents=True, exist_ok=True)
+            old_size = p.stat().st_size if p.exists() else 0
+            tmp = p.with_name(f"{p.name}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, p)
+        except OSError as e:
+            print(f"--- [{self.name}] Write failed for {key[:12]}: {e} ---")
+            return
+        with self._lock:
+            self._total_bytes = self._scan_total() - old_size + len(data)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Delete least recently used entries. Caller holds the lock."""
+        entries = []
+        for p in self.directory.rglob("*"):
+            if p.is_file() and not p.name.endswith(".tmp"):
+                st = p.stat()
+                entries.append((st.st_mtime, st.st_size, p))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        for _, size, p in entries:
+            if total <= target:
+                break
+            try:
+                p.unlink()
+                total -= size
+                self.evictions += 1
+            except OSError:
+                pass
+        self._total_bytes = total
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "bytes": self._scan_total(),
+                "max_bytes": self.max_bytes,
+            }
+
+
+class TwoTierCache:
+    """
+    Small JSON-value cache: an in-memory LRU in front of a SQLite table, both with a TTL.
+    Disk hits are promoted into memory. If the database can't be opened the cache runs
+    memory-only. Safe to share between threads.
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: int, memory_items: int = 4096, name: str = "cache"):
+        self.db_path = db_path
+        self.ttl = ttl_seconds
+        self.memory_items = memory_items
+        self.name = name
+        self._lock = threading.Lock()
+        self._mem: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._db: Optional[sqlite3.Connection] = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        try:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+        except sqlite3.Error as e:
+            print(f"--- [{self.name}] SQLite unavailable at {db_path}, memory only: {e} ---")
+            self._db = None
+
+    def _remember(self, key: str, expires_at: float, value: Any) -> None:
+        """Caller holds the lock."""
+        self._mem[key] = (expires_at, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.memory_items:
+            self._mem.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._mem.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[1]
+                del self._mem[key]
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute("SELECT value, expires_at FROM kv WHERE key = ?", (key,)).fetchone()
+                except sqlite3.Error:
+                    row = None
+                if row is not None and row[1] > now:
+                    value = json.loads(row[0])
+                    self._remember(key, row[1], value)
+                    self.disk_hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: Any) -> None:
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, expires_at, value)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                        (key, json.dumps(value, ensure_ascii=False), expires_at),
+                    )
+                except sqlite3.Error as e:
+                    print(f"--- [{self.name}] Write failed for {key[:24]}: {e} ---")
+
+    def purge_expired(self) -> int:
+        """Delete expired rows from disk; returns how many were removed."""
+        with self._lock:
+            if self._db is None:
+                return 0
+            try:
+                return self._db.execute("DELETE FROM kv WHERE expires_at <= ?", (time.time(),)).rowcount
+            except sqlite3.Error:
+                return 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            disk_entries = None
+            if self._db is not None:
+                try:
+                    disk_entries = self._db.execute("SELECT COUNT(*) FROM kv").fetchone()[0]
+                except sqlite3.Error:
+                    pass
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+                "memory_entries": len(self._mem),
+                "disk_entries": disk_entries,
+            }
@@ -86,12 +86,12 @@ def perform_rag_chat(state: ChatState):
     context_texts = []
     for r in retrieved:
         fn = r.get("file_name", "document")
-        snippet = r.get("text", "")[:1200].replace("\n", " ")
+        snippet = r.get("text", "").replace("\n", " ")
         context_texts.append(f"--- From file: {fn} ---\n{snippet}\n")
     context_combined = "\n\n".join(context_texts)
     
     # Use the JSON prompt from prompts.py
-    system_prompt_text = build_strict_system_prompt(context_combined, max_context_chars=5000)
+    system_prompt_text = build_strict_system_prompt(context_combined, agent="chat")
     system_prompt = SystemMessage(content=system_prompt_text)
     
     # Call the model
@@ -132,7 +132,8 @@ def perform_web_answer(state: ChatState):
     # Call the web_model
     response = call_model_with_messages(
         [SystemMessage(content=system_prompt), HumanMessage(content=user_prompt)],
-        model_instance=model
+        model_instance=model,
+        agent="chat_web",
     )
     
     # Replace the last AI message (the JSON one) with this new, final answer
@@ -13,6 +13,10 @@ load_dotenv()
 DEFAULT_GOOGLE_MODEL = os.getenv("GOOGLE_MODEL", "gemini-2.5-flash")
 DEFAULT_MODEL_TEMPERATURE = float(os.getenv("MODEL_TEMPERATURE", "0.0"))
 EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# "english": translate non-English text to English and embed with EMBEDDING_MODEL.
+# "multilingual": embed original-language text with MULTILINGUAL_EMBEDDING_MODEL (own Pinecone index).
+EMBEDDING_MODE = os.getenv("EMBEDDING_MODE", "english").strip().lower()
+MULTILINGUAL_EMBEDDING_MODEL = os.getenv("MULTILINGUAL_EMBEDDING_MODEL", "paraphrase-multilingual-MiniLM-L12-v2")
 
 ANN_TOP_K = int(os.getenv("ANN_TOP_K", "100"))
 FINAL_TOP_K = int(os.getenv("FINAL_TOP_K", "5"))
@@ -21,3 +25,122 @@ CROSS_ENCODER_MODEL = os.getenv("CROSS_ENCODER_MODEL", "")
 # OCR / Vision
 VISION_GCS_BUCKET = os.getenv("VISION_GCS_BUCKET", "")
 VISION_ASYNC_TIMEOUT = int(os.getenv("VISION_ASYNC_TIMEOUT", "180"))
+VISION_ASYNC_BATCH_SIZE = max(1, min(int(os.getenv("VISION_ASYNC_BATCH_SIZE", "20")), 100))  # pages per output shard
+VISION_ASYNC_POLL_INITIAL = float(os.getenv("VISION_ASYNC_POLL_INITIAL", "1.0"))  # seconds
+VISION_ASYNC_POLL_MAX = float(os.getenv("VISION_ASYNC_POLL_MAX", "8.0"))
+VISION_DOWNLOAD_WORKERS = int(os.getenv("VISION_DOWNLOAD_WORKERS", "8"))
+
+# PDF per-page classification (text layer vs. OCR)
+PDF_TEXT_MIN_DENSITY = float(os.getenv("PDF_TEXT_MIN_DENSITY", "1.0"))  # chars per square inch
+PDF_IMAGE_COVERAGE_OCR = float(os.getenv("PDF_IMAGE_COVERAGE_OCR", "0.6"))  # fraction of page area
+PDF_OCR_MAX_WORKERS = int(os.getenv("PDF_OCR_MAX_WORKERS", "4"))
+PDF_OCR_PAGE_BUDGET = int(os.getenv("PDF_OCR_PAGE_BUDGET", "50"))  # max pages rasterized per file
+PDF_OCR_MAX_DPI = int(os.getenv("PDF_OCR_MAX_DPI", "300"))
+PDF_OCR_MIN_DPI = int(os.getenv("PDF_OCR_MIN_DPI", "150"))
+PDF_OCR_MAX_PIXELS = int(os.getenv("PDF_OCR_MAX_PIXELS", "3500"))  # long side of the rendered page
+VISION_BATCH_SIZE = min(int(os.getenv("VISION_BATCH_SIZE", "16")), 16)  # Vision allows 16 images per request
+VISION_BATCH_MAX_BYTES = int(os.getenv("VISION_BATCH_MAX_BYTES", str(8 * 1024 * 1024)))
+VISION_BATCH_RETRIES = int(os.getenv("VISION_BATCH_RETRIES", "1"))
+
+# Extraction cache (keyed by file content hash)
+EXTRACT_CACHE_DIR = os.getenv("EXTRACT_CACHE_DIR", "/tmp/extract_cache")
+EXTRACT_CACHE_MAX_BYTES = int(os.getenv("EXTRACT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Uploads
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+MAX_AUDIO_UPLOAD_BYTES = int(os.getenv("MAX_AUDIO_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+
+# Speech-to-Text (long audio is split at silences and transcribed in parallel)
+SPEECH_SEGMENT_MAX_MS = int(os.getenv("SPEECH_SEGMENT_MAX_MS", "55000"))  # sync recognize caps at ~60s
+SPEECH_MIN_SILENCE_MS = int(os.getenv("SPEECH_MIN_SILENCE_MS", "400"))
+SPEECH_SILENCE_DB_BELOW_AVG = float(os.getenv("SPEECH_SILENCE_DB_BELOW_AVG", "16"))
+SPEECH_MAX_WORKERS = int(os.getenv("SPEECH_MAX_WORKERS", "4"))
+SPEECH_SHORT_MODEL_MAX_MS = int(os.getenv("SPEECH_SHORT_MODEL_MAX_MS", "15000"))  # longer audio uses 'latest_long'
+# Spoken-language detection: candidates are tried concurrently on a short snippet.
+# Each candidate is one recognize call; extend with e.g. ta-IN,te-IN,mr-IN,bn-IN,kn-IN,ml-IN.
+SPEECH_DETECT_LANGUAGES = [
+    c.strip() for c in os.getenv("SPEECH_DETECT_LANGUAGES", "hi-IN,gu-IN,en-US").split(",") if c.strip()
+]
+SPEECH_DETECT_SNIPPET_MS = int(os.getenv("SPEECH_DETECT_SNIPPET_MS", "10000"))
+SPEECH_DETECT_CONFIDENCE = float(os.getenv("SPEECH_DETECT_CONFIDENCE", "0.85"))  # early exit above this
+SPEECH_DETECT_CACHE_SIZE = int(os.getenv("SPEECH_DETECT_CACHE_SIZE", "1024"))
+SPEECH_DETECT_MAX_WORKERS = int(os.getenv("SPEECH_DETECT_MAX_WORKERS", "3"))  # candidates in flight at once
+
+# Audio preprocessing (single ffmpeg decode to 16 kHz mono s16le PCM)
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+AUDIO_DECODE_TIMEOUT = int(os.getenv("AUDIO_DECODE_TIMEOUT", "120"))  # seconds
+# Energy-based voice activity detection applied before upload to Speech-to-Text
+VAD_ENABLED = os.getenv("VAD_ENABLED", "true").lower() in ("1", "true", "yes")
+VAD_FRAME_MS = int(os.getenv("VAD_FRAME_MS", "30"))
+VAD_SILENCE_DBFS = float(os.getenv("VAD_SILENCE_DBFS", "-45"))  # frames quieter than this are silence
+VAD_PADDING_MS = int(os.getenv("VAD_PADDING_MS", "200"))  # kept around speech so word edges aren't clipped
+VAD_MAX_PAUSE_MS = int(os.getenv("VAD_MAX_PAUSE_MS", "800"))  # longer internal pauses are shortened to this
+
+# Translation cache (memory LRU in front of SQLite)
+TRANSLATION_CACHE_PATH = os.getenv("TRANSLATION_CACHE_PATH", "/tmp/translation_cache.sqlite3")
+TRANSLATION_CACHE_TTL = int(os.getenv("TRANSLATION_CACHE_TTL", str(30 * 24 * 3600)))  # seconds
+TRANSLATION_CACHE_MEMORY_ITEMS = int(os.getenv("TRANSLATION_CACHE_MEMORY_ITEMS", "4096"))
+# Batched translation (Translate v2 accepts up to 128 segments per request)
+TRANSLATE_BATCH_MAX_SEGMENTS = min(int(os.getenv("TRANSLATE_BATCH_MAX_SEGMENTS", "100")), 128)
+TRANSLATE_BATCH_MAX_CHARS = int(os.getenv("TRANSLATE_BATCH_MAX_CHARS", "25000"))
+TRANSLATE_MAX_WORKERS = int(os.getenv("TRANSLATE_MAX_WORKERS", "4"))
+
+# Local language identification: below this confidence the Google detector is asked
+LANGID_MIN_CONFIDENCE = float(os.getenv("LANGID_MIN_CONFIDENCE", "0.8"))
+
+# Text-to-Speech audio cache (MP3 bytes on disk, LRU by mtime)
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "/tmp/tts_cache")
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# TTS requests are split at sentence boundaries and synthesized concurrently
+TTS_MAX_INPUT_BYTES = min(int(os.getenv("TTS_MAX_INPUT_BYTES", "4500")), 5000)  # API limit is 5000 bytes
+TTS_FIRST_SEGMENT_BYTES = int(os.getenv("TTS_FIRST_SEGMENT_BYTES", "400"))  # small first segment = fast start
+TTS_MAX_WORKERS = int(os.getenv("TTS_MAX_WORKERS", "4"))
+
+# LLM response cache for (near-)deterministic agent calls
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0.2"))  # only calls at or below are cached
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "/tmp/llm_cache.sqlite3")
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+LLM_CACHE_MEMORY_ITEMS = int(os.getenv("LLM_CACHE_MEMORY_ITEMS", "1024"))
+
+# Shared LLM scheduler (backend_rag/llm.py): rate limits, concurrency and retries
+LLM_MAX_RPM = float(os.getenv("LLM_MAX_RPM", "300"))
+LLM_MAX_TPM = float(os.getenv("LLM_MAX_TPM", "1000000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))  # seconds; doubled per attempt, full jitter
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30.0"))
+LLM_EST_OUTPUT_TOKENS = int(os.getenv("LLM_EST_OUTPUT_TOKENS", "512"))  # reserved per call until usage is known
+
+# Context packing (backend_rag/context_packer.py): prompt context budget per agent, in tokens.
+# Override with CONTEXT_TOKEN_BUDGETS="risk=20000,ask=2000"; unknown agents use "default".
+CONTEXT_TOKEN_BUDGETS = {
+    "default": 4000,
+    "ask": 1500,
+    "chat": 1250,
+    "summary_prompt": 1250,
+    "quick_analyze": 1000,
+    "classify": 2500,
+    "study_guide": 12000,
+    "faq_questions": 4000,
+    "faq_answer": 2000,
+    "timeline_events": 8000,
+    "case_law_facts": 6000,
+    "case_law_relevance": 500,
+    "strategy": 5000,
+    "explain_clauses": 6000,
+    "mindmap": 6000,
+    "structured_timeline": 6000,
+    "short_summary": 4000,
+    "risk": 25000,
+    "stress_scenarios": 4000,
+    "simulate_outcome": 5000,
+    "form_layout": 50000,  # ~100k chars of OCR word JSON (the previous character cut); bboxes cost ~25 tokens per word
+    "form_descriptions": 1000,
+    "form_suggestions": 250,
+}
+for _item in os.getenv("CONTEXT_TOKEN_BUDGETS", "").split(","):
+    if "=" in _item:
+        _agent, _tokens = _item.split("=", 1)
+        CONTEXT_TOKEN_BUDGETS[_agent.strip()] = int(_tokens)
@@ -0,0 +1,171 @@
+# backend_rag/context_packer.py
+"""
+Token-budgeted prompt context.
+
+Replaces fixed character slices (context[:15000] etc.) with a per-agent token budget
+(config.CONTEXT_TOKEN_BUDGETS). Tokens are counted with a local approximation of
+Gemini's tokenizer, chunks are chosen greedily by relevance per token, and text is only
+ever cut at a chunk or sentence boundary. Every pack reports the tokens it used.
+"""
+from __future__ import annotations
+
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .config import CONTEXT_TOKEN_BUDGETS
+from .metrics import histogram
+
+# ASCII words cost ~1 token per 4 chars, non-Latin runs ~1 per 2 chars, punctuation 1 each.
+_PIECE_RE = re.compile(r"([A-Za-z0-9]+)|([^\x00-\x7f\s]+)|(\S)")
+# End of a sentence (incl. the Devanagari danda) or a line break.
+_SENTENCE_END_RE = re.compile(r"[.!?।]['\")\]]*(?=\s)|\n")
+_WORD_RE = re.compile(r"\S+")
+_SEPARATORS = ("\n\n---\n\n", "\n\n", "\n")
+
+CONTEXT_TOKENS = histogram(
+    "llm_context_tokens",
+    "Prompt context tokens packed per agent call",
+    ("agent",),
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000),
+)
+
+
+def count_tokens(text: str) -> int:
+    """Fast local token estimate; errs high on punctuation-heavy text (numbers, JSON)."""
+    if not text:
+        return 0
+    total = 0
+    for m in _PIECE_RE.finditer(text):
+        if m.lastindex == 1:
+            total += 1 + (len(m.group(1)) - 1) // 4
+        elif m.lastindex == 2:
+            total += 1 + (len(m.group(2)) - 1) // 2
+        else:
+            total += 1
+    return total
+
+
+def budget_for(agent: str) -> int:
+    return CONTEXT_TOKEN_BUDGETS.get(agent, CONTEXT_TOKEN_BUDGETS["default"])
+
+
+def _word_prefix(text: str, max_tokens: int) -> Tuple[str, int]:
+    """Longest run of whole leading words within max_tokens; a raw cut if the first word alone is too long."""
+    end, used = 0, 0
+    for m in _WORD_RE.finditer(text):
+        tokens = count_tokens(m.group())
+        if used + tokens > max_tokens:
+            break
+        end, used = m.end(), used + tokens
+    if end:
+        return text[:end], used
+    # A single unbroken run (e.g. minified data): shrink a character cut until it fits.
+    cut = text.lstrip()[: max(max_tokens, 1) * 4]
+    while len(cut) > 1 and count_tokens(cut) > max_tokens:
+        cut = cut[: len(cut) * 3 // 4]
+    return cut, count_tokens(cut)
+
+
+def _sentence_prefix(text: str, max_tokens: int) -> Tuple[str, int]:
+    """
+    Longest run of whole leading sentences within max_tokens: (text, tokens). When the
+    sentences that fit use less than half the budget (unpunctuated OCR text, single-line
+    extracts, JSON), the rest is filled up to a word boundary instead, so non-empty text
+    never packs to nothing.
+    """
+    best, best_tokens, start, used = "", 0, 0, 0
+    for m in _SENTENCE_END_RE.finditer(text):
+        used += count_tokens(text[start:m.end()])
+        if used > max_tokens:
+            break
+        start = m.end()
+        best, best_tokens = text[:start].rstrip(), used
+    else:
+        # The final sentence may have no terminator.
+        if used + count_tokens(text[start:]) <= max_tokens:
+            return text.rstrip(), used + count_tokens(text[start:])
+    if best_tokens * 2 < max_tokens:
+        return _word_prefix(text, max_tokens)
+    return best, best_tokens
+
+
+def pack_chunks(
+    chunks: Sequence[str],
+    agent: str,
+    scores: Optional[Sequence[float]] = None,
+    budget: Optional[int] = None,
+    separator: str = "\n\n",
+    keep_order: bool = True,
+    min_partial_tokens: int = 48,
+) -> Dict:
+    """
+    Fill `budget` tokens (default: the agent's budget) with `chunks`.
+
+    With `scores`, chunks are taken greedily by score per token; without, in the given
+    order. A chunk that doesn't fit whole contributes its leading sentences (or words)
+    if at least `min_partial_tokens` remain, and the first chunk always contributes
+    something, so non-empty input never packs to an empty context. The result keeps the original chunk order unless
+    keep_order=False. Returns {'text', 'tokens', 'budget', 'chunks_used', 'chunks_total',
+    'partial'}.
+    """
+    budget = budget_for(agent) if budget is None else budget
+    sep_tokens = count_tokens(separator)
+    items = [(i, c, count_tokens(c)) for i, c in enumerate(chunks) if c and c.strip()]
+    if scores is not None:
+        items.sort(key=lambda it: max(scores[it[0]], 0.0) / max(it[2], 1), reverse=True)
+
+    chosen: Dict[int, str] = {}
+    rank: List[int] = []
+    remaining, partial = budget, 0
+    for i, chunk, tokens in items:
+        overhead = sep_tokens if chosen else 0
+        if tokens + overhead <= remaining:
+            part, part_tokens = chunk, tokens
+        elif remaining - overhead >= min_partial_tokens or not chosen:
+            # The first chunk taken is always at least partly included.
+            part, part_tokens = _sentence_prefix(chunk, max(remaining - overhead, 1))
+            if not part:
+                continue
+            partial += 1
+        else:
+            continue
+        chosen[i] = part
+        rank.append(i)
+        remaining -= part_tokens + overhead
+        if remaining < min(sep_tokens + 1, min_partial_tokens):
+            break
+
+    order = sorted(chosen) if keep_order else rank
+    text = separator.join(chosen[i] for i in order)
+    used = budget - remaining
+    print(f"--- [Context Packer] {agent}: {used}/{budget} tokens, {len(chosen)}/{len(items)} chunks"
+          f"{f', {partial} cut short' if partial else ''} ---")
+    CONTEXT_TOKENS.observe(used, agent=agent)
+    return {
+        "text": text,
+        "tokens": used,
+        "budget": budget,
+        "chunks_used": len(chosen),
+        "chunks_total": len(items),
+        "partial": partial,
+    }
+
+
+def pack_text(text: str, agent: str, budget: Optional[int] = None) -> Dict:
+    """
+    Budget an already-joined context string. It is split on the strongest separator it
+    contains ("---" excerpt dividers, then paragraphs, then lines) and packed in order.
+    """
+    text = text or ""
+    budget = budget_for(agent) if budget is None else budget
+    for separator in _SEPARATORS:
+        if separator in text:
+            break
+    else:
+        separator = "\n"
+    return pack_chunks(text.split(separator), agent, budget=budget, separator=separator)
+
+
+def pack_context(text: str, agent: str, budget: Optional[int] = None) -> str:
+    """pack_text(...)['text'] — drop-in for `context[:N]` in prompt builders."""
+    return pack_text(text, agent, budget)["text"]
@@ -1,25 +1,37 @@
 # backend_rag/embeddings.py
 from __future__ import annotations
 
-import os
+import threading
+from typing import List
+
 import numpy as np
 from sentence_transformers import SentenceTransformer
 
-# Environment variable for embedding model name
-EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+from .config import EMBEDDING_MODEL_NAME, EMBEDDING_MODE, MULTILINGUAL_EMBEDDING_MODEL
+
+
+def is_multilingual() -> bool:
+    """True when documents and queries are embedded in their original language."""
+    return EMBEDDING_MODE == "multilingual"
+
+
+def embedding_model_name() -> str:
+    return MULTILINGUAL_EMBEDDING_MODEL if is_multilingual() else EMBEDDING_MODEL_NAME
+
 
 # Load the SentenceTransformer model
-_embed_model = SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu")
+_embed_model = SentenceTransformer(embedding_model_name(), device="cpu")
 
+# The general legal knowledge base is indexed with the English model; in multilingual
+# mode that model is loaded separately, on first use.
+_english_model = None if is_multilingual() else _embed_model
+_english_lock = threading.Lock()
 
-def embed_texts(texts: List[str]) -> np.ndarray:
-    """
-    Embed all texts in one operation using SentenceTransformer.
-    Returns a NumPy array of shape (len(texts), embedding_dimension).
-    """
+
+def _encode(model: SentenceTransformer, texts: List[str]) -> np.ndarray:
     if not texts:
-        return np.empty((0, get_embedding_dimension()), dtype=np.float32)
-    return _embed_model.encode(
+        return np.empty((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+    return model.encode(
         texts,
         convert_to_numpy=True,
         show_progress_bar=False,
@@ -27,6 +39,24 @@ def embed_texts(texts: List[str]) -> np.ndarray:
     )
 
 
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """
+    Embed all texts in one operation using SentenceTransformer.
+    Returns a NumPy array of shape (len(texts), embedding_dimension).
+    """
+    return _encode(_embed_model, texts)
+
+
+def embed_texts_english(texts: List[str]) -> np.ndarray:
+    """Embed with the English model (used for the English-only general legal KB)."""
+    global _english_model
+    if _english_model is None:
+        with _english_lock:
+            if _english_model is None:
+                _english_model = SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu")
+    return _encode(_english_model, texts)
+
+
 def get_embedding_dimension() -> int:
     """
     Return the embedding dimension expected by the vector DB.
@@ -1,10 +1,15 @@
 from __future__ import annotations
 
+import json
 import os
 import re
-from io import BytesIO
+import tempfile
+import zipfile
+import zlib
+import xml.etree.ElementTree as ET
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple
 
 try:
     import PyPDF2
@@ -21,62 +26,316 @@ try:
 except Exception:
     convert_from_path = None
 
+try:
+    import fitz  # PyMuPDF, only used to measure image coverage per page
+except Exception:
+    fitz = None
+
+from .config import (
+    PDF_TEXT_MIN_DENSITY,
+    PDF_IMAGE_COVERAGE_OCR,
+    PDF_OCR_MAX_WORKERS,
+    PDF_OCR_PAGE_BUDGET,
+    PDF_OCR_MAX_DPI,
+    PDF_OCR_MIN_DPI,
+    PDF_OCR_MAX_PIXELS,
+    VISION_BATCH_SIZE,
+    VISION_BATCH_MAX_BYTES,
+    EXTRACT_CACHE_DIR,
+    EXTRACT_CACHE_MAX_BYTES,
+)
+from .cache import DiskLRUCache, sha256_file
 from .ocr import (
     VISION_AVAILABLE,
     ocr_image_with_google_vision,
-    ocr_image_with_google_vision_bytes,
+    ocr_images_with_google_vision_batch,
     ocr_pdf_with_google_vision_async_gcs,
 )
 
 
-def _extract_text_from_pdf(path: str) -> str:
-    """Try to extract text from a PDF that already has a text layer."""
-    text_parts = []
+def _extract_pdf_page_texts(path: str) -> List[str]:
+    """Text layer of every page (empty string for pages PyPDF2 can't read)."""
+    page_texts: List[str] = []
     try:
         with open(path, "rb") as f:
             reader = PyPDF2.PdfReader(f)
             for page in reader.pages:
                 try:
-                    page_text = page.extract_text()
+                    page_texts.append(page.extract_text() or "")
                 except Exception:
-                    page_text = ""
-                if page_text:
-                    text_parts.append(page_text)
+                    page_texts.append("")
     except Exception:
-        return ""
-    return "\n".join(text_parts)
+        return []
+    return page_texts
+
+
+def _extract_text_from_pdf(path: str) -> str:
+    """Try to extract text from a PDF that already has a text layer."""
+    return "\n".join(t for t in _extract_pdf_page_texts(path) if t)
+
+
+def _pdf_page_sizes(path: str) -> List[Tuple[float, float]]:
+    """(width, height) in points for every page."""
+    try:
+        with open(path, "rb") as f:
+            return [(float(p.mediabox.width), float(p.mediabox.height)) for p in PyPDF2.PdfReader(f).pages]
+    except Exception:
+        return []
+
+
+def _pdf_page_layout(path: str) -> List[Dict[str, float]]:
+    """
+    Page area (square inches) and image coverage (0..1) per page.
+    Coverage needs PyMuPDF; without it only the area is reported (via PyPDF2).
+    """
+    layout: List[Dict[str, float]] = []
+    if fitz is not None:
+        try:
+            with fitz.open(path) as doc:
+                for page in doc:
+                    rect = page.rect
+                    area = max(rect.width * rect.height, 1.0)
+                    covered = 0.0
+                    for info in page.get_image_info():
+                        box = fitz.Rect(info["bbox"]) & rect
+                        if not box.is_empty:
+                            covered += box.width * box.height
+                    layout.append({"area_sq_in": area / (72.0 * 72.0), "image_coverage": min(covered / area, 1.0)})
+            return layout
+        except Exception:
+            pass
+    return [
+        {"area_sq_in": max(w * h, 1.0) / (72.0 * 72.0), "image_coverage": 0.0}
+        for w, h in _pdf_page_sizes(path)
+    ]
+
+
+def _classify_pdf_pages(page_texts: List[str], layout: List[Dict[str, float]]) -> List[str]:
+    """
+    Decide per page whether the text layer is usable ("text") or the page needs OCR ("ocr").
+
+    A page goes to OCR when its text density is below PDF_TEXT_MIN_DENSITY, or when it is
+    mostly image (scanned annexure with a stamped header) and carries only a little text.
+    """
+    kinds: List[str] = []
+    for i, text in enumerate(page_texts):
+        info = layout[i] if i < len(layout) else {"area_sq_in": 93.5, "image_coverage": 0.0}
+        density = len(text.strip()) / max(info["area_sq_in"], 1.0)
+        if density < PDF_TEXT_MIN_DENSITY:
+            kinds.append("ocr")
+        elif info["image_coverage"] >= PDF_IMAGE_COVERAGE_OCR and density < PDF_TEXT_MIN_DENSITY * 4:
+            kinds.append("ocr")
+        else:
+            kinds.append("text")
+    return kinds
+
+
+def _render_params(size: Optional[Tuple[float, float]]) -> Tuple[int, int]:
+    """
+    Adaptive (dpi, jpeg_quality) for a page: cap the long side at PDF_OCR_MAX_PIXELS so
+    oversized sheets (A3, plans) don't produce 100MB rasters, and compress large pages harder.
+    """
+    if not size:
+        return PDF_OCR_MAX_DPI, 85
+    long_side_in = max(size) / 72.0
+    dpi = int(min(PDF_OCR_MAX_DPI, PDF_OCR_MAX_PIXELS / max(long_side_in, 1.0)))
+    dpi = max(PDF_OCR_MIN_DPI, dpi)
+    area_sq_in = (size[0] / 72.0) * (size[1] / 72.0)
+    quality = 85 if area_sq_in <= 100 else 75
+    return dpi, quality
+
+
+def _render_pdf_page_to_file(pdf_path: str, page_number: int, out_dir: str, size: Optional[Tuple[float, float]]) -> Optional[str]:
+    """Render one 1-based page to a JPEG in out_dir; returns its path (nothing held in memory)."""
+    dpi, quality = _render_params(size)
+    paths = convert_from_path(
+        pdf_path,
+        dpi=dpi,
+        first_page=page_number,
+        last_page=page_number,
+        fmt="jpeg",
+        jpegopt={"quality": quality, "optimize": True},
+        output_folder=out_dir,
+        output_file=f"p{page_number:05d}",
+        paths_only=True,
+    )
+    return paths[0] if paths else None
+
+
+def _ocr_rendered_pages(image_paths: List[str]) -> List[str]:
+    """OCR a group of rendered page images in one batched Vision call and delete them."""
+    contents = []
+    try:
+        for path in image_paths:
+            with open(path, "rb") as f:
+                contents.append(f.read())
+        return ocr_images_with_google_vision_batch(contents)
+    finally:
+        for path in image_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _ocr_pdf_pages(pdf_path: str, page_numbers: List[int]) -> Dict[int, str]:
+    """
+    OCR the given 1-based pages as a pipeline: pages are rendered one at a time into a temp
+    dir and grouped into Vision batches (VISION_BATCH_SIZE / VISION_BATCH_MAX_BYTES), while a
+    bounded pool sends finished groups to batch_annotate_images. At most 2x workers groups
+    sit on disk at once. Returns {page_number: text}.
+    """
+    if convert_from_path is None or not page_numbers:
+        return {}
+    sizes = _pdf_page_sizes(pdf_path)
+    workers = max(1, PDF_OCR_MAX_WORKERS)
+    results: Dict[int, str] = {}
+    with tempfile.TemporaryDirectory(prefix="ocr_pages_") as tmp, ThreadPoolExecutor(max_workers=workers) as pool:
+        pending: Dict[Any, List[int]] = {}
+        group: List[Tuple[int, str]] = []
+        group_bytes = 0
+
+        def _collect(done) -> None:
+            for fut in done:
+                numbers = pending.pop(fut)
+                try:
+                    texts = fut.result()
+                except Exception:
+                    texts = []
+                for i, n in enumerate(numbers):
+                    results[n] = texts[i] if i < len(texts) else ""
+
+        def _submit() -> None:
+            if len(pending) >= workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                _collect(done)
+            pending[pool.submit(_ocr_rendered_pages, [path for _, path in group])] = [n for n, _ in group]
 
+        for n in page_numbers:
+            try:
+                image_path = _render_pdf_page_to_file(pdf_path, n, tmp, sizes[n - 1] if n - 1 < len(sizes) else None)
+            except Exception:
+                image_path = None
+            if not image_path:
+                results[n] = ""
+                continue
+            size = os.path.getsize(image_path)
+            if group and (len(group) >= VISION_BATCH_SIZE or group_bytes + size > VISION_BATCH_MAX_BYTES):
+                _submit()
+                group, group_bytes = [], 0
+            group.append((n, image_path))
+            group_bytes += size
+        if group:
+            _submit()
+        _collect(list(as_completed(pending)))
+    return results
 
-def ocr_pdf_with_google_vision_local_pages(pdf_path: str, max_pages: int = 5) -> str:
+
+def ocr_pdf_with_google_vision_local_pages(pdf_path: str, max_pages: Optional[int] = None) -> str:
     """
-    Fallback OCR: rasterize first max_pages using pdf2image and OCR each page with Vision.
+    Fallback OCR: rasterize pages (up to the page budget) with pdf2image and OCR them with Vision.
     Requires: pdf2image + poppler installed locally.
     """
     if convert_from_path is None:
         return ""
+    budget = max_pages if max_pages is not None else PDF_OCR_PAGE_BUDGET
+    total = len(_pdf_page_sizes(pdf_path)) or budget
     try:
-        pages = convert_from_path(pdf_path, dpi=300, first_page=1, last_page=max_pages)
-        texts = []
-        for p in pages:
-            buf = BytesIO()
-            p.save(buf, format="JPEG")
-            content = buf.getvalue()
-            t = ocr_image_with_google_vision_bytes(content)
-            if t:
-                texts.append(t)
-        return "\n\n".join(texts)
+        texts = _ocr_pdf_pages(pdf_path, list(range(1, min(total, budget) + 1)))
+        return "\n\n".join(texts[n] for n in sorted(texts) if texts[n])
     except Exception:
         return ""
 
 
-def extract_text_with_diagnostics(file: str, pdf_ocr_pages: int = 5) -> Dict[str, Any]:
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+
+
+def _extract_docx_text(path: str) -> str:
+    """
+    Stream word/document.xml with iterparse and emit paragraphs and table rows in document
+    order. Table cells are joined with " | " per row (nested tables land inside their cell).
+    Text boxes (w:txbxContent) are emitted as their own paragraphs after the paragraph that
+    anchors them, and mc:Fallback copies of mc:AlternateContent are skipped so nothing is
+    read twice. Processed elements are cleared as we go, so memory stays flat on large
+    agreements.
+    """
+    out: List[str] = []
+    # Open paragraphs: (runs, text-box lines to emit after it, table depth at its start)
+    para_stack: List[Tuple[List[str], List[str], int]] = []
+    cell_stack: List[List[str]] = []   # paragraphs of each open table cell
+    row_stack: List[List[str]] = []    # cell texts of each open table row
+    fallback_depth = 0
+    body = None
+
+    def _emit(line: str) -> None:
+        # Inside a text box (a paragraph still open at this table depth): defer to that paragraph.
+        if para_stack and para_stack[-1][2] == len(cell_stack):
+            para_stack[-1][1].append(line)
+        else:
+            (cell_stack[-1] if cell_stack else out).append(line)
+
+    with zipfile.ZipFile(path) as zf, zf.open("word/document.xml") as xml:
+        for event, elem in ET.iterparse(xml, events=("start", "end")):
+            tag = elem.tag
+            if tag == _MC_FALLBACK:
+                fallback_depth += 1 if event == "start" else -1
+                continue
+            if fallback_depth:
+                continue
+
+            if event == "start":
+                if tag == _W + "body":
+                    body = elem
+                elif tag == _W + "p":
+                    para_stack.append(([], [], len(cell_stack)))
+                elif tag == _W + "tr":
+                    row_stack.append([])
+                elif tag == _W + "tc":
+                    cell_stack.append([])
+                continue
+
+            if tag == _W + "t":
+                if para_stack:
+                    para_stack[-1][0].append(elem.text or "")
+            elif tag == _W + "tab":
+                if para_stack:
+                    para_stack[-1][0].append("\t")
+            elif tag in (_W + "br", _W + "cr"):
+                if para_stack:
+                    para_stack[-1][0].append("\n")
+            elif tag == _W + "p":
+                runs, boxed, _ = para_stack.pop()
+                _emit("".join(runs))
+                for line in boxed:
+                    _emit(line)
+                elem.clear()
+            elif tag == _W + "tc":
+                cell = " ".join(p.strip() for p in cell_stack.pop() if p.strip())
+                if row_stack:
+                    row_stack[-1].append(cell)
+            elif tag == _W + "tr":
+                cells = row_stack.pop() if row_stack else []
+                _emit(" | ".join(c for c in cells if c))
+                elem.clear()
+
+            # Drop finished top-level blocks so the tree never grows with the document.
+            if body is not None and not cell_stack and not para_stack and tag in (_W + "p", _W + "tbl"):
+                body.clear()
+
+    return "\n".join(out)
+
+
+def extract_text_with_diagnostics(file: str, pdf_ocr_pages: Optional[int] = None) -> Dict[str, Any]:
     """
     Attempts multi-strategy extraction and returns diagnostics.
+    pdf_ocr_pages caps how many PDF pages are rasterized (defaults to PDF_OCR_PAGE_BUDGET).
 
     Returns:
       {
         "text": str,
         "source": str | None,
+        "pages"?: list[str],   # per-page text, PDFs read page by page only
         "diagnostics": { step_name: {"ok": bool, "len": int, "note"?: str} }
       }
     """
@@ -84,12 +343,32 @@ def extract_text_with_diagnostics(file: str, pdf_ocr_pages: int = 5) -> Dict[str
     suf = p.suffix.lower()
     diag: Dict[str, Any] = {}
 
-    # 1) PDF: text layer → Vision GCS async → local rasterize fallback
+    # 1) PDF: classify pages → text layer where usable, OCR only the rest.
+    #    Fully scanned files go through Vision GCS async → local rasterize fallback.
     if suf == ".pdf":
-        t = _extract_text_from_pdf(file)
+        page_texts = _extract_pdf_page_texts(file)
+        kinds = _classify_pdf_pages(page_texts, _pdf_page_layout(file)) if page_texts else []
+        t = "\n".join(pt for pt in page_texts if pt)
         diag["pdf_pytext"] = {"ok": bool(t and t.strip()), "len": len(t) if t else 0}
-        if t and t.strip():
-            return {"text": t, "source": "pdf_pytext", "diagnostics": diag}
+        ocr_pages = [i + 1 for i, kind in enumerate(kinds) if kind == "ocr"]
+        diag["pdf_pages"] = {"total": len(kinds), "text_layer": len(kinds) - len(ocr_pages), "ocr": len(ocr_pages)}
+        budget = pdf_ocr_pages if pdf_ocr_pages is not None else PDF_OCR_PAGE_BUDGET
+
+        if kinds and len(ocr_pages) < len(kinds):
+            merged = list(page_texts)
+            if len(ocr_pages) > budget:
+                diag["pdf_pages"]["ocr_skipped_budget"] = len(ocr_pages) - budget
+                ocr_pages = ocr_pages[:budget]
+            if ocr_pages:
+                ocr_texts = _ocr_pdf_pages(file, ocr_pages)
+                for n in ocr_pages:
+                    if ocr_texts.get(n, "").strip():
+                        merged[n - 1] = ocr_texts[n]
+                diag["pdf_pages"]["ocr_ok"] = sum(1 for n in ocr_pages if ocr_texts.get(n, "").strip())
+            text = "\n".join(pt for pt in merged if pt)
+            if text.strip():
+                source = "pdf_hybrid" if diag["pdf_pages"].get("ocr_ok") else "pdf_pytext"
+                return {"text": text, "source": source, "pages": merged, "diagnostics": diag}
 
         if os.getenv("VISION_GCS_BUCKET"):
             diag["pdf_vision_mode"] = {"mode": "gcs_async", "bucket": os.getenv("VISION_GCS_BUCKET")}
@@ -100,7 +379,7 @@ def extract_text_with_diagnostics(file: str, pdf_ocr_pages: int = 5) -> Dict[str
         else:
             diag["pdf_vision_mode"] = {"mode": "local_pages_fallback", "note": "VISION_GCS_BUCKET not set"}
 
-        t3 = ocr_pdf_with_google_vision_local_pages(file, max_pages=pdf_ocr_pages)
+        t3 = ocr_pdf_with_google_vision_local_pages(file, max_pages=budget)
         diag["pdf_vision_local_pages"] = {"ok": bool(t3 and t3.strip()), "len": len(t3) if t3 else 0}
         if t3 and t3.strip():
             return {"text": t3, "source": "pdf_vision_local_pages", "diagnostics": diag}
@@ -118,8 +397,15 @@ def extract_text_with_diagnostics(file: str, pdf_ocr_pages: int = 5) -> Dict[str
             diag["txt_read"] = {"ok": False, "len": 0, "note": str(e)}
         return {"text": "", "source": None, "diagnostics": diag}
 
-    # 3) DOCX (optional dep)
+    # 3) DOCX: streaming XML parse (paragraphs + tables); python-docx as fallback
     if suf == ".docx":
+        try:
+            t = _extract_docx_text(file)
+            diag["docx_xml"] = {"ok": bool(t and t.strip()), "len": len(t) if t else 0}
+            if t and t.strip():
+                return {"text": t, "source": "docx_xml", "diagnostics": diag}
+        except Exception as e:
+            diag["docx_xml"] = {"ok": False, "len": 0, "note": str(e)}
         if docx is None:
             diag["docx"] = {"ok": False, "len": 0, "note": "python-docx not installed"}
             return {"text": "", "source": None, "diagnostics": diag}
@@ -163,3 +449,50 @@ def extract_text_with_diagnostics(file: str, pdf_ocr_pages: int = 5) -> Dict[str
         diag["raw_read"] = {"ok": False, "len": 0, "note": str(e)}
 
     return {"text": "", "source": None, "diagnostics": diag}
+
+
+# ------------------- Cached extraction -------------------
+# Bump when extraction output changes so stale entries are ignored.
+EXTRACT_CACHE_VERSION = "v2"
+
+_extract_cache = DiskLRUCache(EXTRACT_CACHE_DIR, EXTRACT_CACHE_MAX_BYTES, name="Extract Cache")
+
+
+def extract_text_cached(file: str, content_hash: Optional[str] = None, pdf_ocr_pages: Optional[int] = None) -> Dict[str, Any]:
+    """
+    extract_text_with_diagnostics behind a disk cache keyed by the SHA-256 of the file bytes,
+    so re-extracting the same upload (ingest, risk upload, analysis) doesn't pay for OCR again.
+    Pass content_hash when the caller already hashed the file while saving it.
+    Only successful extractions are cached.
+    """
+    try:
+        digest = content_hash or sha256_file(file)
+    except OSError:
+        return extract_text_with_diagnostics(file, pdf_ocr_pages=pdf_ocr_pages)
+
+    suffix = Path(file).suffix.lower().lstrip(".") or "raw"
+    key = f"{EXTRACT_CACHE_VERSION}-{digest}-{suffix}"
+    if pdf_ocr_pages is not None:
+        key += f"-p{pdf_ocr_pages}"
+
+    blob = _extract_cache.get(key)
+    if blob is not None:
+        try:
+            result = json.loads(zlib.decompress(blob).decode("utf-8"))
+            result.setdefault("diagnostics", {})["cache"] = {"hit": True, "sha256": digest}
+            return result
+        except Exception:
+            pass
+
+    result = extract_text_with_diagnostics(file, pdf_ocr_pages=pdf_ocr_pages)
+    if (result.get("text") or "").strip():
+        try:
+            _extract_cache.put(key, zlib.compress(json.dumps(result).encode("utf-8"), 6))
+        except Exception as e:
+            print(f"--- [Extract Cache] Could not store {digest[:12]}: {e} ---")
+    result.setdefault("diagnostics", {})["cache"] = {"hit": False, "sha256": digest}
+    return result
+
+
+def get_extraction_cache_stats() -> Dict[str, Any]:
+    return _extract_cache.stats()
@@ -2,12 +2,12 @@
 # backend_rag/form_processing.py
 from __future__ import annotations
 import json
-import re
 # Near the top of api_server.py
 from typing import List, Optional, Dict, Any # Ensure List is included
 
 
 from .models import model, call_model_system_then_user
+from .llm import parse_json_response
 
 # --- Required Imports ---
 from docx import Document
@@ -16,6 +16,7 @@ from PyPDF2 import PdfReader, PdfWriter # Keep for placeholder/future use
 # --- Assuming these are available from your existing setup ---
 from .models import call_model_system_then_user
 from .retrieval import retrieve_similar_chunks # For context
+from .context_packer import CONTEXT_TOKENS, budget_for, count_tokens, pack_context
 # Assuming OcrResult class is defined or you handle OCR output directly
 # from .ocr import OcrResult # Example if defined elsewhere
 
@@ -63,7 +64,7 @@ def _generate_field_description(field_label: str, field_type: str) -> str:
     user_prompt = f"Field Label: \"{field_label}\"\nField Type: \"{field_type}\"\n\nDescription:"
     
     try:
-        description = call_model_system_then_user(system_prompt, user_prompt, temperature=0.1)
+        description = call_model_system_then_user(system_prompt, user_prompt, temperature=0.1, agent="form_field_description")
         return description.strip()
     except Exception as e:
         print(f"--- [Form Description] Failed: {e} ---")
@@ -92,7 +93,7 @@ def _batch_generate_descriptions(fields_info: List[Dict], context: str) -> Dict[
     print(f"--- [Form Batch Desc] Generating simple, detailed descriptions... ---")
     
     field_list_str = "\n".join([f"- Label: \"{f['label_text']}\", Type: \"{f['semantic_type']}\"" for f in fields_info])
-    safe_context = context[:4000] if context else "No specific document context provided."
+    safe_context = pack_context(context, "form_descriptions") if context else "No specific document context provided."
 
     # --- UPDATED PROMPT FOR SIMPLICITY ---
     system_prompt = (
@@ -123,11 +124,12 @@ def _batch_generate_descriptions(fields_info: List[Dict], context: str) -> Dict[
     descriptions = {}
     try:
         response = call_model_system_then_user(
-            system_prompt, user_prompt, temperature=0.3, model_instance=model
+            system_prompt, user_prompt, temperature=0.3, model_instance=model,
+            agent="form_descriptions",
         )
-        match = re.search(r'\{.*\}', response, re.DOTALL)
-        if match:
-            descriptions = json.loads(match.group(0))
+        parsed = parse_json_response(response, "form_descriptions")
+        if parsed is not None:
+            descriptions = parsed
             print(f"--- [Form Batch Desc] Generated {len(descriptions)} simple descriptions. ---")
         else:
             print("--- [Form Batch Desc] Failed: LLM did not return valid JSON object.")
@@ -138,25 +140,42 @@ def _batch_generate_descriptions(fields_info: List[Dict], context: str) -> Dict[
     return descriptions
 
 
+def _pack_form_pages(ocr_result: DetailedOcrResult, budget: Optional[int] = None):
+    """
+    Page/word dicts for the layout prompt, filled page by page up to the "form_layout"
+    token budget. Returns (pages, word_count).
+    """
+    budget = budget_for("form_layout") if budget is None else budget
+    pages, word_count, used = [], 0, 2  # enclosing []
+    for page in ocr_result.pages:
+        header = {"page_number": page.page_number, "width": page.width, "height": page.height, "words": []}
+        used += count_tokens(json.dumps(header, default=int)) + 1
+        if used >= budget:
+            break
+        for w in page.words:
+            word = w.model_dump()
+            cost = count_tokens(json.dumps(word, default=int)) + 1
+            if used + cost > budget:
+                break
+            header["words"].append(word)
+            used += cost
+        pages.append(header)
+        word_count += len(header["words"])
+        if len(header["words"]) < len(page.words):
+            break
+    print(f"--- [Context Packer] form_layout: {used}/{budget} tokens, {word_count} words on {len(pages)} pages ---")
+    CONTEXT_TOKENS.observe(used, agent="form_layout")
+    return pages, word_count
+
+
 def detect_form_fields(ocr_result: DetailedOcrResult, context_summary: str = "") -> List[Dict]:
     """
     V3: Detects fields via LLM using layout data AND generates context-aware descriptions.
     """
     print("--- [Form Processing V3] Detecting fields with context... ---")
     
-    # 1. Serialize OCR data (Same as before)
-    page_data_for_llm = []
-    word_count = 0
-    for page in ocr_result.pages:
-        if word_count > 4000: break
-        words_list = [w.model_dump() for w in page.words]
-        page_data_for_llm.append({
-            "page_number": page.page_number,
-            "width": page.width,
-            "height": page.height,
-            "words": words_list
-        })
-        word_count += len(page.words)
+    # 1. Serialize OCR data within the layout token budget (whole words only, so the JSON stays valid)
+    page_data_for_llm, word_count = _pack_form_pages(ocr_result)
     
     if word_count == 0: return []
 
@@ -166,19 +185,18 @@ def detect_form_fields(ocr_result: DetailedOcrResult, context_summary: str = "")
         "For each field, find the `label_text` and the `bbox` of the BLANK input area.\n"
         "Return a valid JSON list `[{'label_text':..., 'semantic_type':..., 'bbox':..., 'page_number':...}]`."
     )
-    llm_input_json = json.dumps(page_data_for_llm, default=int)[:100000]
+    llm_input_json = json.dumps(page_data_for_llm, default=int)
     user_prompt_detect = f"Form OCR Data:\n---\n{llm_input_json}\n---\n\nIdentified Fields JSON List:"
 
     detected_fields_final = []
     try:
         response = call_model_system_then_user(
-            system_prompt_detect, user_prompt_detect, temperature=0.0, model_instance=model
+            system_prompt_detect, user_prompt_detect, temperature=0.0, model_instance=model,
+            agent="form_layout",
         )
         
-        match = re.search(r'\[.*\]', response, re.DOTALL)
-        if not match: return []
-        
-        llm_fields = json.loads(match.group(0))
+        llm_fields = parse_json_response(response, "form_layout", expect="list")
+        if llm_fields is None: return []
 
         # 3. Prepare list for batch description
         temp_field_list_for_desc = []
@@ -257,16 +275,15 @@ def generate_field_suggestions(field: Dict, context: str) -> List[str]:
     user_prompt = (
         f"Field Label: \"{field_label}\"\n"
         f"Field Type: \"{field_type}\"\n"
-        f"Context Summary: \"{safe_context[:1000]}\"\n\n"
+        f"Context Summary: \"{pack_context(safe_context, 'form_suggestions')}\"\n\n"
         f"Task: Provide 1-3 candidate values as a JSON list:"
     )
 
     suggestions = []
     try:
-        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.4)
-        match = re.search(r'\[.*\]', response, re.DOTALL)
-        if match:
-            raw_suggestions = json.loads(match.group(0))
+        response = call_model_system_then_user(system_prompt, user_prompt, temperature=0.4, agent="form_suggestions")
+        raw_suggestions = parse_json_response(response, "form_suggestions", expect="list")
+        if raw_suggestions is not None:
             suggestions = [str(s) for s in raw_suggestions if isinstance(s, (str, int, float))][:3]
             print(f"--- [Form Suggestion] Generated suggestions: {suggestions} ---")
     except Exception as e:
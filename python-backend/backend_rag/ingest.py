@@ -6,7 +6,7 @@ import json
 from typing import Optional, Dict
 from cryptography.fernet import Fernet
 
-from backend_rag.extract import extract_text_with_diagnostics
+from backend_rag.extract import extract_text_cached
 from backend_rag.chunking import chunk_text
 from backend_rag.embeddings import embed_texts, get_embedding_dimension
 from backend_rag.vectorstore_pinecone import (
@@ -47,7 +47,7 @@ def ingest_file(
             pass
 
     # 1) Extract text
-    extraction = extract_text_with_diagnostics(filepath)
+    extraction = extract_text_cached(filepath)
     text = (extraction.get("text") or "").strip()
     source = extraction.get("source")
     diagnostics = extraction.get("diagnostics", {})
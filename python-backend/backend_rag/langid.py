@@ -0,0 +1,192 @@
+# backend_rag/langid.py
+"""
+Local language identification for the query/ingest hot path.
+
+Indic scripts map almost one-to-one onto our languages, so most text is identified
+from Unicode script ranges alone. Latin script is either English or romanized Hindi
+("Hinglish"); that case is scored with a small word list plus a character-trigram
+model. Only low-confidence results fall back to the Google detector.
+"""
+from __future__ import annotations
+
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+
+from .config import LANGID_MIN_CONFIDENCE
+from .Translation import detect_language, detect_languages
+
+# (first code point, last code point, language)
+_SCRIPT_RANGES = [
+    (0x0900, 0x097F, "hi"),  # Devanagari (Hindi / Marathi, disambiguated below)
+    (0x0980, 0x09FF, "bn"),  # Bengali
+    (0x0A00, 0x0A7F, "pa"),  # Gurmukhi
+    (0x0A80, 0x0AFF, "gu"),  # Gujarati
+    (0x0B00, 0x0B7F, "or"),  # Odia
+    (0x0B80, 0x0BFF, "ta"),  # Tamil
+    (0x0C00, 0x0C7F, "te"),  # Telugu
+    (0x0C80, 0x0CFF, "kn"),  # Kannada
+    (0x0D00, 0x0D7F, "ml"),  # Malayalam
+    (0x0600, 0x06FF, "ur"),  # Arabic script
+]
+
+# Frequent Marathi words / the retroflex ळ, rare in Hindi.
+_MARATHI_MARKERS = {"आहे", "आहेत", "आणि", "नाही", "काय", "मला", "तुम्ही", "करा", "होते", "आम्ही", "केले", "पाहिजे"}
+
+_HINGLISH_WORDS = {
+    "hai", "hain", "ho", "tha", "thi", "the", "kya", "kyu", "kyun", "kaise", "kaisa", "kab", "kaun", "kahan",
+    "nahi", "nahin", "mera", "meri", "mere", "tera", "teri", "aap", "aapka", "aapki", "hum", "humara",
+    "mujhe", "tum", "tumhe", "ke", "ki", "ka", "ko", "se", "mein", "main", "aur", "ya", "bhi", "toh", "to",
+    "kar", "karna", "karo", "karke", "karein", "raha", "rahi", "rahe", "gaya", "gayi", "diya", "liya",
+    "wala", "wali", "agar", "lekin", "kuch", "sab", "abhi", "yeh", "ye", "woh", "wo", "iska", "uska",
+    "batao", "bataiye", "chahiye", "sakta", "sakti", "sakte", "hoga", "hogi", "paisa", "paise", "kitna",
+    "hoon", "hun", "chahta", "chahti", "jana", "jaana", "mila", "mili", "milega", "kare", "karu",
+}
+_ENGLISH_WORDS = {
+    "the", "is", "are", "was", "were", "what", "which", "who", "how", "why", "when", "where", "can", "could",
+    "should", "would", "will", "do", "does", "did", "of", "in", "on", "for", "with", "and", "or", "not",
+    "my", "your", "this", "that", "these", "there", "it", "be", "have", "has", "a", "an", "if", "any",
+    "about", "from", "by", "me", "i", "you", "we", "they", "clause", "agreement", "contract", "tenant",
+    "at", "as", "but", "so", "all", "no", "yes", "our", "their", "his", "her", "them", "us", "am", "been",
+    "had", "than", "then", "into", "under", "after", "before", "whose", "whom", "shall", "must", "may",
+    "go", "want", "need", "pay", "sign", "send", "please", "get", "give", "office", "court",
+}
+# Romanized Hindi words that are also everyday English ("go to the main office"):
+# they carry no signal either way.
+_AMBIGUOUS = {"to", "main", "ho", "se", "ye", "hi", "hum", "mere", "kar", "sab", "wo", "the", "do"}
+# Words that are common in both and carry no signal.
+_SHARED = (_HINGLISH_WORDS & _ENGLISH_WORDS) | _AMBIGUOUS
+
+# Tiny seed corpora for the trigram model; enough to separate the two letter distributions.
+_ENGLISH_SAMPLE = (
+    "what does this clause mean for the tenant and the landlord in this agreement "
+    "can my employer terminate the contract without notice what are my rights "
+    "please explain the penalty for late payment and the security deposit refund "
+    "is this document legally binding who is responsible for maintenance and repairs "
+    "how long is the notice period should i sign this lease what happens if i break it"
+)
+_HINGLISH_SAMPLE = (
+    "mera makan malik deposit wapas nahi de raha kya karna chahiye "
+    "yeh clause ka matlab kya hai mujhe samajh nahi aaya kripya batao "
+    "agar main notice ke bina naukri chhod du toh kya hoga "
+    "mere paise kab tak wapas milenge aur kitna jurmana lagega "
+    "kya yeh agreement sahi hai ya mujhe sign nahi karna chahiye bataiye"
+)
+
+_WORD_RE = re.compile(r"[a-z']+")
+
+
+def _trigrams(text: str) -> List[str]:
+    padded = f" {text} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def _train(sample: str) -> Dict[str, float]:
+    counts = Counter(_trigrams(sample))
+    total = sum(counts.values()) + len(counts) + 1
+    model = {g: math.log((c + 1) / total) for g, c in counts.items()}
+    model[""] = math.log(1 / total)  # unseen trigram
+    return model
+
+
+_EN_MODEL = _train(_ENGLISH_SAMPLE)
+_HINGLISH_MODEL = _train(_HINGLISH_SAMPLE)
+
+
+def _script_counts(text: str) -> Counter:
+    counts: Counter = Counter()
+    for ch in text:
+        cp = ord(ch)
+        if cp < 0x80:
+            if ch.isalpha():
+                counts["latin"] += 1
+            continue
+        for lo, hi, lang in _SCRIPT_RANGES:
+            if lo <= cp <= hi:
+                counts[lang] += 1
+                break
+        else:
+            if ch.isalpha():
+                counts["other"] += 1
+    return counts
+
+
+def _latin_language(text: str) -> Dict:
+    """English vs. romanized Hindi from word evidence plus trigram log-likelihood."""
+    lowered = text.lower()
+    words = _WORD_RE.findall(lowered)
+    if not words:
+        return {"language": "en", "confidence": 0.0}
+    hi_hits = sum(1 for w in words if w in _HINGLISH_WORDS and w not in _SHARED)
+    en_hits = sum(1 for w in words if w in _ENGLISH_WORDS and w not in _SHARED)
+
+    grams = _trigrams(" ".join(words))
+    llr = sum(_HINGLISH_MODEL.get(g, _HINGLISH_MODEL[""]) - _EN_MODEL.get(g, _EN_MODEL[""]) for g in grams)
+    # Per-trigram evidence plus strong per-word evidence, squashed to a probability.
+    score = llr / max(len(grams), 1) * 4 + (hi_hits - en_hits) * 1.5
+    p_hinglish = 1 / (1 + math.exp(-score))
+    if hi_hits == 0:
+        # Letter statistics alone can't tell English from Hinglish reliably: without an
+        # unambiguous Hindi word, answer English and let low confidence go remote.
+        p_hinglish = min(p_hinglish, 0.4)
+    if len(words) < 3:
+        # One- or two-word inputs ("Hi", "Section 420") are too short to be sure of.
+        p_hinglish = min(max(p_hinglish, 0.3), 0.7)
+    if p_hinglish >= 0.5:
+        return {"language": "hi", "confidence": round(p_hinglish, 3), "script": "Latn"}
+    return {"language": "en", "confidence": round(1 - p_hinglish, 3)}
+
+
+def identify_language(text: str) -> Optional[Dict]:
+    """
+    Purely local guess: {'language', 'confidence', 'method': 'local'} or None for
+    empty input. Confidence is the share of letters in the winning script (times the
+    Latin model's probability for Latin text).
+    """
+    if not text or not text.strip():
+        return None
+    sample = text[:2000]
+    counts = _script_counts(sample)
+    letters = sum(counts.values())
+    if not letters:
+        return {"language": "en", "confidence": 0.0, "method": "local"}
+
+    script, n = counts.most_common(1)[0]
+    share = n / letters
+    if script == "latin":
+        result = _latin_language(sample)
+        result["confidence"] = round(result["confidence"] * share, 3)
+    elif script == "other":
+        result = {"language": "und", "confidence": 0.0}
+    else:
+        lang = script
+        if lang == "hi" and ("ळ" in sample or any(w in _MARATHI_MARKERS for w in sample.split())):
+            lang = "mr"
+        result = {"language": lang, "confidence": round(share, 3)}
+    result["method"] = "local"
+    return result
+
+
+def detect_language_fast(text: str) -> Optional[Dict]:
+    """
+    Drop-in for Translation.detect_language: answers locally, and only calls Google
+    when the local confidence is below LANGID_MIN_CONFIDENCE.
+    """
+    local = identify_language(text)
+    if local is None or local["confidence"] >= LANGID_MIN_CONFIDENCE:
+        return local
+    remote = detect_language(text)
+    return remote or local
+
+
+def detect_languages_fast(texts: List[str]) -> List[Optional[Dict]]:
+    """Batch variant: local first, one batched remote call for the uncertain ones."""
+    results = [identify_language(t) for t in texts]
+    unsure = [i for i, r in enumerate(results) if r is not None and r["confidence"] < LANGID_MIN_CONFIDENCE]
+    if unsure:
+        remote = detect_languages([texts[i] for i in unsure])
+        for i, r in zip(unsure, remote):
+            if r:
+                results[i] = r
+    return results
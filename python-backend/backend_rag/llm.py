@@ -0,0 +1,426 @@
+# backend_rag/llm.py
+"""
+Async LLM layer shared by every Gemini call in the process.
+
+All requests run on one background event loop and pass through a single scheduler:
+a token bucket for requests/min and one for tokens/min, a cap on in-flight calls, and
+a priority queue so interactive chat is admitted ahead of background analysis.
+429/5xx failures are retried with exponential backoff and full jitter. Synchronous
+callers go through the same path via call_model_system_then_user / invoke_messages.
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import json
+import queue
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+from .config import (
+    LLM_MAX_RPM,
+    LLM_MAX_TPM,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_RETRIES,
+    LLM_BACKOFF_BASE,
+    LLM_BACKOFF_MAX,
+    LLM_EST_OUTPUT_TOKENS,
+)
+from .metrics import (
+    LLM_CALL_SECONDS,
+    LLM_PROMPT_TOKENS,
+    LLM_COMPLETION_TOKENS,
+    LLM_CALLS,
+    LLM_RETRIES,
+    LLM_PARSE_FAILURES,
+    metrics_snapshot,
+)
+
+PRIORITIES = {"interactive": 0, "background": 1}
+
+_RETRYABLE_CODES = {429, 500, 502, 503, 504}
+_RETRYABLE_RE = re.compile(
+    r"\b(429|500|502|503|504)\b|resource.?exhausted|rate.?limit|quota|unavailable|deadline|overloaded",
+    re.IGNORECASE,
+)
+
+
+def _is_retryable(e: BaseException) -> bool:
+    for attr in ("code", "status_code"):
+        code = getattr(e, attr, None)
+        code = code() if callable(code) else code
+        try:
+            if int(getattr(code, "value", code)) in _RETRYABLE_CODES:
+                return True
+        except (TypeError, ValueError):
+            pass
+    return bool(_RETRYABLE_RE.search(f"{type(e).__name__} {e}"))
+
+
+def estimate_tokens(messages: List[BaseMessage]) -> int:
+    """Rough prompt size (~4 chars per token) plus the expected completion."""
+    chars = sum(len(m.content) if isinstance(m.content, str) else len(str(m.content)) for m in messages)
+    return chars // 4 + LLM_EST_OUTPUT_TOKENS
+
+
+def _record_usage(agent: str, usage: Optional[Dict]) -> None:
+    if usage:
+        LLM_PROMPT_TOKENS.observe(int(usage.get("input_tokens", 0)), agent=agent)
+        LLM_COMPLETION_TOKENS.observe(int(usage.get("output_tokens", 0)), agent=agent)
+
+
+class _TokenBucket:
+    """Continuous-refill bucket of `per_minute` units; only touched on the loop thread."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, n: float) -> float:
+        self._refill()
+        n = min(n, self.capacity)  # an oversize request waits for a full bucket, not forever
+        return 0.0 if self.tokens >= n else (n - self.tokens) / self.rate
+
+    def take(self, n: float) -> None:
+        self.tokens -= min(n, self.capacity)
+
+    def adjust(self, delta: float) -> None:
+        """Correct an estimate once the real usage is known (positive = charge more)."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class _Scheduler:
+    def __init__(self):
+        self.requests = _TokenBucket(LLM_MAX_RPM)
+        self.tokens = _TokenBucket(LLM_MAX_TPM)
+        self.slots = LLM_MAX_CONCURRENCY
+        self.cond = asyncio.Condition()
+        self.waiting: List[tuple] = []  # heap of (priority, seq)
+        self.seq = itertools.count()
+        self.stats = {"calls": 0, "retries": 0, "failures": 0, "throttled_ms": 0.0}
+
+    async def acquire(self, priority: int, est_tokens: int) -> None:
+        entry = (priority, next(self.seq))
+        t0 = time.monotonic()
+        async with self.cond:
+            heapq.heappush(self.waiting, entry)
+            try:
+                while True:
+                    if self.waiting[0] == entry and self.slots > 0:
+                        delay = max(self.requests.wait_time(1), self.tokens.wait_time(est_tokens))
+                        if delay <= 0:
+                            heapq.heappop(self.waiting)
+                            self.requests.take(1)
+                            self.tokens.take(est_tokens)
+                            self.slots -= 1
+                            self.cond.notify_all()
+                            break
+                    else:
+                        delay = None
+                    try:
+                        await asyncio.wait_for(self.cond.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                # Cancelled while queued: leave the queue so the next caller isn't blocked.
+                if entry in self.waiting:
+                    self.waiting.remove(entry)
+                    heapq.heapify(self.waiting)
+                    self.cond.notify_all()
+                raise
+        self.stats["throttled_ms"] += (time.monotonic() - t0) * 1000
+
+    async def release(self, token_correction: float = 0.0) -> None:
+        async with self.cond:
+            self.slots += 1
+            if token_correction:
+                self.tokens.adjust(token_correction)
+            self.cond.notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        by_priority = {name: sum(1 for p, _ in self.waiting if p == level) for name, level in PRIORITIES.items()}
+        return {
+            **self.stats,
+            "throttled_ms": round(self.stats["throttled_ms"], 1),
+            "in_flight": LLM_MAX_CONCURRENCY - self.slots,
+            "waiting": by_priority,
+            "rpm_available": round(self.requests.tokens, 1),
+            "tpm_available": round(self.tokens.tokens),
+        }
+
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+_scheduler: Optional[_Scheduler] = None
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """The background event loop all model calls run on (started on first use)."""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-loop", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def _get_scheduler() -> _Scheduler:
+    """Created on the loop thread so its asyncio primitives belong to that loop."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = _Scheduler()
+    return _scheduler
+
+
+async def _ainvoke(llm, messages: List[BaseMessage], priority: str, agent: str = "unknown") -> Any:
+    sched = _get_scheduler()
+    level = PRIORITIES.get(priority, PRIORITIES["background"])
+    est = estimate_tokens(messages)
+    t0 = time.perf_counter()
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        await sched.acquire(level, est)
+        correction = 0.0
+        try:
+            resp = await llm.ainvoke(messages)
+            usage = getattr(resp, "usage_metadata", None) or {}
+            if usage.get("total_tokens"):
+                correction = usage["total_tokens"] - est
+            sched.stats["calls"] += 1
+            LLM_CALLS.inc(agent=agent, outcome="ok")
+            LLM_CALL_SECONDS.observe(time.perf_counter() - t0, agent=agent)
+            _record_usage(agent, usage)
+            return resp
+        except Exception as e:
+            if attempt >= LLM_MAX_RETRIES or not _is_retryable(e):
+                sched.stats["failures"] += 1
+                LLM_CALLS.inc(agent=agent, outcome="error")
+                LLM_CALL_SECONDS.observe(time.perf_counter() - t0, agent=agent)
+                raise
+            delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+            sched.stats["retries"] += 1
+            LLM_RETRIES.inc(agent=agent)
+            print(f"--- [LLM] Retryable error in {agent} ({type(e).__name__}); retry {attempt + 1}/{LLM_MAX_RETRIES} in {delay:.1f}s ---")
+        finally:
+            await sched.release(correction)
+        await asyncio.sleep(delay)
+
+
+def _on_llm_loop() -> bool:
+    try:
+        return asyncio.get_running_loop() is _loop
+    except RuntimeError:
+        return False
+
+
+async def ainvoke_messages(llm, messages: List[BaseMessage], priority: str = "background", agent: str = "unknown") -> Any:
+    """Rate-limited, retried `llm.ainvoke(messages)`; awaitable from any event loop."""
+    if _on_llm_loop():
+        return await _ainvoke(llm, messages, priority, agent)
+    return await asyncio.wrap_future(
+        asyncio.run_coroutine_threadsafe(_ainvoke(llm, messages, priority, agent), _get_loop())
+    )
+
+
+def invoke_messages(llm, messages: List[BaseMessage], priority: str = "background", agent: str = "unknown") -> Any:
+    """Synchronous shim for ainvoke_messages. Raises the final error after retries."""
+    if _on_llm_loop():
+        raise RuntimeError("blocking LLM call made from the LLM event loop; await ainvoke_messages instead")
+    return asyncio.run_coroutine_threadsafe(_ainvoke(llm, messages, priority, agent), _get_loop()).result()
+
+
+def _chunk_text(chunk: Any) -> str:
+    content = getattr(chunk, "content", chunk)
+    if isinstance(content, list):  # some releases stream content parts
+        return "".join(p.get("text", "") if isinstance(p, dict) else str(p) for p in content)
+    return content if isinstance(content, str) else str(content)
+
+
+async def _astream(llm, messages: List[BaseMessage], priority: str, out: "queue.Queue", agent: str = "unknown") -> None:
+    """
+    Stream `llm.astream(messages)` into `out` as ("token", text) items, then ("done", None)
+    or ("error", exc). Holds one scheduler slot for the whole stream; retries only
+    while nothing has been produced yet.
+    """
+    sched = _get_scheduler()
+    level = PRIORITIES.get(priority, PRIORITIES["background"])
+    est = estimate_tokens(messages)
+    t0 = time.perf_counter()
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        await sched.acquire(level, est)
+        produced = False
+        usage = None
+        try:
+            async for chunk in llm.astream(messages):
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                text = _chunk_text(chunk)
+                if text:
+                    produced = True
+                    out.put(("token", text))
+            sched.stats["calls"] += 1
+            LLM_CALLS.inc(agent=agent, outcome="ok")
+            LLM_CALL_SECONDS.observe(time.perf_counter() - t0, agent=agent)
+            _record_usage(agent, usage)
+            out.put(("done", None))
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if produced or attempt >= LLM_MAX_RETRIES or not _is_retryable(e):
+                sched.stats["failures"] += 1
+                LLM_CALLS.inc(agent=agent, outcome="error")
+                LLM_CALL_SECONDS.observe(time.perf_counter() - t0, agent=agent)
+                out.put(("error", e))
+                return
+            delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+            sched.stats["retries"] += 1
+            LLM_RETRIES.inc(agent=agent)
+        finally:
+            await sched.release()
+        await asyncio.sleep(delay)
+
+
+def stream_model(
+    system_prompt: str,
+    user_prompt: str,
+    temperature: Optional[float] = None,
+    priority: str = "interactive",
+    agent: str = "unknown",
+) -> Iterator[str]:
+    """
+    Synchronous iterator over streamed text chunks for [System, Human] messages, going
+    through the same scheduler as every other call. Raises the model error (if any)
+    from the iterator; closing it early cancels the stream and frees its slot.
+    """
+    from .models import _resolve_model
+
+    if _on_llm_loop():
+        raise RuntimeError("blocking LLM stream opened from the LLM event loop")
+    llm = _resolve_model(temperature, None)
+    out: "queue.Queue" = queue.Queue()
+    messages = [SystemMessage(content=system_prompt), HumanMessage(content=user_prompt)]
+    fut = asyncio.run_coroutine_threadsafe(_astream(llm, messages, priority, out, agent), _get_loop())
+    try:
+        while True:
+            kind, value = out.get()
+            if kind == "token":
+                yield value
+            elif kind == "done":
+                return
+            else:
+                raise value
+    finally:
+        if not fut.done():
+            fut.cancel()
+
+
+async def acall_model(
+    system_prompt: str,
+    user_prompt: str,
+    temperature: Optional[float] = None,
+    priority: str = "background",
+    cache: bool = True,
+    model_instance=None,
+    agent: str = "unknown",
+) -> str:
+    """
+    Async counterpart of models.call_model_system_then_user (same response cache).
+    Returns the content string, or "(model error: ...)" once retries are exhausted.
+    """
+    from . import models
+
+    llm = models._resolve_model(temperature, model_instance)
+    cache_key = models._llm_cache_lookup_key(llm, system_prompt, user_prompt, cache)
+    hit = models._llm_cache_get(cache_key)
+    if hit is not None:
+        LLM_CALLS.inc(agent=agent, outcome="cache_hit")
+        return hit
+
+    t0 = time.perf_counter()
+    try:
+        resp = await ainvoke_messages(
+            llm, [SystemMessage(content=system_prompt), HumanMessage(content=user_prompt)], priority, agent
+        )
+        content = getattr(resp, "content", str(resp))
+    except Exception as e:
+        return f"(model error: {e})"
+    models._llm_cache_put(cache_key, content, t0, resp)
+    return content
+
+
+def call_model_system_then_user(*args, **kwargs) -> str:
+    """Synchronous entry point (see models.call_model_system_then_user)."""
+    from .models import call_model_system_then_user as _call
+
+    return _call(*args, **kwargs)
+
+
+_JSON_PATTERNS = {"object": re.compile(r"\{.*\}", re.DOTALL), "list": re.compile(r"\[.*\]", re.DOTALL)}
+
+
+def parse_json_response(response: str, agent: str = "unknown", expect: str = "object") -> Optional[Any]:
+    """
+    The JSON object (expect="object") or list (expect="list") embedded in a model
+    response, or None. A missing or malformed block counts as a parse failure for `agent`.
+    """
+    match = _JSON_PATTERNS[expect].search(response or "")
+    if match:
+        try:
+            return json.loads(match.group(0))
+        except json.JSONDecodeError as e:
+            print(f"--- [LLM] {agent}: invalid JSON in response ({e}) ---")
+    else:
+        print(f"--- [LLM] {agent}: no JSON {expect} in response ---")
+    LLM_PARSE_FAILURES.inc(agent=agent)
+    return None
+
+
+def get_agent_stats() -> Dict[str, Dict[str, Any]]:
+    """Per-agent summary: calls by outcome, retries, parse failures, latency and token percentiles."""
+    snap = metrics_snapshot("llm_")
+    agents: Dict[str, Dict[str, Any]] = {}
+
+    def _labels(key: str) -> Dict[str, str]:
+        return dict(part.split("=", 1) for part in key.split(",") if "=" in part)
+
+    for key, value in snap.get("llm_calls_total", {}).items():
+        labels = _labels(key)
+        agents.setdefault(labels.get("agent", "unknown"), {}).setdefault("calls", {})[labels.get("outcome", "ok")] = int(value)
+    for metric, field in (("llm_retries_total", "retries"), ("llm_parse_failures_total", "parse_failures")):
+        for key, value in snap.get(metric, {}).items():
+            agents.setdefault(_labels(key).get("agent", "unknown"), {})[field] = int(value)
+    for metric, field in (
+        ("llm_call_seconds", "latency_s"),
+        ("llm_prompt_tokens", "prompt_tokens"),
+        ("llm_completion_tokens", "completion_tokens"),
+        ("llm_context_tokens", "context_tokens"),
+    ):
+        for key, value in snap.get(metric, {}).items():
+            agents.setdefault(_labels(key).get("agent", "unknown"), {})[field] = value
+    for stats in agents.values():
+        calls = stats.get("calls", {})
+        sent = calls.get("ok", 0) + calls.get("error", 0)
+        stats["failure_rate"] = round(calls.get("error", 0) / sent, 3) if sent else 0.0
+        stats["parse_failure_rate"] = round(stats.get("parse_failures", 0) / calls["ok"], 3) if calls.get("ok") else 0.0
+    return dict(sorted(agents.items(), key=lambda kv: -kv[1].get("latency_s", {}).get("mean", 0) * kv[1].get("latency_s", {}).get("count", 0)))
+
+
+def get_llm_scheduler_stats() -> Dict[str, Any]:
+    if _scheduler is None:
+        return {"calls": 0, "retries": 0, "failures": 0, "throttled_ms": 0.0, "in_flight": 0}
+    return _scheduler.snapshot()
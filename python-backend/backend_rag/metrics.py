@@ -0,0 +1,141 @@
+# backend_rag/metrics.py
+"""
+Process metrics. Values are exported through prometheus_client when it is installed
+(GET /metrics) and always kept in-process so the debug endpoints can report them.
+"""
+from __future__ import annotations
+
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+try:
+    import prometheus_client
+except Exception:  # pragma: no cover
+    prometheus_client = None
+
+PROMETHEUS_AVAILABLE = prometheus_client is not None
+
+# Seconds; tuned for LLM / network latencies.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+
+_registry_lock = threading.Lock()
+_histograms: Dict[str, "Histogram"] = {}
+_counters: Dict[str, "Counter"] = {}
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple:
+    return tuple(sorted(labels.items()))
+
+
+class Histogram:
+    """Prometheus histogram plus a per-label-set window of recent samples for percentiles."""
+
+    def __init__(self, name: str, doc: str, labelnames: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS, window: int = 1000):
+        self.name = name
+        self.labelnames = labelnames
+        self._window = window
+        self._lock = threading.Lock()
+        self._samples: Dict[Tuple, Deque[float]] = {}
+        self._totals: Dict[Tuple, list] = {}  # label key -> [count, sum]
+        self._prom = (
+            prometheus_client.Histogram(name, doc, labelnames, buckets=buckets) if PROMETHEUS_AVAILABLE else None
+        )
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self._window)).append(value)
+            totals = self._totals.setdefault(key, [0, 0.0])
+            totals[0] += 1
+            totals[1] += value
+        if self._prom is not None:
+            (self._prom.labels(**labels) if self.labelnames else self._prom).observe(value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        out = {}
+        with self._lock:
+            for key, samples in self._samples.items():
+                ordered = sorted(samples)
+                count, total = self._totals[key]
+                out[",".join(f"{k}={v}" for k, v in key) or "all"] = {
+                    "count": count,
+                    "sum": round(total, 4),
+                    "mean": round(total / count, 4) if count else 0.0,
+                    "p50": round(ordered[len(ordered) // 2], 4),
+                    "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+                    "max": round(ordered[-1], 4),
+                }
+        return out
+
+
+class Counter:
+    def __init__(self, name: str, doc: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, float] = {}
+        self._prom = prometheus_client.Counter(name, doc, labelnames) if PROMETHEUS_AVAILABLE else None
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+        if self._prom is not None:
+            (self._prom.labels(**labels) if self.labelnames else self._prom).inc(amount)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {",".join(f"{k}={v}" for k, v in key) or "all": value for key, value in self._values.items()}
+
+
+def histogram(name: str, doc: str, labelnames: Tuple[str, ...] = (), **kwargs) -> Histogram:
+    """Get or create a process-wide histogram (safe to call at import time from several modules)."""
+    with _registry_lock:
+        if name not in _histograms:
+            _histograms[name] = Histogram(name, doc, labelnames, **kwargs)
+        return _histograms[name]
+
+
+def counter(name: str, doc: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+    with _registry_lock:
+        if name not in _counters:
+            _counters[name] = Counter(name, doc, labelnames)
+        return _counters[name]
+
+
+def metrics_snapshot(prefix: str = "") -> Dict[str, Any]:
+    with _registry_lock:
+        hs = {n: h for n, h in _histograms.items() if n.startswith(prefix)}
+        cs = {n: c for n, c in _counters.items() if n.startswith(prefix)}
+    return {**{n: h.snapshot() for n, h in hs.items()}, **{n: c.snapshot() for n, c in cs.items()}}
+
+
+def render_prometheus() -> Optional[Tuple[bytes, str]]:
+    """(body, content type) for /metrics, or None without prometheus_client."""
+    if not PROMETHEUS_AVAILABLE:
+        return None
+    return prometheus_client.generate_latest(), prometheus_client.CONTENT_TYPE_LATEST
+
+
+# Time from request start to the first streamed model token.
+LLM_TTFT_SECONDS = histogram(
+    "llm_time_to_first_token_seconds",
+    "Time from request start to the first streamed model token",
+    ("endpoint",),
+)
+
+# Per-agent LLM call metrics (recorded in llm.py / models.py).
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+LLM_CALL_SECONDS = histogram(
+    "llm_call_seconds", "Wall time of a model call incl. queueing and retries", ("agent",)
+)
+LLM_PROMPT_TOKENS = histogram(
+    "llm_prompt_tokens", "Prompt tokens per model call (response usage metadata)", ("agent",), buckets=TOKEN_BUCKETS
+)
+LLM_COMPLETION_TOKENS = histogram(
+    "llm_completion_tokens", "Completion tokens per model call (response usage metadata)", ("agent",), buckets=TOKEN_BUCKETS
+)
+LLM_CALLS = counter("llm_calls_total", "Model calls by outcome (ok, error, cache_hit, coalesced)", ("agent", "outcome"))
+LLM_RETRIES = counter("llm_retries_total", "Retried model attempts", ("agent",))
+LLM_PARSE_FAILURES = counter("llm_parse_failures_total", "Model responses whose JSON could not be parsed", ("agent",))
@@ -1,61 +1,240 @@
 from __future__ import annotations
 
 import os
-from typing import List, Optional
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
 
 from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
 from langchain_google_genai import ChatGoogleGenerativeAI
 
-from .config import DEFAULT_GOOGLE_MODEL, DEFAULT_MODEL_TEMPERATURE
+from .cache import TwoTierCache, sha256_text
+from .llm import invoke_messages
+from .metrics import LLM_CALLS
+from .config import (
+    DEFAULT_GOOGLE_MODEL,
+    DEFAULT_MODEL_TEMPERATURE,
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_MAX_TEMPERATURE,
+    LLM_CACHE_PATH,
+    LLM_CACHE_TTL,
+    LLM_CACHE_MEMORY_ITEMS,
+)
+
+
+# Registry of chat model instances keyed by (model, temperature, options). Each
+# ChatGoogleGenerativeAI owns its credentials and HTTP transport, so reusing one per
+# distinct configuration keeps connections warm instead of rebuilding them per call.
+# Retries are done by the shared scheduler in llm.py (which sees rate limits across
+# threads), so the client's own retry loop is kept to a single attempt.
+_DEFAULT_OPTIONS = {"convert_system_message_to_human": True, "max_retries": 1}
+_model_registry: Dict[Tuple, ChatGoogleGenerativeAI] = {}
+_registry_lock = threading.Lock()
+
+
+def _registry_key(model_name: str, temperature: float, options: Dict) -> Tuple:
+    return (model_name, round(float(temperature), 3), tuple(sorted(options.items())))
+
+
+def get_model(temperature: Optional[float] = None, model_name: Optional[str] = None, **options) -> ChatGoogleGenerativeAI:
+    """
+    Shared, thread-safe chat model for this configuration, created on first use.
+    temperature=None means DEFAULT_MODEL_TEMPERATURE; extra keyword options are passed
+    to ChatGoogleGenerativeAI and are part of the key.
+    """
+    model_name = model_name or os.getenv("GOOGLE_MODEL", DEFAULT_GOOGLE_MODEL)
+    temperature = DEFAULT_MODEL_TEMPERATURE if temperature is None else float(temperature)
+    opts = {**_DEFAULT_OPTIONS, **options}
+    key = _registry_key(model_name, temperature, opts)
+
+    instance = _model_registry.get(key)
+    if instance is not None:
+        return instance
+    with _registry_lock:
+        instance = _model_registry.get(key)
+        if instance is None:
+            instance = ChatGoogleGenerativeAI(
+                model=model_name,
+                temperature=temperature,
+                google_api_key=os.getenv("GOOGLE_API_KEY"),
+                **opts,
+            )
+            _model_registry[key] = instance
+        return instance
+
+
+def get_model_registry_size() -> int:
+    return len(_model_registry)
 
 
 # Single shared chat model (Gemini via LangChain wrapper)
-model = ChatGoogleGenerativeAI(
-    model=DEFAULT_GOOGLE_MODEL,
-    convert_system_message_to_human=True,
-    temperature=DEFAULT_MODEL_TEMPERATURE,
-    google_api_key=os.getenv("GOOGLE_API_KEY"),
-)
+model = get_model(DEFAULT_MODEL_TEMPERATURE, DEFAULT_GOOGLE_MODEL)
+
+
+# Response cache for low-temperature calls: the same system+user prompt on the same
+# model gives (near-)identical output, so re-opening a thread needn't re-run every agent.
+_llm_cache = TwoTierCache(LLM_CACHE_PATH, ttl_seconds=LLM_CACHE_TTL, memory_items=LLM_CACHE_MEMORY_ITEMS, name="LLM CACHE")
+_llm_cache_lock = threading.Lock()
+_llm_cache_saved = {"latency_ms": 0.0, "input_tokens": 0, "output_tokens": 0}
+
+
+def _llm_cache_key(llm: ChatGoogleGenerativeAI, system_prompt: str, user_prompt: str) -> str:
+    prompt_hash = sha256_text(f"{system_prompt}\x00{user_prompt}")
+    return f"llm:{llm.model}:{round(float(llm.temperature or 0.0), 3)}:{prompt_hash}"
+
+
+def _usage(resp: Any) -> Dict[str, int]:
+    usage = getattr(resp, "usage_metadata", None) or {}
+    return {"input_tokens": int(usage.get("input_tokens", 0)), "output_tokens": int(usage.get("output_tokens", 0))}
+
 
+def _llm_cache_lookup_key(llm: ChatGoogleGenerativeAI, system_prompt: str, user_prompt: str, cache: bool) -> Optional[str]:
+    """Cache key if this call is cacheable (enabled, opted in, temperature low enough), else None."""
+    if not (cache and LLM_CACHE_ENABLED and float(llm.temperature or 0.0) <= LLM_CACHE_MAX_TEMPERATURE):
+        return None
+    return _llm_cache_key(llm, system_prompt, user_prompt)
 
 
-def call_model_system_then_user(system_prompt: str, user_prompt: str, temperature: Optional[float] = None,model_instance=model) -> str:
+def _llm_cache_get(cache_key: Optional[str]) -> Optional[str]:
+    if not cache_key:
+        return None
+    hit = _llm_cache.get(cache_key)
+    if hit is None:
+        return None
+    with _llm_cache_lock:
+        _llm_cache_saved["latency_ms"] += hit.get("latency_ms", 0.0)
+        _llm_cache_saved["input_tokens"] += hit.get("input_tokens", 0)
+        _llm_cache_saved["output_tokens"] += hit.get("output_tokens", 0)
+    return hit["content"]
+
+
+def _llm_cache_put(cache_key: Optional[str], content: Any, started: float, resp: Any) -> None:
+    """Store a fresh response with the latency and tokens a future hit will save."""
+    if cache_key and isinstance(content, str) and content.strip():
+        _llm_cache.put(cache_key, {
+            "content": content,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            **_usage(resp),
+        })
+
+
+def get_llm_cache_stats() -> Dict[str, Any]:
+    """Cache hit rates plus the model latency and tokens that hits avoided."""
+    with _llm_cache_lock:
+        saved = dict(_llm_cache_saved)
+    saved["latency_ms"] = round(saved["latency_ms"], 1)
+    return {
+        **_llm_cache.stats(),
+        "enabled": LLM_CACHE_ENABLED,
+        "max_temperature": LLM_CACHE_MAX_TEMPERATURE,
+        "saved": saved,
+        "singleflight": get_singleflight_stats(),
+    }
+
+
+# Singleflight: identical (model, temperature, prompt) calls already in flight share one
+# Gemini request. Covers duplicate frontend requests and agents issuing the same prompt,
+# which the response cache can't catch because neither call has finished yet.
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+_singleflight_stats = {"leaders": 0, "coalesced": 0}
+
+
+def _singleflight(key: str, fn, agent: str = "unknown") -> str:
+    """Run fn() once per key at a time; concurrent callers with the same key get its result."""
+    with _inflight_lock:
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[key] = Future()
+            _singleflight_stats["leaders"] += 1
+        else:
+            _singleflight_stats["coalesced"] += 1
+    if not leader:
+        print(f"--- [LLM] {agent}: coalesced identical in-flight call ({key[-12:]}) ---")
+        LLM_CALLS.inc(agent=agent, outcome="coalesced")
+        return flight.result()
+    try:
+        result = fn()
+        flight.set_result(result)
+        return result
+    except BaseException as e:
+        flight.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def get_singleflight_stats() -> Dict[str, int]:
+    with _inflight_lock:
+        return {**_singleflight_stats, "in_flight": len(_inflight)}
+
+
+def _resolve_model(temperature: Optional[float], model_instance) -> ChatGoogleGenerativeAI:
+    """An explicitly passed non-default instance wins; otherwise pick from the registry by temperature."""
+    if model_instance is not None and model_instance is not model:
+        return model_instance
+    return get_model(temperature)
+
+
+def call_model_system_then_user(
+    system_prompt: str,
+    user_prompt: str,
+    temperature: Optional[float] = None,
+    model_instance=None,
+    cache: bool = True,
+    priority: str = "background",
+    agent: str = "unknown",
+) -> str:
     """
     Invoke LLM with [System, Human] messages. Optionally override temperature.
+    Calls at or below LLM_CACHE_MAX_TEMPERATURE are served from / stored in the LLM
+    response cache unless cache=False (use that for prompts whose answer should not be
+    reused, e.g. anything built from live web results). An identical call that is
+    already in flight is joined instead of sent again. The call itself goes through the
+    shared scheduler in llm.py; pass priority="interactive" for user-facing chat.
+    `agent` names the caller in the per-agent LLM metrics (/api/debug/llm-stats).
     Returns the content string (or a simple error string on failure).
     """
-    sys = SystemMessage(content=system_prompt)
-    hum = HumanMessage(content=user_prompt)
-    try:
-        if temperature is None:
-            resp = model.invoke([sys, hum])
-            return getattr(resp, "content", str(resp))
-        # Use a temp override model instance
-        tmp_model = ChatGoogleGenerativeAI(
-            model=os.getenv("GOOGLE_MODEL", DEFAULT_GOOGLE_MODEL),
-            temperature=float(temperature),
-            convert_system_message_to_human=True,
-            google_api_key=os.getenv("GOOGLE_API_KEY"),
-        )
-        resp = tmp_model.invoke([sys, hum])
-        return getattr(resp, "content", str(resp))
-    except Exception as e:
-        return f"(model error: {e})"
+    llm = _resolve_model(temperature, model_instance)
+    cache_key = _llm_cache_lookup_key(llm, system_prompt, user_prompt, cache)
+    hit = _llm_cache_get(cache_key)
+    if hit is not None:
+        LLM_CALLS.inc(agent=agent, outcome="cache_hit")
+        return hit
+
+    def _call() -> str:
+        try:
+            t0 = time.perf_counter()
+            resp = invoke_messages(
+                llm, [SystemMessage(content=system_prompt), HumanMessage(content=user_prompt)],
+                priority=priority, agent=agent,
+            )
+            content = getattr(resp, "content", str(resp))
+        except Exception as e:
+            return f"(model error: {e})"
+        # Stored before the flight is released, so a later caller finds either one or the other.
+        _llm_cache_put(cache_key, content, t0, resp)
+        return content
+
+    return _singleflight(cache_key or _llm_cache_key(llm, system_prompt, user_prompt), _call, agent)
 
 
-def call_model_with_messages(messages: List[BaseMessage], temperature: Optional[float] = None):
+def call_model_with_messages(
+    messages: List[BaseMessage],
+    temperature: Optional[float] = None,
+    model_instance=None,
+    priority: str = "interactive",
+    agent: str = "chat",
+):
     """
     Invoke LLM with an arbitrary message list. Optionally override temperature.
+    Used by the chat graph, so it is scheduled as interactive by default.
     Returns the LC message response (or a SystemMessage with error text).
     """
     try:
-        if temperature is None:
-            return model.invoke(messages)
-        tmp_model = ChatGoogleGenerativeAI(
-            model=os.getenv("GOOGLE_MODEL", DEFAULT_GOOGLE_MODEL),
-            temperature=float(temperature),
-            google_api_key=os.getenv("GOOGLE_API_KEY"),
-        )
-        return tmp_model.invoke(messages)
+        return invoke_messages(_resolve_model(temperature, model_instance), messages, priority=priority, agent=agent)
     except Exception as e:
         return SystemMessage(content=f"(model error: {e})")
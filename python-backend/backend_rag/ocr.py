@@ -1,17 +1,42 @@
 from __future__ import annotations
 
+import hashlib
 import json
 import os
+import re
+import threading
 import time
-import io
 import wave
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from io import BytesIO
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from pydub import AudioSegment
 
-from .config import VISION_GCS_BUCKET, VISION_ASYNC_TIMEOUT
+from .audio import AudioDecodeError, PCM_CHANNELS, PCM_SAMPLE_RATE, PCM_SAMPLE_WIDTH, decode_to_pcm, prepare_for_speech
+from .config import (
+    VISION_GCS_BUCKET,
+    VISION_ASYNC_TIMEOUT,
+    VISION_ASYNC_BATCH_SIZE,
+    VISION_ASYNC_POLL_INITIAL,
+    VISION_ASYNC_POLL_MAX,
+    VISION_DOWNLOAD_WORKERS,
+    VISION_BATCH_SIZE,
+    VISION_BATCH_MAX_BYTES,
+    VISION_BATCH_RETRIES,
+    SPEECH_SEGMENT_MAX_MS,
+    SPEECH_MIN_SILENCE_MS,
+    SPEECH_SILENCE_DB_BELOW_AVG,
+    SPEECH_MAX_WORKERS,
+    SPEECH_SHORT_MODEL_MAX_MS,
+    SPEECH_DETECT_LANGUAGES,
+    SPEECH_DETECT_SNIPPET_MS,
+    SPEECH_DETECT_CONFIDENCE,
+    SPEECH_DETECT_CACHE_SIZE,
+    SPEECH_DETECT_MAX_WORKERS,
+)
 
 # --- Google Vision + GCS + Speech (optional) ---
 try:
@@ -27,6 +52,7 @@ except Exception as e:  # pragma: no cover
     gcs = None
     service_account = None
     speech = None
+    speech_v1 = None
     _gcloud_import_error = e
 
 VISION_AVAILABLE = vision is not None and _gcloud_import_error is None
@@ -35,6 +61,7 @@ SPEECH_AVAILABLE = speech is not None and _gcloud_import_error is None
 _vision_client = None
 _gcs_client = None
 _speech_client = None
+_speech_client_v1 = None
 _gcs_client_for_speech = None
 
 
@@ -117,6 +144,18 @@ def _get_speech_and_storage_clients():
 
 
 
+def _text_from_annotate_response(resp) -> Optional[str]:
+    """Text of one AnnotateImageResponse; None if Vision reported an error for it."""
+    if getattr(resp, "error", None) and getattr(resp.error, "message", None):
+        return None
+    fta = getattr(resp, "full_text_annotation", None)
+    if fta and getattr(fta, "text", None):
+        return fta.text
+    if resp.text_annotations:
+        return resp.text_annotations[0].description or ""
+    return ""
+
+
 def ocr_image_with_google_vision_bytes(content: bytes) -> str:
     """OCR image bytes using Vision's DOCUMENT_TEXT_DETECTION."""
     vclient, _ = _get_vision_and_storage_clients()
@@ -125,18 +164,80 @@ def ocr_image_with_google_vision_bytes(content: bytes) -> str:
     try:
         image = vision.Image(content=content)
         resp = vclient.document_text_detection(image=image)
-        if getattr(resp, "error", None) and getattr(resp.error, "message", None):
-            return ""
-        fta = getattr(resp, "full_text_annotation", None)
-        if fta and getattr(fta, "text", None):
-            return fta.text
-        if resp.text_annotations:
-            return resp.text_annotations[0].description or ""
-        return ""
+        return _text_from_annotate_response(resp) or ""
     except Exception:
         return ""
 
 
+def _pack_vision_batches(sizes: List[int]) -> List[List[int]]:
+    """Group item indices into batches bounded by VISION_BATCH_SIZE and VISION_BATCH_MAX_BYTES."""
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_bytes = 0
+    for i, size in enumerate(sizes):
+        if current and (len(current) >= VISION_BATCH_SIZE or current_bytes + size > VISION_BATCH_MAX_BYTES):
+            batches.append(current)
+            current, current_bytes = [], 0
+        current.append(i)
+        current_bytes += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+def ocr_images_with_google_vision_batch(contents: List[bytes]) -> List[str]:
+    """
+    OCR many images with batch_annotate_images (up to 16 per RPC instead of one each).
+    Results come back in input order; items Vision failed on are retried on their own
+    batches up to VISION_BATCH_RETRIES times, and stay "" if they still fail.
+    """
+    texts = [""] * len(contents)
+    vclient, _ = _get_vision_and_storage_clients()
+    if vclient is None or not contents:
+        return texts
+
+    feature = vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)
+    todo = list(range(len(contents)))
+    for _ in range(VISION_BATCH_RETRIES + 1):
+        failed: List[int] = []
+        for batch in _pack_vision_batches([len(contents[i]) for i in todo]):
+            idxs = [todo[b] for b in batch]
+            requests = [
+                vision.AnnotateImageRequest(image=vision.Image(content=contents[i]), features=[feature])
+                for i in idxs
+            ]
+            try:
+                resp = vclient.batch_annotate_images(requests=requests)
+            except Exception:
+                failed.extend(idxs)
+                continue
+            for i, r in zip(idxs, resp.responses):
+                t = _text_from_annotate_response(r)
+                if t is None:
+                    failed.append(i)
+                else:
+                    texts[i] = t
+            failed.extend(idxs[len(resp.responses):])
+        if not failed:
+            break
+        todo = failed
+    return texts
+
+
+def ocr_image_files_with_google_vision(image_paths: List[str]) -> List[str]:
+    """OCR several local image files (e.g. a multi-image upload) in batched Vision calls."""
+    contents = []
+    for path in image_paths:
+        try:
+            with open(path, "rb") as f:
+                contents.append(f.read())
+        except Exception:
+            contents.append(b"")
+    texts = ocr_images_with_google_vision_batch([c for c in contents if c])
+    it = iter(texts)
+    return [next(it) if c else "" for c in contents]
+
+
 def ocr_image_with_google_vision(image_path: str) -> str:
     bucket = os.getenv("VISION_GCS_BUCKET")
     if not bucket:
@@ -170,8 +271,39 @@ def _upload_file_to_gcs(bucket_name: str, source_path: str, dest_blob_name: str)
         return None
 
 
+def _parse_vision_output_blob(blob) -> Dict[int, str]:
+    """Download one async output shard and return {page_number: text}."""
+    output = json.loads(blob.download_as_bytes())
+    # Shards are named output-<first>-to-<last>.json; used when a response lacks its page context.
+    m = re.search(r"output-(\d+)-to-\d+\.json$", blob.name)
+    first_page = int(m.group(1)) if m else 1
+    pages: Dict[int, str] = {}
+    for i, response in enumerate(output.get("responses", [])):
+        page = response.get("context", {}).get("pageNumber") or (first_page + i)
+        fta = response.get("fullTextAnnotation")
+        if fta and fta.get("text"):
+            pages[int(page)] = fta["text"]
+    return pages
+
+
+def _delete_gcs_prefix(storage_client, bucket: str, prefix: str) -> None:
+    """Best-effort removal of temporary Vision input/output objects."""
+    try:
+        for blob in storage_client.list_blobs(bucket, prefix=prefix):
+            try:
+                blob.delete()
+            except Exception:
+                pass
+    except Exception:
+        pass
+
+
 def ocr_pdf_with_google_vision_async_gcs(pdf_path: str) -> str:
-    """Use Vision async_batch_annotate_files via GCS."""
+    """
+    Use Vision async_batch_annotate_files via GCS.
+    Polls the operation with backoff and downloads/parses output shards concurrently as
+    they appear, then joins the pages in page order. Temporary GCS objects are removed.
+    """
     bucket = VISION_GCS_BUCKET
     if not bucket:
         return ""
@@ -179,20 +311,20 @@ def ocr_pdf_with_google_vision_async_gcs(pdf_path: str) -> str:
     if vclient is None or storage_client is None:
         return ""
 
-    try:
-        from uuid import uuid4
-        uid = str(uuid4())
-        gcs_src_name = f"vision_inputs/{uid}/{Path(pdf_path).name}"
-        gcs_dst_prefix = f"vision_outputs/{uid}/"
+    from uuid import uuid4
+    uid = str(uuid4())
+    gcs_src_prefix = f"vision_inputs/{uid}/"
+    gcs_dst_prefix = f"vision_outputs/{uid}/"
 
-        src_gs_uri = _upload_file_to_gcs(bucket, pdf_path, gcs_src_name)
+    try:
+        src_gs_uri = _upload_file_to_gcs(bucket, pdf_path, gcs_src_prefix + Path(pdf_path).name)
         if not src_gs_uri:
             return ""
 
         gcs_source = vision.GcsSource(uri=src_gs_uri)
         input_config = vision.InputConfig(gcs_source=gcs_source, mime_type="application/pdf")
         gcs_destination = vision.GcsDestination(uri=f"gs://{bucket}/{gcs_dst_prefix}")
-        output_config = vision.OutputConfig(gcs_destination=gcs_destination, batch_size=2)
+        output_config = vision.OutputConfig(gcs_destination=gcs_destination, batch_size=VISION_ASYNC_BATCH_SIZE)
 
         feature = vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)
         async_req = vision.AsyncAnnotateFileRequest(
@@ -202,78 +334,135 @@ def ocr_pdf_with_google_vision_async_gcs(pdf_path: str) -> str:
         )
         operation = vclient.async_batch_annotate_files(requests=[async_req])
 
-        operation.result(timeout=VISION_ASYNC_TIMEOUT)
-
-        text_parts = []
-        blobs = storage_client.list_blobs(bucket, prefix=gcs_dst_prefix)
-        for blob in blobs:
-            if blob.name.endswith(".json"):
-                output = json.loads(blob.download_as_string())
-                for response in output.get("responses", []):
-                    if response.get("fullTextAnnotation"):
-                        text_parts.append(response["fullTextAnnotation"]["text"])
-        return "\n\n".join(text_parts).strip()
+        pages: Dict[int, str] = {}
+        seen = set()
+        deadline = time.monotonic() + VISION_ASYNC_TIMEOUT
+        delay = VISION_ASYNC_POLL_INITIAL
+        with ThreadPoolExecutor(max_workers=max(1, VISION_DOWNLOAD_WORKERS)) as pool:
+            futures = []
+            while True:
+                # Check completion before listing so the final listing sees every shard.
+                finished = operation.done()
+                for blob in storage_client.list_blobs(bucket, prefix=gcs_dst_prefix):
+                    if blob.name.endswith(".json") and blob.name not in seen:
+                        seen.add(blob.name)
+                        futures.append(pool.submit(_parse_vision_output_blob, blob))
+                if finished:
+                    break
+                if time.monotonic() >= deadline:
+                    print(f"--- [Vision Async] Timed out after {VISION_ASYNC_TIMEOUT}s ---")
+                    return ""
+                time.sleep(delay)
+                delay = min(delay * 1.5, VISION_ASYNC_POLL_MAX)
+
+            for fut in as_completed(futures):
+                try:
+                    pages.update(fut.result())
+                except Exception as e:
+                    print(f"--- [Vision Async] Failed to read output shard: {e} ---")
+
+        return "\n\n".join(pages[n] for n in sorted(pages)).strip()
     except Exception:
         return ""
+    finally:
+        _delete_gcs_prefix(storage_client, bucket, gcs_src_prefix)
+        _delete_gcs_prefix(storage_client, bucket, gcs_dst_prefix)
 
 
 # ------------------- Speech-to-Text helpers -------------------
-def detect_language_from_audio_bytes(content: bytes) -> str:
+_lang_detect_cache: "OrderedDict[tuple, str]" = OrderedDict()
+_lang_detect_lock = threading.Lock()
+
+
+def _score_language_candidate(client, pcm: bytes, lang: str) -> Dict:
+    """One trial recognize on the snippet; returns transcript length and mean confidence."""
+    config = speech_v1.RecognitionConfig(
+        encoding=speech_v1.RecognitionConfig.AudioEncoding.LINEAR16,
+        sample_rate_hertz=16000,
+        language_code=lang,
+    )
+    try:
+        response = client.recognize(config=config, audio=speech_v1.RecognitionAudio(content=pcm))
+    except Exception as e:
+        return {"lang": lang, "chars": 0, "confidence": 0.0, "error": str(e)}
+    alts = [r.alternatives[0] for r in response.results if r.alternatives]
+    chars = sum(len(a.transcript.strip()) for a in alts)
+    confidence = sum(a.confidence for a in alts) / len(alts) if alts else 0.0
+    return {"lang": lang, "chars": chars, "confidence": confidence}
+
+
+def detect_language_from_pcm(pcm: bytes, user_id: Optional[str] = None) -> str:
     """
-    Detects spoken language using quick trial transcriptions.
-    Tries Hindi, Gujarati, and English — returns whichever yields the longest transcript.
+    Detects spoken language using quick trial transcriptions of the first few seconds of
+    16 kHz mono PCM (audio.decode_to_pcm). Candidates (SPEECH_DETECT_LANGUAGES, in order)
+    run at most SPEECH_DETECT_MAX_WORKERS at a time; the first with confidence >=
+    SPEECH_DETECT_CONFIDENCE wins and the rest are never sent. Otherwise the best
+    confidence-weighted transcript length wins. Decisions are cached per (user, audio
+    fingerprint); a fallback forced by API errors is not cached.
     """
-    client, _ = _get_speech_and_storage_clients()
+    snippet = pcm[:SPEECH_DETECT_SNIPPET_MS * _PCM_BYTES_PER_MS]
+    cache_key = (user_id or "", hashlib.sha256(snippet).hexdigest())
+    with _lang_detect_lock:
+        if cache_key in _lang_detect_cache:
+            _lang_detect_cache.move_to_end(cache_key)
+            return _lang_detect_cache[cache_key]
+
+    client = _get_speech_client_v1()
     if not client:
         print("--- [LANG DETECT] Speech client not available, defaulting to en-US.")
         return "en-US"
 
+    candidates = SPEECH_DETECT_LANGUAGES or ["en-US"]
+    scores: Dict[str, Dict] = {}
+    winner = None
+    pool = ThreadPoolExecutor(max_workers=max(1, min(SPEECH_DETECT_MAX_WORKERS, len(candidates))))
     try:
-        # Use only the first 10 seconds for detection
-        audio_segment = AudioSegment.from_file(io.BytesIO(content))
-        snippet = audio_segment[:10000]
-        buffer = io.BytesIO()
-        snippet.export(buffer, format="wav")
-        wav_bytes = buffer.getvalue()
-        recognition_audio = speech.RecognitionAudio(content=wav_bytes)
-
-        # Try all candidate languages
-        candidates = ["hi-IN", "gu-IN", "en-US"]
-        scores = {}
-
-        for lang in candidates:
-            config = speech.RecognitionConfig(
-                encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
-                sample_rate_hertz=snippet.frame_rate,
-                language_code=lang,
-                model="latest_long",
-                audio_channel_count=snippet.channels,
-            )
-            try:
-                response = client.recognize(config=config, audio=recognition_audio)
-                transcript_len = sum(len(r.alternatives[0].transcript.strip()) for r in response.results)
-                scores[lang] = transcript_len
-            except Exception as inner_e:
-                scores[lang] = 0
-
-        detected = max(scores, key=scores.get)
-        print(f"--- [LANG DETECT] Language scores: {scores} → Detected: {detected} ---")
-        return detected if scores[detected] > 5 else "en-US"
-
-    except Exception as e:
+        futures = [pool.submit(_score_language_candidate, client, snippet, lang) for lang in candidates]
+        for fut in as_completed(futures):
+            r = fut.result()
+            scores[r["lang"]] = r
+            if r["chars"] > 5 and r["confidence"] >= SPEECH_DETECT_CONFIDENCE:
+                winner = r["lang"]
+                break
+    finally:
+        # Queued candidates are cancelled before they are sent once there is a clear winner.
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    if winner is None:
+        best = max(scores.values(), key=lambda r: r["chars"] * max(r["confidence"], 0.1))
+        winner = best["lang"] if best["chars"] > 5 else "en-US"
+
+    summary = {k: (v["chars"], round(v["confidence"], 2)) for k, v in scores.items()}
+    print(f"--- [LANG DETECT] Scores (chars, confidence): {summary} → Detected: {winner} ---")
+
+    if all(r.get("error") for r in scores.values()):
+        print("--- [LANG DETECT] Every candidate failed; not caching the en-US fallback. ---")
+        return winner
+
+    with _lang_detect_lock:
+        _lang_detect_cache[cache_key] = winner
+        while len(_lang_detect_cache) > SPEECH_DETECT_CACHE_SIZE:
+            _lang_detect_cache.popitem(last=False)
+    return winner
+
+
+def detect_language_from_audio_bytes(content: bytes, user_id: Optional[str] = None) -> str:
+    """detect_language_from_pcm for encoded audio (decoded once with ffmpeg)."""
+    try:
+        pcm = decode_to_pcm(content)["pcm"]
+    except AudioDecodeError as e:
         print(f"--- [LANG DETECT] Error during language detection: {e}, defaulting to en-US.")
         return "en-US"
+    return detect_language_from_pcm(pcm, user_id)
 
     
 
-import io
 import os
 import base64
 import requests
 from pydub import AudioSegment
 
 import os
-import io
 import base64
 import requests
 from pydub import AudioSegment
@@ -289,21 +478,21 @@ def _get_speech_client_v1():
     """
     Get the Speech V1 client to support 'latest_short' models and general encoding.
     """
-    global _speech_client
+    global _speech_client_v1
     if not SPEECH_AVAILABLE:
         return None
 
-    if _speech_client:
-        return _speech_client
+    if _speech_client_v1:
+        return _speech_client_v1
 
     key_path = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
     try:
         if key_path and Path(key_path).exists() and service_account is not None:
             creds = service_account.Credentials.from_service_account_file(key_path)
-            _speech_client = speech_v1.SpeechClient(credentials=creds)
+            _speech_client_v1 = speech_v1.SpeechClient(credentials=creds)
         else:
-            _speech_client = speech_v1.SpeechClient()
-        return _speech_client
+            _speech_client_v1 = speech_v1.SpeechClient()
+        return _speech_client_v1
     except Exception as e:
         print(f"[SPEECH INIT] Error: {e}")
         return None
@@ -316,6 +505,76 @@ def _get_speech_client_v1():
 
 # In backend_rag/ocr.py
 
+STT_LANG_MAP = {
+    "en": "en-US",
+    "hi": "hi-IN",
+    "gu": "gu-IN",
+    "ta": "ta-IN",
+    "te": "te-IN",
+    "mr": "mr-IN",
+    "bn": "bn-IN",
+    "kn": "kn-IN",
+    "ml": "ml-IN"
+}
+
+
+_PCM_BYTES_PER_MS = PCM_SAMPLE_RATE * PCM_SAMPLE_WIDTH * PCM_CHANNELS // 1000
+
+
+def _pcm_duration_ms(pcm: bytes) -> int:
+    return len(pcm) // _PCM_BYTES_PER_MS
+
+
+def _speech_model_for(duration_ms: int) -> str:
+    """'latest_short' is tuned for brief utterances; longer audio goes to 'latest_long'."""
+    return "latest_short" if duration_ms <= SPEECH_SHORT_MODEL_MAX_MS else "latest_long"
+
+
+def _recognize_linear16(client, audio_bytes: bytes, full_lang_code: str, enable_automatic_punctuation: bool = True) -> str:
+    """
+    One synchronous recognize call on 16 kHz mono LINEAR16 audio. The model is picked by
+    duration ('latest_short' / 'latest_long'), falling back to 'default' where the
+    language doesn't support it. Raises on non-model errors.
+    """
+    audio = speech_v1.RecognitionAudio(content=audio_bytes)
+    model_name = _speech_model_for(_pcm_duration_ms(audio_bytes))
+
+    # Initial Config (latest_* models for best quality)
+    config = speech_v1.RecognitionConfig(
+        encoding=speech_v1.RecognitionConfig.AudioEncoding.LINEAR16,
+        sample_rate_hertz=16000,
+        language_code=full_lang_code,
+        enable_automatic_punctuation=enable_automatic_punctuation,
+        use_enhanced=True,
+        model=model_name,
+    )
+
+    try:
+        response = client.recognize(config=config, audio=audio)
+    except Exception as e:
+        # ROBUST FALLBACK LOGIC
+        error_str = str(e).lower()
+        
+        # We check for ANY indication that the model/config was wrong
+        if ("model" in error_str) or ("supported" in error_str) or ("invalid" in error_str):
+            print(f"[SPEECH] '{model_name}' failed for {full_lang_code}. Retrying with 'default' model...")
+            
+            # Switch to the standard model which supports ALL languages
+            config.model = "default"
+            config.use_enhanced = False
+            
+            response = client.recognize(config=config, audio=audio)
+        else:
+            # If it's a different error (like Auth), raise it
+            raise e
+
+    transcript_parts = []
+    for result in response.results:
+        if result.alternatives:
+            transcript_parts.append(result.alternatives[0].transcript)
+    return " ".join(transcript_parts).strip()
+
+
 def speech_to_text_from_bytes(content: bytes, language_code: str = "en", enable_automatic_punctuation: bool = True) -> str:
     """
     Transcribes audio using Google Cloud Speech-to-Text V1.
@@ -325,79 +584,126 @@ def speech_to_text_from_bytes(content: bytes, language_code: str = "en", enable_
     if not client:
         return "(speech error: client not available)"
 
-    # 1. Language Mapping
-    lang_map = {
-        "en": "en-US",
-        "hi": "hi-IN",
-        "gu": "gu-IN",
-        "ta": "ta-IN",
-        "te": "te-IN",
-        "mr": "mr-IN",
-        "bn": "bn-IN",
-        "kn": "kn-IN",
-        "ml": "ml-IN"
-    }
-    full_lang_code = lang_map.get(language_code, language_code)
+    full_lang_code = STT_LANG_MAP.get(language_code, language_code)
 
     try:
-        # 2. Normalize Audio (16-bit, 16kHz, Mono)
+        # Normalize Audio (16-bit, 16kHz, Mono) in a single ffmpeg decode
         try:
-            audio_segment = AudioSegment.from_file(io.BytesIO(content))
-            audio_segment = audio_segment.set_channels(1)\
-                                         .set_frame_rate(16000)\
-                                         .set_sample_width(2) 
-            buf = io.BytesIO()
-            audio_segment.export(buf, format="wav")
-            wav_bytes = buf.getvalue()
-        except Exception as e:
-            print(f"[SPEECH] Pydub conversion failed: {e}. Using raw bytes.")
-            wav_bytes = content
-
-        audio = speech_v1.RecognitionAudio(content=wav_bytes)
-
-        # 3. Initial Config (Try 'latest_short' for best quality)
-        config = speech_v1.RecognitionConfig(
-            encoding=speech_v1.RecognitionConfig.AudioEncoding.LINEAR16,
-            sample_rate_hertz=16000,
-            language_code=full_lang_code,
-            enable_automatic_punctuation=enable_automatic_punctuation,
-            use_enhanced=True,
-            model="latest_short" 
-        )
+            pcm, _ = prepare_for_speech(decode_to_pcm(content)["pcm"])
+        except AudioDecodeError as e:
+            # Never send undecoded (compressed) bytes labelled as LINEAR16.
+            print(f"[SPEECH] Decode failed: {e}")
+            return f"(speech error: could not decode audio: {e})"
 
-        print(f"[SPEECH] Transcribing with language: {full_lang_code}, model: latest_short")
+        print(f"[SPEECH] Transcribing with language: {full_lang_code}, model: {_speech_model_for(_pcm_duration_ms(pcm))}")
+        return _recognize_linear16(client, pcm, full_lang_code, enable_automatic_punctuation)
 
-        try:
-            response = client.recognize(config=config, audio=audio)
-        except Exception as e:
-            # 4. ROBUST FALLBACK LOGIC
-            error_str = str(e).lower()
-            
-            # We check for ANY indication that the model/config was wrong
-            if ("model" in error_str) or ("supported" in error_str) or ("invalid" in error_str):
-                print(f"[SPEECH] 'latest_short' failed for {full_lang_code}. Retrying with 'default' model...")
-                
-                # Switch to the standard model which supports ALL languages
-                config.model = "default"
-                config.use_enhanced = False
-                
-                response = client.recognize(config=config, audio=audio)
-            else:
-                # If it's a different error (like Auth), raise it
-                raise e
-
-        # 5. Process Results
-        transcript_parts = []
-        for result in response.results:
-            if result.alternatives:
-                transcript_parts.append(result.alternatives[0].transcript)
-        
-        final_transcript = " ".join(transcript_parts).strip()
-        return final_transcript
+    except Exception as e:
+        return f"(speech error: {e})"
 
+
+def speech_to_text_from_pcm(pcm: bytes, language_code: str = "en", enable_automatic_punctuation: bool = True) -> str:
+    """
+    Transcribes already-decoded 16 kHz mono s16le PCM (see audio.decode_to_pcm)
+    without any further conversion.
+    """
+    client = _get_speech_client_v1()
+    if not client:
+        return "(speech error: client not available)"
+    full_lang_code = STT_LANG_MAP.get(language_code, language_code)
+    try:
+        return _recognize_linear16(client, pcm, full_lang_code, enable_automatic_punctuation)
     except Exception as e:
         return f"(speech error: {e})"
 
+
+def _split_at_silences(audio: AudioSegment, max_ms: int = SPEECH_SEGMENT_MAX_MS) -> List[Tuple[int, int]]:
+    """
+    (start_ms, end_ms) spans no longer than max_ms, cut in the middle of silences where
+    possible (the latest silence in the second half of each window), hard cut otherwise.
+    """
+    from pydub.silence import detect_silence
+
+    total = len(audio)
+    if total <= max_ms:
+        return [(0, total)]
+    silences = detect_silence(
+        audio,
+        min_silence_len=SPEECH_MIN_SILENCE_MS,
+        silence_thresh=audio.dBFS - SPEECH_SILENCE_DB_BELOW_AVG,
+        seek_step=10,
+    )
+    cut_points = [(s + e) // 2 for s, e in silences]
+
+    spans: List[Tuple[int, int]] = []
+    start = 0
+    while total - start > max_ms:
+        window_end = start + max_ms
+        candidates = [c for c in cut_points if start + max_ms // 2 < c <= window_end]
+        cut = candidates[-1] if candidates else window_end
+        spans.append((start, cut))
+        start = cut
+    spans.append((start, total))
+    return spans
+
+
+def _format_ts(ms: int) -> str:
+    seconds = ms // 1000
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}" if seconds >= 3600 else f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+def iter_transcribed_segments(
+    content=None,
+    language_code: str = "en",
+    max_workers: Optional[int] = None,
+    pcm: Optional[bytes] = None,
+) -> Iterator[Dict]:
+    """
+    Split audio at silence boundaries into segments under the sync recognize limit and
+    transcribe them concurrently. `content` (bytes or a file path) is decoded once via
+    audio.decode_to_pcm; pass `pcm` instead when the caller already has it. Yields
+    segment dicts in completion order:
+      {"index": int, "start_ms": int, "end_ms": int, "transcript": str, "error"?: str}
+    Raises AudioDecodeError if the audio can't be decoded, RuntimeError without a client.
+    """
+    client = _get_speech_client_v1()
+    if not client:
+        raise RuntimeError("client not available")
+    full_lang_code = STT_LANG_MAP.get(language_code, language_code)
+
+    if pcm is None:
+        pcm = decode_to_pcm(content)["pcm"]
+    # Wrapping the raw PCM is free (no decode); pydub is only used for silence detection.
+    audio = AudioSegment(data=pcm, sample_width=PCM_SAMPLE_WIDTH, frame_rate=PCM_SAMPLE_RATE, channels=PCM_CHANNELS)
+    spans = _split_at_silences(audio)
+    print(f"[SPEECH] {len(audio) / 1000:.0f}s of audio → {len(spans)} segment(s), language: {full_lang_code}")
+
+    def _transcribe(index: int, start_ms: int, end_ms: int) -> Dict:
+        seg = {"index": index, "start_ms": start_ms, "end_ms": end_ms, "transcript": ""}
+        try:
+            seg["transcript"] = _recognize_linear16(
+                client, pcm[start_ms * _PCM_BYTES_PER_MS:end_ms * _PCM_BYTES_PER_MS], full_lang_code
+            )
+        except Exception as e:
+            seg["error"] = str(e)
+        return seg
+
+    with ThreadPoolExecutor(max_workers=max_workers or max(1, SPEECH_MAX_WORKERS)) as pool:
+        futures = [pool.submit(_transcribe, i, s, e) for i, (s, e) in enumerate(spans)]
+        for fut in as_completed(futures):
+            yield fut.result()
+
+
+def stitch_segments(segments: List[Dict], timestamps: bool = True) -> str:
+    """Join segment transcripts in audio order, optionally prefixed with [mm:ss]."""
+    lines = []
+    for seg in sorted(segments, key=lambda s: s["index"]):
+        text = (seg.get("transcript") or "").strip()
+        if text:
+            lines.append(f"[{_format_ts(seg['start_ms'])}] {text}" if timestamps else text)
+    return "\n".join(lines) if timestamps else " ".join(lines)
+
+
 def speech_to_text_from_local_file(audio_path: str, language_code: str = "en") -> dict:
     """
     Reads local file and transcribes it. Default language is now 'en'.
@@ -410,4 +716,4 @@ def speech_to_text_from_local_file(audio_path: str, language_code: str = "en") -
         
         return {"transcript": transcript, "detected_language": language_code}
     except Exception as e:
-        return {"transcript": f"(speech error: {e})", "detected_language": "error"}
\ No newline at end of file
+        return {"transcript": f"(speech error: {e})", "detected_language": "error"}
@@ -4,6 +4,9 @@ from __future__ import annotations
 
 # --- UPDATED TEMPLATE WITH MEMORY ---
 # backend_rag/prompts.py
+from typing import Optional
+
+from .context_packer import pack_context
 
 
 STRICT_SYSTEM_PROMPT_TEMPLATE = (
@@ -44,21 +47,21 @@ STRICT_SYSTEM_PROMPT_TEMPLATE = (
     "Document context:\n{context}\n"
 )
 
-def build_strict_system_prompt(context: str, chat_history_str: str = "", max_context_chars: int = 5000) -> str:
+def build_strict_system_prompt(context: str, chat_history_str: str = "", agent: Optional[str] = "ask",
+                               max_context_tokens: Optional[int] = None) -> str:
     """
     Builds the system prompt using the strict Legal SahAI rules but with Markdown output.
+    The context is packed to the agent's token budget (or max_context_tokens);
+    pass agent=None when the caller has already packed it.
     """
     if not context:
         context = "(no excerpts provided)"
+    elif agent:
+        context = pack_context(context, agent, max_context_tokens)
     
     # Default text if history is empty
     if not chat_history_str:
         chat_history_str = "(No previous conversation)"
-
-    if len(context) > max_context_chars:
-        head = context[: max_context_chars // 2]
-        tail = context[-max_context_chars // 2 :]
-        context = head + "\n\n...[TRUNCATED]...\n\n" + tail
         
     return STRICT_SYSTEM_PROMPT_TEMPLATE.format(context=context, chat_history=chat_history_str)
 
@@ -68,16 +71,14 @@ def build_strict_system_prompt(context: str, chat_history_str: str = "", max_con
 
 # In prompts.py (Add this new function)
 
-def build_summary_system_prompt(context: str, max_context_chars: int = 5000) -> str:
+def build_summary_system_prompt(context: str, max_context_tokens: Optional[int] = None) -> str:
     """
     Builds a non-strict, summary-focused system prompt.
     """
     if not context:
         context = "(no excerpts provided)"
-    if len(context) > max_context_chars:
-        head = context[: max_context_chars // 2]
-        tail = context[-max_context_chars // 2 :]
-        context = head + "\n\n...[TRUNCATED]...\n\n" + tail
+    else:
+        context = pack_context(context, "summary_prompt", max_context_tokens)
     return SUMMARY_SYSTEM_PROMPT_TEMPLATE.format(context=context)
 
 SUMMARY_SYSTEM_PROMPT_TEMPLATE = (
@@ -4,7 +4,7 @@ from __future__ import annotations
 import os
 from typing import Optional, List, Dict
 
-from backend_rag.embeddings import embed_texts, get_embedding_dimension
+from backend_rag.embeddings import embed_texts, embed_texts_english, get_embedding_dimension
 # Import all our helper functions
 from backend_rag.vectorstore_pinecone import get_or_create_index, namespace, query_top_k, get_general_legal_index
 
@@ -123,8 +123,8 @@ def retrieve_general_legal_chunks(query: str, top_k: int = 5):
         index = get_general_legal_index()
         
         # 2. Get query vector
-        # This uses your fixed embeddings.py (normalize_embeddings=True)
-        q_vec = embed_texts([query])[0].astype("float32").tolist()
+        # The general KB is indexed with the English model, whatever EMBEDDING_MODE is
+        q_vec = embed_texts_english([query])[0].astype("float32").tolist()
         
         # 3. --- THIS IS THE FIX ---
         # We query for 'top_k' directly and skip the 'initial_k' rerank logic.
@@ -1,7 +1,19 @@
 # backend_rag/tts.py
 from __future__ import annotations
+import hashlib
 import os
-from typing import Optional
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+from .cache import DiskLRUCache, sha256_text
+from .config import (
+    TTS_CACHE_DIR,
+    TTS_CACHE_MAX_BYTES,
+    TTS_MAX_INPUT_BYTES,
+    TTS_FIRST_SEGMENT_BYTES,
+    TTS_MAX_WORKERS,
+)
 
 # Try to import Google Cloud Text-to-Speech
 try:
@@ -31,43 +43,74 @@ def _get_tts_client():
         print(f"--- [TTS] Error initializing client: {e} ---")
         return None
 
-def generate_speech_audio(text: str, language_code: str = "en-US") -> Optional[bytes]:
+# 1. Map Codes to Full Locale
+LOCALE_MAP = {
+    "en": "en-IN", # Use Indian English for better relatability
+    "hi": "hi-IN",
+    "gu": "gu-IN",
+    "ta": "ta-IN",
+    "te": "te-IN",
+    "mr": "mr-IN",
+    "bn": "bn-IN",
+    "kn": "kn-IN",
+    "ml": "ml-IN"
+}
+
+# 2. Select the BEST Voice (Neural2 or Wavenet)
+# Google Cloud Voice Names: https://cloud.google.com/text-to-speech/docs/voices
+VOICE_NAME_MAP = {
+    "en-IN": "en-IN-Neural2-D",  # Indian English (Neural - Female)
+    "en-US": "en-US-Neural2-J",  # US English (Neural - Male)
+    "hi-IN": "hi-IN-Neural2-A",  # Hindi (Neural - Female) - Very Natural
+    "gu-IN": "gu-IN-Wavenet-A",  # Gujarati (Wavenet - Female)
+    "ta-IN": "ta-IN-Wavenet-D",  # Tamil (Wavenet - Female)
+    "te-IN": "te-IN-Standard-A", # Telugu (Standard - sometimes better for specific dialects)
+    "mr-IN": "mr-IN-Wavenet-A",  # Marathi
+    "bn-IN": "bn-IN-Wavenet-A",  # Bengali
+}
+
+SPEAKING_RATE = 0.95  # Slightly slower for better clarity in explanation
+
+_tts_cache = DiskLRUCache(TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES, name="TTS CACHE")
+
+
+def resolve_voice(language_code: str) -> Tuple[str, Optional[str]]:
+    """(full locale, preferred voice name or None to let Google pick)."""
+    full_lang_code = LOCALE_MAP.get(language_code, "en-US")
+    return full_lang_code, VOICE_NAME_MAP.get(full_lang_code)
+
+
+def speech_audio_id(text: str, language_code: str = "en-US") -> str:
+    """Cache key / public id of the MP3 for (text hash, locale, voice, speaking rate)."""
+    full_lang_code, voice_name = resolve_voice(language_code)
+    raw = f"{sha256_text(text)}|{full_lang_code}|{voice_name or ''}|{SPEAKING_RATE}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get_cached_speech_audio(audio_id: str) -> Optional[bytes]:
+    return _tts_cache.get(audio_id)
+
+
+def get_tts_cache_stats() -> dict:
+    return _tts_cache.stats()
+
+
+def generate_speech_audio_cached(text: str, language_code: str = "en-US") -> Tuple[str, Optional[bytes]]:
     """
-    Converts text to audio using HIGH QUALITY (Neural2/Wavenet) voices.
+    generate_speech_audio behind the on-disk MP3 cache. Returns (audio_id, mp3 bytes or None).
     """
-    client = _get_tts_client()
-    if not client: return None
-
-    # 1. Map Codes to Full Locale
-    locale_map = {
-        "en": "en-IN", # Use Indian English for better relatability
-        "hi": "hi-IN",
-        "gu": "gu-IN",
-        "ta": "ta-IN",
-        "te": "te-IN",
-        "mr": "mr-IN",
-        "bn": "bn-IN",
-        "kn": "kn-IN",
-        "ml": "ml-IN"
-    }
-    full_lang_code = locale_map.get(language_code, "en-US")
-
-    # 2. Select the BEST Voice (Neural2 or Wavenet)
-    # Google Cloud Voice Names: https://cloud.google.com/text-to-speech/docs/voices
-    voice_name_map = {
-        "en-IN": "en-IN-Neural2-D",  # Indian English (Neural - Female)
-        "en-US": "en-US-Neural2-J",  # US English (Neural - Male)
-        "hi-IN": "hi-IN-Neural2-A",  # Hindi (Neural - Female) - Very Natural
-        "gu-IN": "gu-IN-Wavenet-A",  # Gujarati (Wavenet - Female)
-        "ta-IN": "ta-IN-Wavenet-D",  # Tamil (Wavenet - Female)
-        "te-IN": "te-IN-Standard-A", # Telugu (Standard - sometimes better for specific dialects)
-        "mr-IN": "mr-IN-Wavenet-A",  # Marathi
-        "bn-IN": "bn-IN-Wavenet-A",  # Bengali
-    }
-    
-    # Default to a specific high-quality voice if defined, otherwise let Google pick
-    selected_name = voice_name_map.get(full_lang_code)
+    audio_id = speech_audio_id(text, language_code)
+    audio = _tts_cache.get(audio_id)
+    if audio is not None:
+        return audio_id, audio
+    audio = generate_speech_audio(text, language_code)
+    if audio:
+        _tts_cache.put(audio_id, audio)
+    return audio_id, audio
 
+
+def _synthesize_segment(client, text: str, full_lang_code: str, selected_name: Optional[str]) -> Optional[bytes]:
+    """One synthesize_speech call; `text` must be under the request byte limit."""
     synthesis_input = texttospeech.SynthesisInput(text=text)
 
     if selected_name:
@@ -86,7 +129,7 @@ def generate_speech_audio(text: str, language_code: str = "en-US") -> Optional[b
     # 3. MP3 Config
     audio_config = texttospeech.AudioConfig(
         audio_encoding=texttospeech.AudioEncoding.MP3,
-        speaking_rate=0.95  # Slightly slower for better clarity in explanation
+        speaking_rate=SPEAKING_RATE
     )
 
     try:
@@ -96,4 +139,139 @@ def generate_speech_audio(text: str, language_code: str = "en-US") -> Optional[b
         return response.audio_content
     except Exception as e:
         print(f"--- [TTS] Synthesis failed: {e} ---")
-        return None
\ No newline at end of file
+        return None
+
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?।॥:;])\s+|\n+")
+
+
+def _utf8_len(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+def _split_oversized(sentence: str, limit: int) -> List[str]:
+    """Break a sentence that alone exceeds the byte limit at commas, then at spaces."""
+    pieces: List[str] = []
+    current = ""
+    for token in re.split(r"(?<=,)\s+|\s+", sentence):
+        candidate = f"{current} {token}" if current else token
+        if _utf8_len(candidate) <= limit:
+            current = candidate
+            continue
+        if current:
+            pieces.append(current)
+        # A single unbroken token over the limit: hard cut on characters.
+        while _utf8_len(token) > limit:
+            cut = len(token.encode("utf-8")[:limit].decode("utf-8", "ignore"))
+            pieces.append(token[:cut])
+            token = token[cut:]
+        current = token
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_text_for_tts(text: str, max_bytes: int = TTS_MAX_INPUT_BYTES, first_bytes: int = TTS_FIRST_SEGMENT_BYTES) -> List[str]:
+    """
+    Pack sentences into segments under `max_bytes` (UTF-8) each. The first segment is
+    capped at `first_bytes` so playback can start after one short request.
+    """
+    sentences: List[str] = []
+    for s in _SENTENCE_END_RE.split(text):
+        s = s.strip()
+        if s:
+            sentences.extend(_split_oversized(s, max_bytes) if _utf8_len(s) > max_bytes else [s])
+
+    segments: List[str] = []
+    current = ""
+    for sentence in sentences:
+        limit = first_bytes if not segments else max_bytes
+        candidate = f"{current} {sentence}" if current else sentence
+        if current and _utf8_len(candidate) > limit:
+            segments.append(current)
+            current = sentence
+        else:
+            current = candidate
+    if current:
+        segments.append(current)
+    return segments
+
+
+def iter_speech_audio(text: str, language_code: str = "en-US") -> Iterator[Optional[bytes]]:
+    """
+    Synthesize `text` segment by segment, concurrently, yielding MP3 bytes in text order
+    as soon as each segment (and all before it) is ready. Yields None and stops if a
+    segment fails. MP3 output of consecutive requests concatenates into one playable stream.
+    """
+    client = _get_tts_client()
+    if not client:
+        yield None
+        return
+
+    full_lang_code, selected_name = resolve_voice(language_code)
+    segments = split_text_for_tts(text)
+    if not segments:
+        yield None
+        return
+    if len(segments) > 1:
+        print(f"--- [TTS] Synthesizing {len(segments)} segments concurrently ---")
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(TTS_MAX_WORKERS, len(segments))))
+    try:
+        futures = [pool.submit(_synthesize_segment, client, seg, full_lang_code, selected_name) for seg in segments]
+        for fut in futures:
+            audio = fut.result()
+            yield audio
+            if audio is None:
+                return
+    finally:
+        # Client went away or a segment failed: don't synthesize the rest.
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def generate_speech_audio(text: str, language_code: str = "en-US") -> Optional[bytes]:
+    """
+    Converts text to audio using HIGH QUALITY (Neural2/Wavenet) voices.
+    Long text is split at sentence boundaries and synthesized in parallel.
+    """
+    parts = []
+    for audio in iter_speech_audio(text, language_code):
+        if audio is None:
+            return None
+        parts.append(audio)
+    return b"".join(parts)
+
+
+def stream_speech_audio_cached(text: str, language_code: str = "en-US", check_cache: bool = True) -> Tuple[str, Iterator[bytes]]:
+    """
+    Like generate_speech_audio_cached but streaming: returns (audio_id, iterator of MP3
+    chunks). The first chunk is synthesized before returning, so a failure surfaces
+    here (empty iterator) rather than mid-stream. The full MP3 is cached once the
+    stream completes. Pass check_cache=False if the caller already looked it up.
+    """
+    audio_id = speech_audio_id(text, language_code)
+    cached = _tts_cache.get(audio_id) if check_cache else None
+    if cached is not None:
+        return audio_id, iter([cached])
+
+    chunks = iter_speech_audio(text, language_code)
+    first = next(chunks, None)
+    if first is None:
+        chunks.close()
+        return audio_id, iter(())
+
+    def _stream() -> Iterator[bytes]:
+        parts = [first]
+        yield first
+        try:
+            for audio in chunks:
+                if audio is None:
+                    print("--- [TTS] Segment failed mid-stream; audio truncated and not cached ---")
+                    return
+                parts.append(audio)
+                yield audio
+        finally:
+            chunks.close()
+        _tts_cache.put(audio_id, b"".join(parts))
+
+    return audio_id, _stream()
@@ -5,6 +5,8 @@ import os
 from typing import List, Dict, Optional
 from pinecone import Pinecone, ServerlessSpec
 
+from .config import EMBEDDING_MODE
+
 
 def _env(name: str, default: Optional[str] = None) -> Optional[str]:
     v = os.environ.get(name, default)
@@ -29,11 +31,32 @@ def get_pc_general() -> Pinecone:
     return Pinecone(api_key=api_key)
 
 
+_index_handles: Dict[str, object] = {}
+
+
+def rag_index_name() -> str:
+    """
+    Document RAG index name. Vectors from different embedding models can't share an
+    index (even at equal dimension), so multilingual mode uses its own index.
+    """
+    name = _env("PINECONE_INDEX_NAME", "rag-index") # Reads 'rag-api' from .env
+    if EMBEDDING_MODE == "multilingual":
+        return _env("PINECONE_MULTILINGUAL_INDEX_NAME", f"{name}-multilingual")
+    return name
+
+
 def get_or_create_index(dim: int):
-    """Ensure the serverless index FOR DOCUMENT RAG exists; return a handle."""
+    """
+    Ensure the serverless index FOR DOCUMENT RAG exists with dimension `dim`; return a handle.
+    Raises RuntimeError if an existing index was created with a different dimension.
+    """
+    name = rag_index_name()
+    cache_key = f"{name}:{dim}"
+    if cache_key in _index_handles:
+        return _index_handles[cache_key]
+
     # Uses the RAG client (Account B)
     pc = get_pc_rag() 
-    name = _env("PINECONE_INDEX_NAME", "rag-index") # Reads 'rag-api' from .env
     cloud = _env("PINECONE_CLOUD", "aws")
     region = _env("PINECONE_REGION", "us-east-1")
 
@@ -45,7 +68,15 @@ def get_or_create_index(dim: int):
             metric="cosine",
             spec=ServerlessSpec(cloud=cloud, region=region),
         )
-    return pc.Index(name)
+    else:
+        existing_dim = existing[name].get("dimension")
+        if existing_dim is not None and int(existing_dim) != dim:
+            raise RuntimeError(
+                f"Pinecone index '{name}' has dimension {existing_dim} but the embedding model "
+                f"produces {dim}; point PINECONE_INDEX_NAME / PINECONE_MULTILINGUAL_INDEX_NAME at a matching index"
+            )
+    _index_handles[cache_key] = pc.Index(name)
+    return _index_handles[cache_key]
 
 
 def namespace(user_id: Optional[str], thread_id: str) -> str:
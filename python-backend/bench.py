@@ -0,0 +1,206 @@
+# bench.py — manual micro-benchmarks for backend_rag hot paths.
+#
+# Usage:
+#   python bench.py docx path/to/large.docx [--repeat 5]
+#   python bench.py langid [--repeat 200] [--remote]
+#   python bench.py embeddings [--translate]
+from __future__ import annotations
+
+import argparse
+import time
+import tracemalloc
+from typing import Callable, Dict
+
+
+def _measure(fn: Callable[[], str], repeat: int) -> Dict[str, float]:
+    """Best wall time (ms) over `repeat` runs plus peak traced memory (MB) of one run."""
+    best = float("inf")
+    out = ""
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, (time.perf_counter() - t0) * 1000)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"ms": round(best, 1), "peak_mb": round(peak / 1e6, 1), "chars": len(out)}
+
+
+def bench_docx(path: str, repeat: int) -> None:
+    from backend_rag.extract import _extract_docx_text
+
+    rows = {"iterparse (paragraphs + tables)": lambda: _extract_docx_text(path)}
+    try:
+        import docx
+
+        def _python_docx_paragraphs() -> str:
+            return "\n".join(p.text for p in docx.Document(path).paragraphs)
+
+        def _python_docx_with_tables() -> str:
+            d = docx.Document(path)
+            parts = [p.text for p in d.paragraphs]
+            for table in d.tables:
+                for row in table.rows:
+                    parts.append(" | ".join(c.text for c in row.cells))
+            return "\n".join(parts)
+
+        rows["python-docx (paragraphs only)"] = _python_docx_paragraphs
+        rows["python-docx (paragraphs + tables)"] = _python_docx_with_tables
+    except ImportError:
+        print("python-docx not installed; reporting iterparse only.")
+
+    for name, fn in rows.items():
+        r = _measure(fn, repeat)
+        print(f"{name:38s} {r['ms']:>9.1f} ms  {r['peak_mb']:>7.1f} MB peak  {r['chars']:>9d} chars")
+
+
+LANGID_QUERIES = [
+    "What does the termination clause in this agreement mean?",
+    "Can my landlord keep the security deposit?",
+    "Go to the main office to sign",
+    "I want to go to court",
+    "Need to pay to whom?",
+    "mera deposit wapas nahi de raha kya karu",
+    "notice period kitna hai is contract mein",
+    "main court jaana chahta hoon",
+    "मेरा मकान मालिक पैसे वापस नहीं कर रहा है",
+    "આ કરારમાં દંડની શરત શું છે?",
+    "இந்த ஒப்பந்தத்தை நான் ரத்து செய்யலாமா?",
+    "Section 420 IPC",
+]
+
+
+def bench_langid(repeat: int, remote: bool) -> None:
+    """Per-query language detection latency on the /api/ask path: local identifier vs. Google."""
+    from backend_rag.config import LANGID_MIN_CONFIDENCE
+    from backend_rag.langid import identify_language
+    from backend_rag.Translation import _get_translate_client
+
+    fallbacks = 0
+    for q in LANGID_QUERIES:
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            r = identify_language(q)
+        us = (time.perf_counter() - t0) / repeat * 1e6
+        fallback = r["confidence"] < LANGID_MIN_CONFIDENCE
+        fallbacks += fallback
+        print(f"{q[:40]:42s} {r['language']:>4s} {r['confidence']:>6.3f} {us:>8.1f} us{'  -> remote' if fallback else ''}")
+
+    if not remote:
+        print(f"\n{fallbacks}/{len(LANGID_QUERIES)} queries would fall back to remote detection (pass --remote to time it).")
+        return
+    client = _get_translate_client()
+    if client is None:
+        print("\nTranslate client not available; skipping remote timing.")
+        return
+    t0 = time.perf_counter()
+    for q in LANGID_QUERIES:
+        client.detect_language(q)
+    remote_ms = (time.perf_counter() - t0) / len(LANGID_QUERIES) * 1000
+    saved = remote_ms * (len(LANGID_QUERIES) - fallbacks) / len(LANGID_QUERIES)
+    print(f"\nremote detect_language: {remote_ms:.1f} ms/query; "
+          f"{fallbacks}/{len(LANGID_QUERIES)} fall back → ~{saved:.1f} ms saved per /api/ask on average")
+
+
+# Small English passage set plus Hindi/Gujarati queries whose answer is passage `target`.
+EMBED_PASSAGES = [
+    "The tenant must pay a security deposit equal to two months' rent, refundable within 30 days of vacating.",
+    "Either party may terminate this agreement by giving one month's written notice to the other party.",
+    "Late payment of rent attracts a penalty of two percent per month on the outstanding amount.",
+    "The landlord is responsible for structural repairs; the tenant handles day-to-day maintenance.",
+    "The employee shall not disclose confidential information during or after the term of employment.",
+    "Any dispute arising under this contract shall be referred to arbitration in Mumbai.",
+    "The lease may be renewed for a further term of eleven months at a rent increased by five percent.",
+    "The borrower must repay the loan in twelve equal monthly instalments with interest at nine percent.",
+]
+EMBED_QUERIES = [
+    ("hi", "सुरक्षा जमा राशि कब वापस मिलेगी?", 0),
+    ("hi", "क्या मैं एक महीने का नोटिस देकर अनुबंध खत्म कर सकता हूँ?", 1),
+    ("hi", "किराया देर से देने पर कितना जुर्माना लगेगा?", 2),
+    ("hi", "मरम्मत की जिम्मेदारी किसकी है?", 3),
+    ("hi", "विवाद होने पर मध्यस्थता कहाँ होगी?", 5),
+    ("hi", "ऋण की किस्तें कितनी हैं और ब्याज दर क्या है?", 7),
+    ("gu", "સિક્યોરિટી ડિપોઝિટ ક્યારે પાછી મળશે?", 0),
+    ("gu", "મોડું ભાડું ભરવા પર દંડ કેટલો છે?", 2),
+    ("gu", "ગુપ્ત માહિતી જાહેર કરી શકાય?", 4),
+    ("gu", "ભાડા કરાર કેટલા સમય માટે રિન્યુ થઈ શકે?", 6),
+    ("gu", "વિવાદનો ઉકેલ કેવી રીતે આવશે?", 5),
+    ("gu", "લોન કેટલા હપ્તામાં ચૂકવવી પડશે?", 7),
+]
+
+
+def _recall(model, queries, passages_vec, k: int):
+    import numpy as np
+
+    t0 = time.perf_counter()
+    q_vec = model.encode(queries, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False)
+    ms = (time.perf_counter() - t0) / len(queries) * 1000
+    ranks = np.argsort(-(q_vec @ passages_vec.T), axis=1)[:, :k]
+    return ranks, ms
+
+
+def bench_embeddings(translate: bool) -> None:
+    """Recall@1/@3 and per-query latency: English model (+ translation) vs. multilingual model."""
+    from sentence_transformers import SentenceTransformer
+    from backend_rag.config import EMBEDDING_MODEL_NAME, MULTILINGUAL_EMBEDDING_MODEL
+
+    configs = [("english, untranslated", EMBEDDING_MODEL_NAME, False),
+               ("multilingual, original text", MULTILINGUAL_EMBEDDING_MODEL, False)]
+    if translate:
+        configs.insert(1, ("english + Google translate", EMBEDDING_MODEL_NAME, True))
+
+    translated = None
+    translate_ms = 0.0
+    if translate:
+        from backend_rag.Translation import translate_texts
+
+        t0 = time.perf_counter()
+        translated = translate_texts([q for _, q, _ in EMBED_QUERIES], "en")
+        translate_ms = (time.perf_counter() - t0) / len(EMBED_QUERIES) * 1000
+        if not all(translated):
+            print("Translate client not available; skipping the translated configuration.")
+            configs = [c for c in configs if not c[2]]
+
+    models = {}
+    for label, name, use_translation in configs:
+        if name not in models:
+            models[name] = SentenceTransformer(name, device="cpu")
+        model = models[name]
+        passages_vec = model.encode(EMBED_PASSAGES, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False)
+        for lang in ("hi", "gu"):
+            rows = [(i, q, t) for i, (l, q, t) in enumerate(EMBED_QUERIES) if l == lang]
+            queries = [translated[i] if use_translation else q for i, q, _ in rows]
+            ranks, ms = _recall(model, queries, passages_vec, k=3)
+            if use_translation:
+                ms += translate_ms
+            r1 = sum(ranks[j][0] == t for j, (_, _, t) in enumerate(rows)) / len(rows)
+            r3 = sum(t in ranks[j] for j, (_, _, t) in enumerate(rows)) / len(rows)
+            print(f"{label:30s} {lang}  recall@1 {r1:.2f}  recall@3 {r3:.2f}  {ms:>7.1f} ms/query")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="backend_rag micro-benchmarks")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_docx = sub.add_parser("docx", help="DOCX extraction: iterparse vs python-docx")
+    p_docx.add_argument("path")
+    p_docx.add_argument("--repeat", type=int, default=5)
+
+    p_langid = sub.add_parser("langid", help="Language detection: local identifier vs. Google")
+    p_langid.add_argument("--repeat", type=int, default=200)
+    p_langid.add_argument("--remote", action="store_true", help="also time the Google detector")
+
+    p_embed = sub.add_parser("embeddings", help="Hindi/Gujarati retrieval: English vs. multilingual embeddings")
+    p_embed.add_argument("--translate", action="store_true", help="include English model + Google translation")
+
+    args = parser.parse_args()
+    if args.cmd == "docx":
+        bench_docx(args.path, args.repeat)
+    elif args.cmd == "langid":
+        bench_langid(args.repeat, args.remote)
+    elif args.cmd == "embeddings":
+        bench_embeddings(args.translate)
+
+
+if __name__ == "__main__":
+    main()